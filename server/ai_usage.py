@@ -0,0 +1,269 @@
+import datetime
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from sqlmodel import Session, select
+from sqlalchemy import delete, func
+
+from server.database import engine
+from server.models import AiUsage, AiUsageDaily
+
+logger = logging.getLogger(__name__)
+
+# 日汇总为读-改-写，串行执行
+_write_lock = threading.Lock()
+_last_purge = 0.0
+
+
+def _env_int(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(os.getenv(name) or str(default))
+    except Exception:
+        value = default
+    return max(lo, min(value, hi))
+
+
+def is_enabled() -> bool:
+    return (os.getenv("AI_USAGE") or "1").strip().lower() not in ["0", "false", "no", "off"]
+
+
+def provider_name(endpoint: str) -> str:
+    return urlparse(endpoint or "").hostname or (endpoint or "")
+
+
+def usage_tokens(resp_json: Any) -> Dict[str, int]:
+    """从 OpenAI 兼容响应的 usage 字段读取 token 数，缺失时为 0。"""
+    usage = resp_json.get("usage") if isinstance(resp_json, dict) else None
+    usage = usage if isinstance(usage, dict) else {}
+
+    def _int(v: Any) -> int:
+        try:
+            return max(0, int(v))
+        except Exception:
+            return 0
+
+    return {
+        "prompt_tokens": _int(usage.get("prompt_tokens")),
+        "completion_tokens": _int(usage.get("completion_tokens")),
+    }
+
+
+def record_ai_call(
+    endpoint: str,
+    model: str,
+    latency: float,
+    outcome: str,
+    phone: Optional[str] = None,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    retries: int = 0,
+    error: Optional[str] = None,
+    kind: str = "article",
+) -> None:
+    """
+    记录一次 AI 请求，并累加到当天的汇总。
+
+    Args:
+        endpoint (str): 请求地址，只保存域名。
+        model (str): 模型名。
+        latency (float): 耗时（秒）。
+        outcome (str): 结果，ok / error / busy / empty / cancelled。
+        phone (Optional[str]): 账号手机号。
+        prompt_tokens (int): 提示词 token 数。
+        completion_tokens (int): 生成 token 数。
+        retries (int): 本次请求之前已重试的次数。
+        error (Optional[str]): 错误信息。
+        kind (str): 调用类型，article / stream。
+    """
+    if not is_enabled():
+        return
+    provider = provider_name(endpoint)
+    latency_ms = max(0, int(latency * 1000))
+    ok = outcome == "ok"
+    try:
+        with _write_lock, Session(engine) as session:
+            session.add(AiUsage(
+                phone=phone or None,
+                kind=kind,
+                provider=provider,
+                model=model or "",
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                latency_ms=latency_ms,
+                retries=retries,
+                outcome=outcome,
+                error=(error or "")[:300] or None,
+            ))
+            day = datetime.datetime.now().date().isoformat()
+            row = session.exec(
+                select(AiUsageDaily).where(
+                    (AiUsageDaily.day == day)
+                    & (AiUsageDaily.phone == (phone or ""))
+                    & (AiUsageDaily.provider == provider)
+                    & (AiUsageDaily.model == (model or ""))
+                )
+            ).first()
+            if not row:
+                row = AiUsageDaily(day=day, phone=phone or "", provider=provider, model=model or "")
+            row.calls += 1
+            row.ok_calls += 1 if ok else 0
+            row.error_calls += 0 if ok else 1
+            row.retries += retries
+            row.prompt_tokens += prompt_tokens
+            row.completion_tokens += completion_tokens
+            row.latency_ms_total += latency_ms
+            row.latency_ms_max = max(row.latency_ms_max, latency_ms)
+            session.add(row)
+            session.commit()
+        _maybe_purge()
+    except Exception as e:
+        logger.warning(f"记录 AI 调用失败: {e}")
+
+
+def _maybe_purge() -> None:
+    """明细只保留 AI_USAGE_RETENTION_DAYS 天，日汇总长期保留。"""
+    global _last_purge
+    if time.time() - _last_purge < 3600:
+        return
+    _last_purge = time.time()
+    days = _env_int("AI_USAGE_RETENTION_DAYS", 30, 1, 3650)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    with Session(engine) as session:
+        session.exec(delete(AiUsage).where(AiUsage.created_at < cutoff))
+        session.commit()
+
+
+def _percentile(values: List[int], q: float) -> int:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def provider_summary(days: int = 7) -> List[Dict[str, Any]]:
+    """
+    按服务商和模型汇总最近 days 天的明细：调用量、成功率、耗时分位数和平均 token 数。
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    with Session(engine) as session:
+        rows = session.exec(
+            select(
+                AiUsage.provider,
+                AiUsage.model,
+                AiUsage.outcome,
+                AiUsage.latency_ms,
+                AiUsage.prompt_tokens,
+                AiUsage.completion_tokens,
+                AiUsage.retries,
+            ).where(AiUsage.created_at >= cutoff)
+        ).all()
+
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for provider, model, outcome, latency_ms, prompt_tokens, completion_tokens, retries in rows:
+        g = groups.setdefault((provider, model), {"latencies": [], "calls": 0, "ok": 0, "retries": 0, "prompt": 0, "completion": 0})
+        g["calls"] += 1
+        g["retries"] += retries
+        if outcome == "ok":
+            g["ok"] += 1
+            g["latencies"].append(latency_ms)
+            g["prompt"] += prompt_tokens
+            g["completion"] += completion_tokens
+
+    items = []
+    for (provider, model), g in groups.items():
+        ok = g["ok"]
+        items.append({
+            "provider": provider,
+            "model": model,
+            "calls": g["calls"],
+            "ok_calls": ok,
+            "success_rate": round(ok / g["calls"], 4) if g["calls"] else 0.0,
+            "retries": g["retries"],
+            "latency_p50_ms": _percentile(g["latencies"], 0.5),
+            "latency_p95_ms": _percentile(g["latencies"], 0.95),
+            "latency_max_ms": max(g["latencies"]) if g["latencies"] else 0,
+            "avg_prompt_tokens": round(g["prompt"] / ok, 1) if ok else 0.0,
+            "avg_completion_tokens": round(g["completion"] / ok, 1) if ok else 0.0,
+            "total_tokens": g["prompt"] + g["completion"],
+        })
+    items.sort(key=lambda x: (-x["calls"], x["provider"], x["model"]))
+    return items
+
+
+def daily_rollup(days: int = 30, phone: Optional[str] = None, provider: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    读取日汇总；未指定 phone 时合并所有账号，按 (日期, 服务商, 模型) 输出。
+    """
+    since = (datetime.datetime.now().date() - datetime.timedelta(days=days - 1)).isoformat()
+    stmt = select(
+        AiUsageDaily.day,
+        AiUsageDaily.provider,
+        AiUsageDaily.model,
+        func.sum(AiUsageDaily.calls),
+        func.sum(AiUsageDaily.ok_calls),
+        func.sum(AiUsageDaily.error_calls),
+        func.sum(AiUsageDaily.retries),
+        func.sum(AiUsageDaily.prompt_tokens),
+        func.sum(AiUsageDaily.completion_tokens),
+        func.sum(AiUsageDaily.latency_ms_total),
+        func.max(AiUsageDaily.latency_ms_max),
+    ).where(AiUsageDaily.day >= since)
+    if phone:
+        stmt = stmt.where(AiUsageDaily.phone == phone)
+    if provider:
+        stmt = stmt.where(AiUsageDaily.provider == provider)
+    stmt = stmt.group_by(AiUsageDaily.day, AiUsageDaily.provider, AiUsageDaily.model).order_by(
+        AiUsageDaily.day.desc(), AiUsageDaily.provider, AiUsageDaily.model
+    )
+    with Session(engine) as session:
+        rows = session.exec(stmt).all()
+    return [
+        {
+            "day": day,
+            "provider": prov,
+            "model": model,
+            "calls": int(calls or 0),
+            "ok_calls": int(ok_calls or 0),
+            "error_calls": int(error_calls or 0),
+            "retries": int(retries or 0),
+            "prompt_tokens": int(prompt or 0),
+            "completion_tokens": int(completion or 0),
+            "latency_avg_ms": round((latency_total or 0) / calls, 1) if calls else 0.0,
+            "latency_max_ms": int(latency_max or 0),
+        }
+        for day, prov, model, calls, ok_calls, error_calls, retries, prompt, completion, latency_total, latency_max in rows
+    ]
+
+
+def user_totals(days: int = 30, limit: int = 50) -> List[Dict[str, Any]]:
+    """按账号汇总最近 days 天的调用量和 token 数，按 token 数降序。"""
+    since = (datetime.datetime.now().date() - datetime.timedelta(days=days - 1)).isoformat()
+    total_tokens = func.sum(AiUsageDaily.prompt_tokens + AiUsageDaily.completion_tokens)
+    with Session(engine) as session:
+        rows = session.exec(
+            select(
+                AiUsageDaily.phone,
+                func.sum(AiUsageDaily.calls),
+                func.sum(AiUsageDaily.error_calls),
+                total_tokens,
+                func.sum(AiUsageDaily.latency_ms_total),
+            )
+            .where(AiUsageDaily.day >= since)
+            .group_by(AiUsageDaily.phone)
+            .order_by(total_tokens.desc())
+            .limit(limit)
+        ).all()
+    return [
+        {
+            "phone": phone,
+            "calls": int(calls or 0),
+            "error_calls": int(errors or 0),
+            "total_tokens": int(tokens or 0),
+            "latency_avg_ms": round((latency_total or 0) / calls, 1) if calls else 0.0,
+        }
+        for phone, calls, errors, tokens, latency_total in rows
+    ]
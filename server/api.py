@@ -1,15 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile
 from sqlmodel import Session, select
 from sqlalchemy import func
 from server.database import get_session, engine
-from server.models import User, UserCreate, UserRead, UserUpdate, UserListRead, AuditLog, BatchJob, BatchJobItem, AdminUser, AppUser
+from server.models import User, UserCreate, UserRead, UserUpdate, UserListRead, AuditLog, BatchJob, BatchJobItem, AdminUser, AppUser, ImageAsset, AiUsage, NotificationOutbox
 from server.scheduler import add_user_job, remove_user_job, user_to_config
-from server.task_runner import run_task_by_config
 from server.util.Config import ConfigManager
-from server.coreApi.MainLogicApi import ApiClient
-from server.coreApi.AiServiceClient import generate_article
+from server.coreApi.MainLogicApi import ApiClient, get_captcha_stats
+from server.coreApi.AiServiceClient import generate_article_stream, resolve_providers
+from server.coreApi import AiGateway
 from typing import List, Any, Dict, Optional
+import asyncio
 import datetime
+import json
 import requests
 from pydantic import BaseModel
 from urllib.parse import urljoin, urlparse
@@ -18,10 +20,11 @@ import os
 import ipaddress
 import socket
 import re
-import threading
-from collections import OrderedDict
 from server.auth import get_admin, get_operator, get_viewer, get_user, issue_token, get_client_ip, verify_password, hash_password
 from server.secret_store import encrypt_secret
+from server import ai_usage, bulkhead, geocode_cache, image_library, notification_outbox, rate_limit, report_cache
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
 
 router = APIRouter()
 
@@ -81,9 +84,32 @@ def _sanitize_user_for_read(user: User) -> Dict[str, Any]:
         ai2 = dict(ai)
         if "apikey" in ai2:
             ai2["apikey"] = ""
+        if isinstance(ai2.get("providers"), list):
+            ai2["providers"] = [dict(p, apikey="") if isinstance(p, dict) else p for p in ai2["providers"]]
         data["ai"] = ai2
     return data
 
+def _merge_ai_update(current_ai: Any, ai_update: Dict[str, Any]) -> Dict[str, Any]:
+    current_ai = current_ai if isinstance(current_ai, dict) else {}
+    merged_ai = dict(current_ai)
+    merged_ai.update(ai_update)
+    providers = ai_update.get("providers")
+    if isinstance(providers, list):
+        # 读取时 apikey 已被清空，留空表示沿用同一地址和模型（或同一位置）的原 Key
+        old = [p for p in (current_ai.get("providers") or []) if isinstance(p, dict)]
+        merged = []
+        for i, p in enumerate(providers):
+            if not isinstance(p, dict):
+                continue
+            p = {k: str(p.get(k) or "").strip() for k in ("apiUrl", "apikey", "model")}
+            if not p["apikey"]:
+                same = [o for o in old if o.get("apiUrl") == p["apiUrl"] and o.get("model") == p["model"]]
+                prev = same[0] if same else (old[i] if i < len(old) and old[i].get("apiUrl") == p["apiUrl"] else {})
+                p["apikey"] = str(prev.get("apikey") or "")
+            merged.append(p)
+        merged_ai["providers"] = merged
+    return merged_ai
+
 def _sanitize_user_for_self(user: User) -> Dict[str, Any]:
     data = UserRead.model_validate(user).model_dump()
     data["password"] = ""
@@ -326,6 +352,7 @@ def app_bind(
     return {"ok": True, "user_id": user.id}
 
 @router.get("/app/account-address")
+@bulkhead.offload("moguding")
 def app_account_address(
     *,
     request: Request,
@@ -437,10 +464,7 @@ def app_update_me(
         if "apikey" in ai_update and not (str(ai_update.get("apikey") or "").strip()):
             ai_update.pop("apikey", None)
         if ai_update:
-            current_ai = user.ai if isinstance(user.ai, dict) else {}
-            merged_ai = dict(current_ai)
-            merged_ai.update(ai_update)
-            user.ai = merged_ai
+            user.ai = _merge_ai_update(user.ai, ai_update)
             changed.append("ai")
     session.add(user)
     session.add(AuditLog(actor=str(payload.get("sub")), action="app.user.update", target_user_id=user.id, detail={"fields": changed}))
@@ -451,7 +475,7 @@ def app_update_me(
         add_user_job(user)
     return _sanitize_user_for_self(user)
 
-@router.post("/app/run")
+@router.post("/app/run", status_code=202)
 def app_run(
     *,
     request: Request,
@@ -463,29 +487,21 @@ def app_run(
     user = _get_bound_task_user(session=session, app_user=app_user)
     client_ip = get_client_ip(request)
     _rate_limit(f"app_run:{client_ip}:{user.id}", limit=3, per_seconds=60)
-    config_data = user_to_config(user)
-    
     specific_task_type = req.task_type if req else None
-    results = run_task_by_config(config_data, specific_task_type=specific_task_type)
-    
-    user.last_run_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    status = "Success"
-    for r in results:
-        if r.get("status") == "fail":
-            status = "Fail"
-            break
-    user.last_status = status
-    log_summary = []
-    for r in results:
-        if r.get("status") != "skip":
-            log_summary.append(f"{r.get('task_type')}: {r.get('message')}")
-    if log_summary:
-        user.logs = log_summary
-    user.last_execution_result = results
-    session.add(AuditLog(actor=str(payload.get("sub")), action="app.user.run", target_user_id=user.id, detail={"status": status}))
-    session.add(user)
+    job = _enqueue_run(session, user, created_by=str(payload.get("sub")), task_type=specific_task_type)
+    session.add(AuditLog(actor=str(payload.get("sub")), action="app.user.run", target_user_id=user.id, detail={"run_id": job.id}))
     session.commit()
-    return {"results": results}
+    return {"run_id": job.id, "status": "queued"}
+
+def _read_app_run(payload: dict, run_id: int) -> Dict[str, Any]:
+    with Session(engine) as session:
+        app_user = _get_authed_app_user(session=session, payload=payload)
+        user = _get_bound_task_user(session=session, app_user=app_user)
+        return _read_run(session, run_id, user.id)
+
+@router.get("/app/runs/{run_id}")
+async def read_app_run(*, run_id: int, payload: dict = Depends(get_user), wait: int = Query(0, ge=0, le=30)):
+    return await _wait_run(lambda: _read_app_run(payload, run_id), wait)
 
 @router.get("/app/execution")
 def app_execution(*, session: Session = Depends(get_session), payload: dict = Depends(get_user)):
@@ -493,12 +509,81 @@ def app_execution(*, session: Session = Depends(get_session), payload: dict = De
     user = _get_bound_task_user(session=session, app_user=app_user)
     return {"results": user.last_execution_result or []}
 
+def _ensure_ai_config(config: ConfigManager) -> None:
+    # 用户未配置时也可以使用全局默认服务商池
+    if resolve_providers(config.get_value("config.ai")):
+        return
+    if not isinstance(config.get_value("config.ai"), dict):
+        raise HTTPException(status_code=400, detail="未配置 AI 参数")
+    raise HTTPException(status_code=400, detail="请先在 AI 设置中填写 API URL、API Key 和 Model")
+
+def _prepare_daily_report(config: ConfigManager, api_client: ApiClient):
+    if not config.get_value("userInfo.token"):
+        api_client.login()
+    if config.get_value("userInfo.userType") != "teacher" and not config.get_value("planInfo.planId"):
+        api_client.fetch_internship_plan()
+
+    submitted = api_client.get_submitted_reports_info("day") or {}
+    data = submitted.get("data", []) if isinstance(submitted, dict) else []
+    count = (submitted.get("flag", 0) if isinstance(submitted, dict) else 0) + 1
+    title = f"第{count}天日报"
+
+    already_submitted = False
+    current_time = datetime.datetime.now()
+    if isinstance(data, list) and data:
+        last = data[0]
+        ts = last.get("createTime")
+        if isinstance(ts, str):
+            try:
+                last_time = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
+                if last_time.date() == current_time.date():
+                    already_submitted = True
+            except Exception:
+                pass
+
+    job_info = api_client.get_job_info()
+    return title, already_submitted, job_info
+
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _daily_report_event_stream(config: ConfigManager, api_client: ApiClient, audit: Optional[Dict[str, Any]] = None, regenerate: bool = False):
+    # 先发 status 事件，登录和拉取岗位信息放在流里进行，首字节不再等待 AI
+    yield _sse("status", {"stage": "preparing"})
+    try:
+        title, already_submitted, job_info = _prepare_daily_report(config, api_client)
+        yield _sse("meta", {"title": title, "already_submitted": already_submitted})
+        word_count = config.get_value("planInfo.planPaper.dayPaperNum")
+        cache_key = report_cache.cache_key(config, title, job_info, word_count)
+        content = None if regenerate else report_cache.get(cache_key)
+        if content:
+            yield _sse("delta", {"text": content})
+        else:
+            yield _sse("status", {"stage": "generating"})
+            parts = []
+            for delta in generate_article_stream(config, title, job_info, word_count):
+                parts.append(delta)
+                yield _sse("delta", {"text": delta})
+            content = "".join(parts).rstrip()
+            report_cache.put(cache_key, content, model=config.get_value("config.ai.model"), title=title)
+        if audit:
+            with Session(engine) as s:
+                s.add(AuditLog(actor=audit["actor"], action=audit["action"], target_user_id=audit.get("target_user_id"), detail={"title": title, "already_submitted": already_submitted, "stream": True}))
+                s.commit()
+        yield _sse("done", {"ok": True, "title": title, "content": content, "already_submitted": already_submitted})
+    except Exception as e:
+        yield _sse("error", {"detail": str(e) or "生成日报失败"})
+
 @router.post("/app/reports/daily/generate")
+@bulkhead.offload("ai")
 def app_generate_daily_report(
     *,
     request: Request,
     session: Session = Depends(get_session),
     payload: dict = Depends(get_user),
+    regenerate: bool = Query(False),
 ):
     app_user = _get_authed_app_user(session=session, payload=payload)
     user = _get_bound_task_user(session=session, app_user=app_user)
@@ -509,38 +594,11 @@ def app_generate_daily_report(
     config = ConfigManager(config=config_data)
     api_client = ApiClient(config)
 
-    ai_cfg = config.get_value("config.ai")
-    if not isinstance(ai_cfg, dict):
-        raise HTTPException(status_code=400, detail="未配置 AI 参数")
-    if not (str(ai_cfg.get("apikey") or "").strip()) or not (str(ai_cfg.get("apiUrl") or "").strip()) or not (str(ai_cfg.get("model") or "").strip()):
-        raise HTTPException(status_code=400, detail="请先在 AI 设置中填写 API URL、API Key 和 Model")
+    _ensure_ai_config(config)
 
     try:
-        if not config.get_value("userInfo.token"):
-            api_client.login()
-        if config.get_value("userInfo.userType") != "teacher" and not config.get_value("planInfo.planId"):
-            api_client.fetch_internship_plan()
-
-        submitted = api_client.get_submitted_reports_info("day") or {}
-        data = submitted.get("data", []) if isinstance(submitted, dict) else []
-        count = (submitted.get("flag", 0) if isinstance(submitted, dict) else 0) + 1
-        title = f"第{count}天日报"
-
-        already_submitted = False
-        current_time = datetime.datetime.now()
-        if isinstance(data, list) and data:
-            last = data[0]
-            ts = last.get("createTime")
-            if isinstance(ts, str):
-                try:
-                    last_time = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
-                    if last_time.date() == current_time.date():
-                        already_submitted = True
-                except Exception:
-                    pass
-
-        job_info = api_client.get_job_info()
-        content = generate_article(config, title, job_info, config.get_value("planInfo.planPaper.dayPaperNum"))
+        title, already_submitted, job_info = _prepare_daily_report(config, api_client)
+        content = report_cache.generate_article_cached(config, title, job_info, config.get_value("planInfo.planPaper.dayPaperNum"), refresh=regenerate)
         session.add(AuditLog(actor=str(payload.get("sub")), action="app.report.daily.generate", target_user_id=user.id, detail={"title": title, "already_submitted": already_submitted}))
         session.commit()
         return {"ok": True, "title": title, "content": content, "already_submitted": already_submitted}
@@ -549,7 +607,31 @@ def app_generate_daily_report(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e) or "生成日报失败")
 
+@router.post("/app/reports/daily/generate/stream")
+def app_generate_daily_report_stream(
+    *,
+    request: Request,
+    session: Session = Depends(get_session),
+    payload: dict = Depends(get_user),
+    regenerate: bool = Query(False),
+):
+    app_user = _get_authed_app_user(session=session, payload=payload)
+    user = _get_bound_task_user(session=session, app_user=app_user)
+    client_ip = get_client_ip(request)
+    _rate_limit(f"app_daily_gen:{client_ip}:{user.id}", limit=3, per_seconds=60)
+
+    config_data = user_to_config(user)
+    config = ConfigManager(config=config_data)
+    api_client = ApiClient(config)
+
+    _ensure_ai_config(config)
+
+    audit = {"actor": str(payload.get("sub")), "action": "app.report.daily.generate", "target_user_id": user.id}
+    stream = bulkhead.get("ai").stream(_daily_report_event_stream(config, api_client, audit=audit, regenerate=regenerate))
+    return StreamingResponse(stream, media_type="text/event-stream", headers=_SSE_HEADERS)
+
 @router.post("/app/reports/daily/submit")
+@bulkhead.offload("moguding")
 def app_submit_daily_report(
     *,
     request: Request,
@@ -605,6 +687,7 @@ def app_submit_daily_report(
             "formFieldDtoList": api_client.get_from_info(7),
         }
         api_client.submit_report(report_info)
+        report_cache.forget(report_cache.cache_key(config, title, job_info, config.get_value("planInfo.planPaper.dayPaperNum")))
         session.add(AuditLog(actor=str(payload.get("sub")), action="app.report.daily.submit", target_user_id=user.id, detail={"title": title}))
         session.commit()
         return {"ok": True, "title": title, "submitted_at": report_info["reportTime"]}
@@ -687,41 +770,9 @@ class AiTestRequest(BaseModel):
 class ReportSubmitRequest(BaseModel):
     content: str
 
-_RATE_LIMIT_BUCKETS: Dict[str, List[float]] = {}
-_GEOCODE_CACHE: "OrderedDict[tuple, tuple[float, Any]]" = OrderedDict()
-_GEOCODE_LOCK = threading.Lock()
-
-def _geocode_cache_get(key: tuple) -> Any:
-    now = time.time()
-    with _GEOCODE_LOCK:
-        hit = _GEOCODE_CACHE.get(key)
-        if not hit:
-            return None
-        exp, value = hit
-        if exp <= now:
-            _GEOCODE_CACHE.pop(key, None)
-            return None
-        _GEOCODE_CACHE.move_to_end(key)
-        return value
-
-def _geocode_cache_set(key: tuple, value: Any, ttl_seconds: int = 3600, maxsize: int = 800) -> None:
-    now = time.time()
-    exp = now + int(ttl_seconds)
-    with _GEOCODE_LOCK:
-        _GEOCODE_CACHE[key] = (exp, value)
-        _GEOCODE_CACHE.move_to_end(key)
-        while len(_GEOCODE_CACHE) > int(maxsize):
-            _GEOCODE_CACHE.popitem(last=False)
-
 def _rate_limit(key: str, limit: int, per_seconds: int, detail: Optional[str] = None) -> None:
-    now = time.time()
-    bucket = _RATE_LIMIT_BUCKETS.get(key, [])
-    cutoff = now - per_seconds
-    bucket = [t for t in bucket if t >= cutoff]
-    if len(bucket) >= limit:
+    if not rate_limit.hit(key, limit, per_seconds):
         raise HTTPException(status_code=429, detail=detail or "操作过于频繁，请稍后再试")
-    bucket.append(now)
-    _RATE_LIMIT_BUCKETS[key] = bucket
 
 def _ensure_clockin_schedule_defaults(user: User):
     if not isinstance(user.clockIn, dict):
@@ -999,6 +1050,7 @@ def read_user_execution(*, session: Session = Depends(get_session), user_id: int
     return {"results": user.last_execution_result or []}
 
 @router.get("/users/{user_id}/job-info")
+@bulkhead.offload("moguding")
 def read_user_job_info(
     *,
     request: Request,
@@ -1055,6 +1107,7 @@ def read_user_job_info(
 
 
 @router.get("/users/{user_id}/account-address")
+@bulkhead.offload("moguding")
 def read_user_account_address(
     *,
     request: Request,
@@ -1169,10 +1222,7 @@ def update_user(*, session: Session = Depends(get_session), user_id: int, user_u
         if "apikey" in ai_update and not (str(ai_update.get("apikey") or "").strip()):
             ai_update.pop("apikey", None)
         if ai_update:
-            current_ai = db_user.ai if isinstance(db_user.ai, dict) else {}
-            merged_ai = dict(current_ai)
-            merged_ai.update(ai_update)
-            user_data["ai"] = merged_ai
+            user_data["ai"] = _merge_ai_update(db_user.ai, ai_update)
         else:
             user_data.pop("ai", None)
     for key, value in user_data.items():
@@ -1202,7 +1252,56 @@ def delete_user(*, session: Session = Depends(get_session), user_id: int, admin:
     session.commit()
     return {"ok": True}
 
-@router.post("/users/{user_id}/run")
+_RUN_DONE_STATUSES = ["success", "fail", "canceled"]
+
+def _enqueue_run(session: Session, user: User, created_by: str, task_type: Optional[str] = None) -> BatchJob:
+    existing = session.exec(
+        select(BatchJob)
+        .join(BatchJobItem, BatchJobItem.job_id == BatchJob.id)
+        .where(
+            (BatchJob.kind == "run")
+            & (BatchJobItem.user_id == user.id)
+            & (BatchJobItem.status.in_(["queued", "running"]))
+        )
+        .order_by(BatchJob.id.desc())
+    ).first()
+    if existing and existing.task_type == task_type:
+        return existing
+    job = BatchJob(created_by=created_by, total=1, concurrency=1, user_ids=[user.id], status="queued", kind="run", task_type=task_type)
+    session.add(job)
+    session.flush()
+    # 手动运行失败不自动重试，避免重复提交报告
+    session.add(BatchJobItem(job_id=job.id, user_id=user.id, status="queued", max_attempts=1))
+    session.commit()
+    session.refresh(job)
+    return job
+
+def _read_run(session: Session, run_id: int, user_id: int) -> Dict[str, Any]:
+    job = session.get(BatchJob, run_id)
+    item = session.exec(select(BatchJobItem).where(BatchJobItem.job_id == run_id)).first() if job else None
+    if not job or job.kind != "run" or not item or item.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {
+        "run_id": job.id,
+        "status": item.status,
+        "done": item.status in _RUN_DONE_STATUSES,
+        "task_type": job.task_type,
+        "created_at": job.created_at.isoformat(sep=" ", timespec="seconds"),
+        "started_at": item.started_at.isoformat(sep=" ", timespec="seconds") if item.started_at else None,
+        "finished_at": item.finished_at.isoformat(sep=" ", timespec="seconds") if item.finished_at else None,
+        "error": item.error if item.status == "fail" else None,
+        "results": item.results or [],
+    }
+
+async def _wait_run(read, wait: int) -> Dict[str, Any]:
+    deadline = time.monotonic() + wait
+    while True:
+        data = await run_in_threadpool(read)
+        if data["done"] or time.monotonic() >= deadline:
+            return data
+        await asyncio.sleep(min(1.0, max(0.1, deadline - time.monotonic())))
+
+@router.post("/users/{user_id}/run", status_code=202)
 def run_user_task(*, request: Request, session: Session = Depends(get_session), user_id: int, operator: dict = Depends(get_operator)):
     client_ip = get_client_ip(request)
     _rate_limit(f"run:{client_ip}:{user_id}", limit=2, per_seconds=60)
@@ -1210,30 +1309,18 @@ def run_user_task(*, request: Request, session: Session = Depends(get_session),
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    config_data = user_to_config(user)
-    results = run_task_by_config(config_data)
-
-    user.last_run_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    status = "Success"
-    for r in results:
-        if r.get("status") == "fail":
-            status = "Fail"
-            break
-    user.last_status = status
-    log_summary = []
-    for r in results:
-        if r.get("status") != "skip":
-            log_summary.append(f"{r.get('task_type')}: {r.get('message')}")
-    if log_summary:
-        user.logs = log_summary
-
-    user.last_execution_result = results
-
-    session.add(AuditLog(actor=operator.get("sub"), action="user.run", target_user_id=user_id, detail={"status": status}))
-    session.add(user)
+    job = _enqueue_run(session, user, created_by=operator.get("sub"))
+    session.add(AuditLog(actor=operator.get("sub"), action="user.run", target_user_id=user_id, detail={"run_id": job.id}))
     session.commit()
+    return {"run_id": job.id, "status": "queued"}
+
+def _read_user_run(user_id: int, run_id: int) -> Dict[str, Any]:
+    with Session(engine) as session:
+        return _read_run(session, run_id, user_id)
 
-    return {"results": results}
+@router.get("/users/{user_id}/runs/{run_id}")
+async def read_user_run(*, user_id: int, run_id: int, viewer: dict = Depends(get_viewer), wait: int = Query(0, ge=0, le=30)):
+    return await _wait_run(lambda: _read_user_run(user_id, run_id), wait)
 
 class BatchRunRequest(BaseModel):
     ids: List[int]
@@ -1330,7 +1417,99 @@ def cancel_batch_job(*, session: Session = Depends(get_session), job_id: int, op
     session.commit()
     return {"ok": True}
 
+def _resolve_image_scope_id(session: Session, scope: str, scope_id: Optional[str], user_id: Optional[int]) -> str:
+    if scope == "user" and user_id:
+        user = session.get(User, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user.phone
+    return (scope_id or "").strip()
+
+@router.post("/image-library/images")
+def upload_library_images(
+    *,
+    request: Request,
+    scope: str = Form("global"),
+    scope_id: Optional[str] = Form(None),
+    user_id: Optional[int] = Form(None),
+    files: List[UploadFile] = File(...),
+    admin: dict = Depends(get_admin),
+):
+    client_ip = get_client_ip(request)
+    _rate_limit(f"image_upload:{client_ip}", limit=20, per_seconds=60)
+    max_bytes = int(os.getenv("IMAGE_LIBRARY_MAX_UPLOAD_MB") or "20") * 1024 * 1024
+    scope = image_library.SCOPE_ALIASES.get(scope, scope)
+    if scope not in image_library.IMAGE_SCOPES:
+        raise HTTPException(status_code=400, detail="scope 仅支持 user / org（tenant）/ global")
+    with Session(engine) as session:
+        resolved_scope_id = _resolve_image_scope_id(session, scope, scope_id, user_id)
+
+    added: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    for f in files:
+        data = f.file.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            errors.append({"name": f.filename, "message": "文件过大"})
+            continue
+        try:
+            asset = image_library.add_image(scope, resolved_scope_id, data, f.filename, admin.get("sub"))
+        except ValueError as e:
+            errors.append({"name": f.filename, "message": str(e)})
+            continue
+        added.append({"id": asset.id, "name": f.filename, "sha256": asset.sha256})
+
+    with Session(engine) as session:
+        session.add(AuditLog(actor=admin.get("sub"), action="image_library.upload", target_user_id=user_id, detail={"scope": scope, "scope_id": resolved_scope_id, "added": len(added), "failed": len(errors)}))
+        session.commit()
+    return {"ok": True, "added": added, "errors": errors}
+
+@router.get("/image-library/stats")
+def read_image_library_stats(*, admin: dict = Depends(get_admin)):
+    return {"items": image_library.library_stats()}
+
+@router.get("/image-library/images")
+def read_library_images(
+    *,
+    session: Session = Depends(get_session),
+    admin: dict = Depends(get_admin),
+    scope: str = Query("global"),
+    scope_id: Optional[str] = Query(None, max_length=64),
+    user_id: Optional[int] = Query(None),
+    page: int = Query(1, ge=1),
+    pageSize: int = Query(50, ge=1, le=200),
+):
+    scope = image_library.SCOPE_ALIASES.get(scope, scope)
+    resolved_scope_id = "" if scope == "global" else _resolve_image_scope_id(session, scope, scope_id, user_id)
+    stmt = select(ImageAsset).where((ImageAsset.scope == scope) & (ImageAsset.scope_id == resolved_scope_id))
+    total = session.exec(select(func.count()).select_from(stmt.subquery())).one()
+    rows = session.exec(stmt.order_by(ImageAsset.id.desc()).offset((page - 1) * pageSize).limit(pageSize)).all()
+    items = [
+        {
+            "id": r.id,
+            "created_at": r.created_at.isoformat(sep=" ", timespec="seconds"),
+            "created_by": r.created_by,
+            "name": r.original_name,
+            "sha256": r.sha256,
+            "width": r.width,
+            "height": r.height,
+            "size": r.size,
+        }
+        for r in rows
+    ]
+    return {"items": items, "total": total, "page": page, "pageSize": pageSize}
+
+@router.delete("/image-library/images/{asset_id}")
+def delete_library_image(*, asset_id: int, admin: dict = Depends(get_admin)):
+    asset = image_library.remove_image(asset_id)
+    if not asset:
+        raise HTTPException(status_code=404, detail="Image not found")
+    with Session(engine) as session:
+        session.add(AuditLog(actor=admin.get("sub"), action="image_library.delete", target_user_id=None, detail={"id": asset_id, "scope": asset.scope, "scope_id": asset.scope_id}))
+        session.commit()
+    return {"ok": True}
+
 @router.post("/ai/test")
+@bulkhead.offload("ai")
 def ai_test(request: Request, req: AiTestRequest, operator: dict = Depends(get_operator)):
     client_ip = get_client_ip(request)
     _rate_limit(f"ai_test:{client_ip}", limit=5, per_seconds=60)
@@ -1343,7 +1522,6 @@ def ai_test(request: Request, req: AiTestRequest, operator: dict = Depends(get_o
     endpoint = urljoin(base + "/", "chat/completions") if base.endswith("/v1") else urljoin(base + "/", "v1/chat/completions")
     if not _is_safe_outbound_url(endpoint):
         raise HTTPException(status_code=400, detail="AI API URL 不安全（仅允许 https 且禁止内网/本机地址）")
-    headers = {"Authorization": f"Bearer {api_key}"}
     payload = {
         "model": model,
         "messages": [{"role": "user", "content": "ping"}],
@@ -1352,7 +1530,7 @@ def ai_test(request: Request, req: AiTestRequest, operator: dict = Depends(get_o
     }
     t0 = time.time()
     try:
-        resp = requests.post(endpoint, headers=headers, json=payload, timeout=20)
+        resp = AiGateway.post(endpoint, api_key, payload, timeout=20, max_wait=10)
         latency_ms = int((time.time() - t0) * 1000)
         if resp.status_code >= 400:
             try:
@@ -1369,17 +1547,157 @@ def ai_test(request: Request, req: AiTestRequest, operator: dict = Depends(get_o
         return {"ok": True, "latency_ms": latency_ms, "reply": content}
     except HTTPException:
         raise
+    except AiGateway.AiGatewayBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"AI 接口请求失败: {str(e)}")
 
+@router.get("/ai/gateway/stats")
+def read_ai_gateway_stats(*, admin: dict = Depends(get_admin)):
+    return {"items": AiGateway.get_stats()}
+
+@router.get("/system/bulkheads")
+def read_bulkhead_stats(*, admin: dict = Depends(get_admin)):
+    return {"items": bulkhead.get_stats()}
+
+@router.get("/system/captcha")
+def read_captcha_stats(*, admin: dict = Depends(get_admin)):
+    return {"items": get_captcha_stats()}
+
+def _usage_phone(session: Session, user_id: Optional[int]) -> Optional[str]:
+    if user_id is None:
+        return None
+    user = session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user.phone
+
+@router.get("/ai/usage/providers")
+def read_ai_usage_providers(*, admin: dict = Depends(get_admin), days: int = Query(7, ge=1, le=90)):
+    return {"items": ai_usage.provider_summary(days=days), "days": days}
+
+@router.get("/ai/usage/daily")
+def read_ai_usage_daily(
+    *,
+    session: Session = Depends(get_session),
+    admin: dict = Depends(get_admin),
+    days: int = Query(30, ge=1, le=366),
+    user_id: Optional[int] = Query(None),
+    provider: Optional[str] = Query(None, max_length=255),
+):
+    phone = _usage_phone(session, user_id)
+    return {"items": ai_usage.daily_rollup(days=days, phone=phone, provider=provider), "days": days}
+
+@router.get("/ai/usage/users")
+def read_ai_usage_users(
+    *,
+    admin: dict = Depends(get_admin),
+    days: int = Query(30, ge=1, le=366),
+    limit: int = Query(50, ge=1, le=500),
+):
+    items = ai_usage.user_totals(days=days, limit=limit)
+    for item in items:
+        item["phone"] = _mask_phone(item["phone"])
+    return {"items": items, "days": days}
+
+@router.get("/ai/usage/calls")
+def read_ai_usage_calls(
+    *,
+    session: Session = Depends(get_session),
+    admin: dict = Depends(get_admin),
+    user_id: Optional[int] = Query(None),
+    provider: Optional[str] = Query(None, max_length=255),
+    outcome: Optional[str] = Query(None, max_length=32),
+    page: int = Query(1, ge=1),
+    pageSize: int = Query(50, ge=1, le=200),
+):
+    stmt = select(AiUsage)
+    phone = _usage_phone(session, user_id)
+    if phone:
+        stmt = stmt.where(AiUsage.phone == phone)
+    if provider:
+        stmt = stmt.where(AiUsage.provider == provider)
+    if outcome:
+        stmt = stmt.where(AiUsage.outcome == outcome)
+    total = session.exec(select(func.count()).select_from(stmt.subquery())).one()
+    rows = session.exec(stmt.order_by(AiUsage.id.desc()).offset((page - 1) * pageSize).limit(pageSize)).all()
+    items = [
+        {
+            "id": r.id,
+            "created_at": r.created_at.isoformat(sep=" ", timespec="seconds"),
+            "phone": _mask_phone(r.phone or ""),
+            "kind": r.kind,
+            "provider": r.provider,
+            "model": r.model,
+            "prompt_tokens": r.prompt_tokens,
+            "completion_tokens": r.completion_tokens,
+            "latency_ms": r.latency_ms,
+            "retries": r.retries,
+            "outcome": r.outcome,
+            "error": r.error,
+        }
+        for r in rows
+    ]
+    return {"items": items, "total": total, "page": page, "pageSize": pageSize}
+
+@router.get("/notifications/outbox")
+def read_notification_outbox(
+    *,
+    session: Session = Depends(get_session),
+    admin: dict = Depends(get_admin),
+    user_id: Optional[int] = Query(None),
+    status: Optional[str] = Query(None, max_length=16),
+    page: int = Query(1, ge=1),
+    pageSize: int = Query(50, ge=1, le=200),
+):
+    stmt = select(NotificationOutbox)
+    phone = _usage_phone(session, user_id)
+    if phone:
+        stmt = stmt.where(NotificationOutbox.phone == phone)
+    if status:
+        stmt = stmt.where(NotificationOutbox.status == status)
+    total = session.exec(select(func.count()).select_from(stmt.subquery())).one()
+    rows = session.exec(stmt.order_by(NotificationOutbox.id.desc()).offset((page - 1) * pageSize).limit(pageSize)).all()
+    counts = dict(session.exec(select(NotificationOutbox.status, func.count()).group_by(NotificationOutbox.status)).all())
+    items = [
+        {
+            "id": r.id,
+            "created_at": r.created_at.isoformat(sep=" ", timespec="seconds"),
+            "phone": _mask_phone(r.phone or ""),
+            "channel": r.channel,
+            "title": r.title,
+            "status": r.status,
+            "attempts": r.attempts,
+            "max_attempts": r.max_attempts,
+            "next_attempt_at": r.next_attempt_at.isoformat(sep=" ", timespec="seconds") if r.status == "pending" else None,
+            "sent_at": r.sent_at.isoformat(sep=" ", timespec="seconds") if r.sent_at else None,
+            "last_error": r.last_error,
+            "digest_count": r.digest_count,
+            "merged_into": r.merged_into,
+            "batch_job_id": r.batch_job_id,
+        }
+        for r in rows
+    ]
+    return {"items": items, "total": total, "page": page, "pageSize": pageSize, "counts": counts}
+
+@router.post("/notifications/outbox/{outbox_id}/retry")
+def retry_notification(*, session: Session = Depends(get_session), admin: dict = Depends(get_admin), outbox_id: int):
+    if not notification_outbox.retry(outbox_id):
+        raise HTTPException(status_code=400, detail="只能重试已放弃的推送")
+    session.add(AuditLog(actor=admin.get("sub"), action="notification.retry", target_user_id=None, detail={"outbox_id": outbox_id}))
+    session.commit()
+    return {"ok": True}
+
 
 @router.post("/users/{user_id}/reports/daily/generate")
+@bulkhead.offload("ai")
 def generate_daily_report(
     *,
     request: Request,
     session: Session = Depends(get_session),
     user_id: int,
     operator: dict = Depends(get_operator),
+    regenerate: bool = Query(False),
 ):
     client_ip = get_client_ip(request)
     _rate_limit(f"daily_gen:{client_ip}:{user_id}", limit=3, per_seconds=60)
@@ -1393,38 +1711,11 @@ def generate_daily_report(
     config = ConfigManager(config=config_data)
     api_client = ApiClient(config)
 
-    ai_cfg = config.get_value("config.ai")
-    if not isinstance(ai_cfg, dict):
-        raise HTTPException(status_code=400, detail="未配置 AI 参数")
-    if not (str(ai_cfg.get("apikey") or "").strip()) or not (str(ai_cfg.get("apiUrl") or "").strip()) or not (str(ai_cfg.get("model") or "").strip()):
-        raise HTTPException(status_code=400, detail="请先在 AI 设置中填写 API URL、API Key 和 Model")
+    _ensure_ai_config(config)
 
     try:
-        if not config.get_value("userInfo.token"):
-            api_client.login()
-        if config.get_value("userInfo.userType") != "teacher" and not config.get_value("planInfo.planId"):
-            api_client.fetch_internship_plan()
-
-        submitted = api_client.get_submitted_reports_info("day") or {}
-        data = submitted.get("data", []) if isinstance(submitted, dict) else []
-        count = (submitted.get("flag", 0) if isinstance(submitted, dict) else 0) + 1
-        title = f"第{count}天日报"
-
-        already_submitted = False
-        current_time = datetime.datetime.now()
-        if isinstance(data, list) and data:
-            last = data[0]
-            ts = last.get("createTime")
-            if isinstance(ts, str):
-                try:
-                    last_time = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
-                    if last_time.date() == current_time.date():
-                        already_submitted = True
-                except Exception:
-                    pass
-
-        job_info = api_client.get_job_info()
-        content = generate_article(config, title, job_info, config.get_value("planInfo.planPaper.dayPaperNum"))
+        title, already_submitted, job_info = _prepare_daily_report(config, api_client)
+        content = report_cache.generate_article_cached(config, title, job_info, config.get_value("planInfo.planPaper.dayPaperNum"), refresh=regenerate)
         return {"ok": True, "title": title, "content": content, "already_submitted": already_submitted}
     except HTTPException:
         raise
@@ -1432,7 +1723,35 @@ def generate_daily_report(
         raise HTTPException(status_code=400, detail=str(e) or "生成日报失败")
 
 
+@router.post("/users/{user_id}/reports/daily/generate/stream")
+def generate_daily_report_stream(
+    *,
+    request: Request,
+    session: Session = Depends(get_session),
+    user_id: int,
+    operator: dict = Depends(get_operator),
+    regenerate: bool = Query(False),
+):
+    client_ip = get_client_ip(request)
+    _rate_limit(f"daily_gen:{client_ip}:{user_id}", limit=3, per_seconds=60)
+    user = session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not (str(user.phone or "").strip()) or not (str(user.password or "").strip()):
+        raise HTTPException(status_code=400, detail="该用户未保存账号或密码，无法生成日报")
+
+    config_data = user_to_config(user)
+    config = ConfigManager(config=config_data)
+    api_client = ApiClient(config)
+
+    _ensure_ai_config(config)
+
+    stream = bulkhead.get("ai").stream(_daily_report_event_stream(config, api_client, regenerate=regenerate))
+    return StreamingResponse(stream, media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
 @router.post("/users/{user_id}/reports/daily/submit")
+@bulkhead.offload("moguding")
 def submit_daily_report_manual(
     *,
     request: Request,
@@ -1492,6 +1811,7 @@ def submit_daily_report_manual(
             "formFieldDtoList": api_client.get_from_info(7),
         }
         api_client.submit_report(report_info)
+        report_cache.forget(report_cache.cache_key(config, title, job_info, config.get_value("planInfo.planPaper.dayPaperNum")))
         return {"ok": True, "title": title, "submitted_at": report_info["reportTime"]}
     except HTTPException:
         raise
@@ -1500,51 +1820,62 @@ def submit_daily_report_manual(
 
 
 @router.get("/geocode/search")
+@bulkhead.offload("geocode")
 def geocode_search(q: str = Query(..., min_length=1, max_length=200), operator: dict = Depends(get_operator)):
     provider = (os.getenv("GEOCODE_PROVIDER") or "").strip().lower()
     amap_key = (os.getenv("AMAP_KEY") or "").strip()
     if not provider:
         provider = "amap" if amap_key else "osm"
-    q2 = (q or "").strip()
-    cache_key = ("search", provider, q2)
-    cached = _geocode_cache_get(cache_key)
-    if cached is not None:
-        return cached
-
+    q2 = geocode_cache.normalize_query(q)
     if provider == "amap" and amap_key:
-        try:
-            resp = requests.get(
-                "https://restapi.amap.com/v3/geocode/geo",
-                params={"key": amap_key, "address": q2, "output": "json"},
-                timeout=12,
-            )
-            resp.raise_for_status()
-            data = resp.json() or {}
-            geocodes = data.get("geocodes") or []
-            results: List[Dict[str, Any]] = []
-            for item in geocodes[:5]:
-                loc = item.get("location")
-                if not isinstance(loc, str) or "," not in loc:
-                    continue
-                lng_s, lat_s = loc.split(",", 1)
-                try:
-                    lon = float(lng_s)
-                    lat = float(lat_s)
-                except Exception:
-                    continue
-                label = item.get("formatted_address") or item.get("address") or q2
-                results.append({"x": lon, "y": lat, "label": label, "bounds": None, "raw": item})
-            out = {"results": results}
-            _geocode_cache_set(cache_key, out, ttl_seconds=6 * 60 * 60, maxsize=800)
-            return out
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=f"地理搜索失败: {str(e)}")
+        cache_key = geocode_cache.make_key("search", "amap", q2)
+        return _geocode_cached(cache_key, lambda: _amap_geocode_search(q2, amap_key), ttl_seconds=6 * 60 * 60)
+    cache_key = geocode_cache.make_key("search", provider, q2)
+    return _geocode_cached(cache_key, lambda: _osm_geocode_search(q2), ttl_seconds=60 * 60)
 
+def _geocode_cached(cache_key: str, fetch, ttl_seconds: int) -> Any:
+    try:
+        return geocode_cache.get_or_fetch(cache_key, fetch, ttl_seconds=ttl_seconds)
+    except geocode_cache.GeocodeThrottled as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+def _amap_geocode_search(q2: str, amap_key: str) -> Dict[str, Any]:
+    try:
+        geocode_cache.throttle("amap")
+        resp = requests.get(
+            "https://restapi.amap.com/v3/geocode/geo",
+            params={"key": amap_key, "address": q2, "output": "json"},
+            timeout=12,
+        )
+        resp.raise_for_status()
+        data = resp.json() or {}
+        geocodes = data.get("geocodes") or []
+        results: List[Dict[str, Any]] = []
+        for item in geocodes[:5]:
+            loc = item.get("location")
+            if not isinstance(loc, str) or "," not in loc:
+                continue
+            lng_s, lat_s = loc.split(",", 1)
+            try:
+                lon = float(lng_s)
+                lat = float(lat_s)
+            except Exception:
+                continue
+            label = item.get("formatted_address") or item.get("address") or q2
+            results.append({"x": lon, "y": lat, "label": label, "bounds": None, "raw": item})
+        return {"results": results}
+    except geocode_cache.GeocodeThrottled:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"地理搜索失败: {str(e)}")
+
+def _osm_geocode_search(q2: str) -> Dict[str, Any]:
     nominatim_base = NOMINATIM_BASE_URL.rstrip("/")
     params = {"q": q2, "format": "json", "limit": 5, "addressdetails": 1}
     headers = {"User-Agent": "AutoMoGuDingSaaS/1.0", "Accept-Language": "zh-CN,zh;q=0.9"}
     last_err: Optional[Exception] = None
     for attempt in range(2):
+        geocode_cache.throttle("osm")
         try:
             resp = requests.get(
                 f"{nominatim_base}/search",
@@ -1578,9 +1909,7 @@ def geocode_search(q: str = Query(..., min_length=1, max_length=200), operator:
                         "raw": item,
                     }
                 )
-            out = {"results": results}
-            _geocode_cache_set(cache_key, out, ttl_seconds=60 * 60, maxsize=800)
-            return out
+            return {"results": results}
         except Exception as e:
             last_err = e
             time.sleep(0.4 * (attempt + 1))
@@ -1588,6 +1917,7 @@ def geocode_search(q: str = Query(..., min_length=1, max_length=200), operator:
 
 
 @router.get("/geocode/reverse")
+@bulkhead.offload("geocode")
 def geocode_reverse(
     lat: float = Query(...),
     lon: float = Query(...),
@@ -1597,62 +1927,67 @@ def geocode_reverse(
     amap_key = (os.getenv("AMAP_KEY") or "").strip()
     if not provider:
         provider = "amap" if amap_key else "osm"
-    cache_key = ("reverse", provider, round(float(lat), 6), round(float(lon), 6))
-    cached = _geocode_cache_get(cache_key)
-    if cached is not None:
-        return cached
-
+    lat, lon = round(float(lat), 6), round(float(lon), 6)
     if provider == "amap" and amap_key:
-        try:
-            resp = requests.get(
-                "https://restapi.amap.com/v3/geocode/regeo",
-                params={
-                    "key": amap_key,
-                    "location": f"{lon},{lat}",
-                    "radius": 200,
-                    "extensions": "base",
-                    "output": "json",
-                },
-                timeout=12,
-            )
-            resp.raise_for_status()
-            data = resp.json() or {}
-            regeocode = data.get("regeocode") or {}
-            formatted = regeocode.get("formatted_address") or ""
-            comp = regeocode.get("addressComponent") or {}
-            province = comp.get("province") or ""
-            city = comp.get("city") or ""
-            if isinstance(city, list):
-                city = ""
-            district = comp.get("district") or ""
-            township = comp.get("township") or ""
-            neighborhood = (comp.get("neighborhood") or {}).get("name") if isinstance(comp.get("neighborhood"), dict) else ""
-            building = (comp.get("building") or {}).get("name") if isinstance(comp.get("building"), dict) else ""
-            name = building or neighborhood or township or district or city or province or ""
-            out = {
-                "display_name": formatted or name,
-                "name": name,
-                "address": {
-                    "province": province,
-                    "city": city,
-                    "county": district,
-                    "district": district,
-                    "town": township,
-                    "township": township,
-                },
-                "raw": data,
-            }
-            out2 = {"result": out}
-            _geocode_cache_set(cache_key, out2, ttl_seconds=6 * 60 * 60, maxsize=1200)
-            return out2
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=f"逆地理解析失败: {str(e)}")
+        cache_key = geocode_cache.make_key("reverse", "amap", lat, lon)
+        return _geocode_cached(cache_key, lambda: _amap_geocode_reverse(lat, lon, amap_key), ttl_seconds=6 * 60 * 60)
+    cache_key = geocode_cache.make_key("reverse", provider, lat, lon)
+    return _geocode_cached(cache_key, lambda: _osm_geocode_reverse(lat, lon), ttl_seconds=60 * 60)
+
+def _amap_geocode_reverse(lat: float, lon: float, amap_key: str) -> Dict[str, Any]:
+    try:
+        geocode_cache.throttle("amap")
+        resp = requests.get(
+            "https://restapi.amap.com/v3/geocode/regeo",
+            params={
+                "key": amap_key,
+                "location": f"{lon},{lat}",
+                "radius": 200,
+                "extensions": "base",
+                "output": "json",
+            },
+            timeout=12,
+        )
+        resp.raise_for_status()
+        data = resp.json() or {}
+        regeocode = data.get("regeocode") or {}
+        formatted = regeocode.get("formatted_address") or ""
+        comp = regeocode.get("addressComponent") or {}
+        province = comp.get("province") or ""
+        city = comp.get("city") or ""
+        if isinstance(city, list):
+            city = ""
+        district = comp.get("district") or ""
+        township = comp.get("township") or ""
+        neighborhood = (comp.get("neighborhood") or {}).get("name") if isinstance(comp.get("neighborhood"), dict) else ""
+        building = (comp.get("building") or {}).get("name") if isinstance(comp.get("building"), dict) else ""
+        name = building or neighborhood or township or district or city or province or ""
+        out = {
+            "display_name": formatted or name,
+            "name": name,
+            "address": {
+                "province": province,
+                "city": city,
+                "county": district,
+                "district": district,
+                "town": township,
+                "township": township,
+            },
+            "raw": data,
+        }
+        return {"result": out}
+    except geocode_cache.GeocodeThrottled:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"逆地理解析失败: {str(e)}")
 
+def _osm_geocode_reverse(lat: float, lon: float) -> Dict[str, Any]:
     nominatim_base = NOMINATIM_BASE_URL.rstrip("/")
     params = {"lat": lat, "lon": lon, "format": "json", "zoom": 18, "addressdetails": 1}
     headers = {"User-Agent": "AutoMoGuDingSaaS/1.0", "Accept-Language": "zh-CN,zh;q=0.9"}
     last_err: Optional[Exception] = None
     for attempt in range(2):
+        geocode_cache.throttle("osm")
         try:
             resp = requests.get(
                 f"{nominatim_base}/reverse",
@@ -1662,9 +1997,7 @@ def geocode_reverse(
             )
             resp.raise_for_status()
             data = resp.json()
-            out = {"result": data}
-            _geocode_cache_set(cache_key, out, ttl_seconds=60 * 60, maxsize=1200)
-            return out
+            return {"result": data}
         except Exception as e:
             last_err = e
             time.sleep(0.4 * (attempt + 1))
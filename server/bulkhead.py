@@ -0,0 +1,203 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 默认的 (线程数, 排队上限)：geocode 为地理编码，ai 为 AI 测试和报告生成，moguding 为访问工学云的接口
+_DEFAULTS: Dict[str, Tuple[int, int]] = {
+    "geocode": (4, 16),
+    "ai": (8, 16),
+    "moguding": (8, 32),
+}
+
+
+class BulkheadFull(Exception):
+    """隔舱内执行和排队的请求都已满，直接拒绝。"""
+
+    def __init__(self, name: str):
+        super().__init__(f"{name} 繁忙，请稍后重试")
+        self.name = name
+
+
+def _env_int(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(os.getenv(name) or str(default))
+    except Exception:
+        value = default
+    return max(lo, min(value, hi))
+
+
+class Bulkhead:
+    """
+    一类出站请求专用的线程池。
+
+    同时执行的请求不超过 workers，另有 queue 个排队名额；名额用完后新请求立即失败（BulkheadFull），
+    不再占用 Starlette 共用线程池，也不会无限排队。
+    """
+
+    def __init__(self, name: str, workers: int, queue: int):
+        self.name = name
+        self.workers = workers
+        self.capacity = workers + queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"bulkhead-{name}")
+        self.lock = threading.Lock()
+        self.active = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    def acquire(self) -> None:
+        with self.lock:
+            if self.active >= self.capacity:
+                self.rejected += 1
+                raise BulkheadFull(self.name)
+            self.active += 1
+            self.accepted += 1
+
+    def release(self) -> None:
+        with self.lock:
+            self.active -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        在隔舱线程池中执行 fn 并等待结果。
+
+        名额在任务结束（或排队中被取消）时归还，客户端提前断开不会让名额提前释放。
+
+        Raises:
+            BulkheadFull: 名额已满。
+        """
+        self.acquire()
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+        return await asyncio.wrap_future(future)
+
+    def stream(self, iterator: Iterator[Any]) -> "_BulkheadStream":
+        """
+        占用一个名额，把同步迭代器（如 SSE 生成器）交给隔舱线程池逐项读取。
+
+        Raises:
+            BulkheadFull: 名额已满。
+        """
+        self.acquire()
+        return _BulkheadStream(self, iterator)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "name": self.name,
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "active": self.active,
+                "queued": max(0, self.active - self.workers),
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+            }
+
+
+_END = object()
+
+
+class _BulkheadStream:
+    def __init__(self, bulkhead: Bulkhead, iterator: Iterator[Any]):
+        self._bulkhead = bulkhead
+        self._iterator = iterator
+        self._released = False
+
+    def _release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._bulkhead.release()
+        close = getattr(self._iterator, "close", None)
+        if close:
+            try:
+                close()
+            except Exception:
+                pass
+
+    def __aiter__(self) -> "_BulkheadStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        if self._released:
+            raise StopAsyncIteration
+        try:
+            item = await asyncio.wrap_future(self._bulkhead.executor.submit(next, self._iterator, _END))
+        except BaseException:
+            self._release()
+            raise
+        if item is _END:
+            self._release()
+            raise StopAsyncIteration
+        return item
+
+    async def aclose(self) -> None:
+        self._release()
+
+    def __del__(self) -> None:
+        # 响应未读完就被丢弃（如客户端断开）时归还名额
+        self._release()
+
+
+_BULKHEADS: Dict[str, Bulkhead] = {}
+_BULKHEADS_LOCK = threading.Lock()
+
+
+def get(name: str) -> Bulkhead:
+    """
+    按类别取隔舱，首次使用时创建。
+
+    线程数和排队上限分别由 BULKHEAD_<NAME>_WORKERS、BULKHEAD_<NAME>_QUEUE 配置，例如 BULKHEAD_GEOCODE_WORKERS。
+    """
+    with _BULKHEADS_LOCK:
+        bulkhead = _BULKHEADS.get(name)
+        if bulkhead is None:
+            workers, queue = _DEFAULTS.get(name, (4, 16))
+            prefix = f"BULKHEAD_{name.upper()}"
+            bulkhead = Bulkhead(
+                name,
+                _env_int(f"{prefix}_WORKERS", workers, 1, 64),
+                _env_int(f"{prefix}_QUEUE", queue, 0, 1000),
+            )
+            _BULKHEADS[name] = bulkhead
+        return bulkhead
+
+
+def offload(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    装饰同步的路由函数，改为在指定隔舱中执行。
+
+    functools.wraps 保留原函数签名，FastAPI 仍按原参数解析依赖；名额已满时抛出 BulkheadFull。
+    """
+
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return await get(name).run(fn, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_stats() -> List[Dict[str, Any]]:
+    with _BULKHEADS_LOCK:
+        bulkheads = list(_BULKHEADS.values())
+    return [b.stats() for b in bulkheads]
+
+
+def shutdown() -> None:
+    with _BULKHEADS_LOCK:
+        bulkheads = list(_BULKHEADS.values())
+        _BULKHEADS.clear()
+    for b in bulkheads:
+        b.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,359 @@
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class AiGatewayBusy(ValueError):
+    """排队等待超过上限，放弃本次 AI 请求。"""
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or str(default))
+    except Exception:
+        return default
+
+
+def _provider_limits(host: str) -> Tuple[int, float]:
+    """
+    读取服务商的并发与 QPS 限制。
+
+    默认值来自 AI_MAX_CONCURRENCY / AI_QPS（0 表示不限速），
+    可通过 AI_PROVIDER_LIMITS 按域名覆盖，例如 {"api.deepseek.com": {"concurrency": 4, "qps": 2}}。
+    """
+    concurrency = int(_env_float("AI_MAX_CONCURRENCY", 8))
+    qps = _env_float("AI_QPS", 0)
+    try:
+        overrides = json.loads(os.getenv("AI_PROVIDER_LIMITS") or "{}")
+        limits = overrides.get(host) or {}
+        concurrency = int(limits.get("concurrency", concurrency))
+        qps = float(limits.get("qps", qps))
+    except Exception:
+        pass
+    return max(1, min(concurrency, 200)), max(0.0, qps)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = email.utils.parsedate_to_datetime(value)
+        return max(0.0, dt.timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class _Provider:
+    def __init__(self, endpoint: str, key_hash: str):
+        self.endpoint = endpoint
+        self.host = urlparse(endpoint).hostname or ""
+        self.key_hash = key_hash
+        self.concurrency, self.qps = _provider_limits(self.host)
+        self.semaphore = threading.BoundedSemaphore(self.concurrency)
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency))
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+        self.cooldown_until = 0.0
+        self.last_used = time.monotonic()
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.last_failure_at = 0.0
+        self.waits: Deque[float] = deque(maxlen=500)
+        # 最近成功请求的耗时，用于计算对冲阈值（p95）
+        self.latencies: Deque[float] = deque(maxlen=200)
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        with self.lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+    def record_result(self, ok: bool, latency: Optional[float] = None) -> None:
+        with self.lock:
+            if ok:
+                self.consecutive_failures = 0
+                if latency is not None:
+                    self.latencies.append(latency)
+            else:
+                self.consecutive_failures += 1
+                self.last_failure_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            waits = sorted(self.waits)
+            now = time.monotonic()
+            return {
+                "host": self.host,
+                "endpoint": self.endpoint,
+                "key": self.key_hash[:8],
+                "concurrency": self.concurrency,
+                "qps": self.qps,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "requests": self.requests,
+                "rejected": self.rejected,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "cooldown_seconds": round(max(0.0, self.cooldown_until - now), 1),
+                "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "wait_p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+                "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+                "latency_samples": len(self.latencies),
+                "latency_p50_ms": _quantile_ms(self.latencies, 0.5),
+                "latency_p95_ms": _quantile_ms(self.latencies, 0.95),
+                "consecutive_failures": self.consecutive_failures,
+            }
+
+
+def _quantile_ms(values: Deque[float], q: float) -> float:
+    samples = sorted(values)
+    if not samples:
+        return 0.0
+    return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 1)
+
+
+_PROVIDERS: Dict[Tuple[str, str], _Provider] = {}
+_PROVIDERS_LOCK = threading.Lock()
+
+
+def _get_provider(endpoint: str, api_key: str) -> _Provider:
+    key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+    key = (endpoint, key_hash)
+    with _PROVIDERS_LOCK:
+        provider = _PROVIDERS.get(key)
+        if provider is None:
+            provider = _Provider(endpoint, key_hash)
+            _PROVIDERS[key] = provider
+            _evict_idle_locked()
+        provider.last_used = time.monotonic()
+        return provider
+
+
+def _evict_idle_locked() -> None:
+    if len(_PROVIDERS) <= 64:
+        return
+    now = time.monotonic()
+    for key, p in list(_PROVIDERS.items()):
+        if p.in_flight == 0 and p.waiting == 0 and now - p.last_used > 3600:
+            _PROVIDERS.pop(key, None)
+            p.session.close()
+
+
+@contextmanager
+def _slot(provider: _Provider, max_wait: float) -> Iterator[float]:
+    """
+    获取一个请求名额：并发信号量 -> Retry-After 冷却 -> QPS 间隔。
+
+    Yields:
+        float: 排队等待的秒数。
+    """
+    t0 = time.monotonic()
+    with provider.lock:
+        provider.waiting += 1
+    try:
+        acquired = provider.semaphore.acquire(timeout=max_wait)
+    finally:
+        with provider.lock:
+            provider.waiting -= 1
+    if not acquired:
+        with provider.lock:
+            provider.rejected += 1
+        raise AiGatewayBusy(f"AI 服务繁忙，排队超过 {max_wait:g} 秒")
+
+    try:
+        with provider.lock:
+            now = time.monotonic()
+            start = max(now, provider.cooldown_until)
+            if provider.qps > 0:
+                start = max(start, provider.next_slot)
+                provider.next_slot = start + 1.0 / provider.qps
+        delay = start - time.monotonic()
+        if delay > 0:
+            if time.monotonic() + delay - t0 > max_wait:
+                with provider.lock:
+                    provider.rejected += 1
+                raise AiGatewayBusy(f"AI 服务限流中，需等待 {delay:.0f} 秒")
+            time.sleep(delay)
+
+        wait = time.monotonic() - t0
+        with provider.lock:
+            provider.in_flight += 1
+            provider.requests += 1
+            provider.waits.append(wait)
+        if wait >= 1:
+            logger.info(f"AI 请求排队 {wait:.1f}s（{provider.host}）")
+        try:
+            yield wait
+        finally:
+            with provider.lock:
+                provider.in_flight -= 1
+    finally:
+        provider.semaphore.release()
+
+
+def _observe_response(provider: _Provider, resp: requests.Response) -> None:
+    if resp.status_code not in (429, 503):
+        return
+    retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+    if retry_after is None:
+        retry_after = _env_float("AI_DEFAULT_COOLDOWN_SECONDS", 5) if resp.status_code == 429 else 0
+    retry_after = min(retry_after, _env_float("AI_MAX_COOLDOWN_SECONDS", 120))
+    with provider.lock:
+        provider.throttled += 1
+        provider.cooldown_until = max(provider.cooldown_until, time.monotonic() + retry_after)
+    if retry_after > 0:
+        logger.warning(f"AI 服务返回 {resp.status_code}，{retry_after:.0f}s 内暂停向 {provider.host} 发送请求")
+
+
+def post(
+    endpoint: str,
+    api_key: str,
+    payload: Dict[str, Any],
+    timeout: float = 600,
+    max_wait: Optional[float] = None,
+) -> requests.Response:
+    """
+    通过网关向 OpenAI 兼容接口发送请求。
+
+    同一 (接口地址, API Key) 共享连接池、并发上限和 QPS 限制，
+    收到 429/503 时按 Retry-After 暂停该服务商的后续请求。
+
+    Args:
+        endpoint (str): chat/completions 完整地址。
+        api_key (str): API Key。
+        payload (Dict[str, Any]): 请求体。
+        timeout (float): 请求超时时间（秒）。
+        max_wait (Optional[float]): 最长排队时间（秒），默认 AI_QUEUE_MAX_WAIT_SECONDS。
+
+    Returns:
+        requests.Response: 原始响应。
+
+    Raises:
+        AiGatewayBusy: 排队超时。
+        requests.exceptions.RequestException: 网络错误。
+    """
+    provider = _get_provider(endpoint, api_key)
+    with _slot(provider, _max_wait(max_wait)):
+        t0 = time.monotonic()
+        resp = _send(provider, api_key, payload, timeout, stream=False)
+        if resp.status_code < 400:
+            provider.record_result(True, time.monotonic() - t0)
+        elif resp.status_code >= 500 or resp.status_code == 429:
+            provider.record_result(False)
+        return resp
+
+
+@contextmanager
+def stream(
+    endpoint: str,
+    api_key: str,
+    payload: Dict[str, Any],
+    timeout: float = 600,
+    max_wait: Optional[float] = None,
+) -> Iterator[requests.Response]:
+    """
+    以流式方式发送请求（payload 需自带 "stream": true），参数同 post。
+
+    请求名额一直占用到 with 块结束、响应关闭为止，流式读取期间同样计入并发上限。
+
+    Yields:
+        requests.Response: 未读取响应体的原始响应。
+    """
+    provider = _get_provider(endpoint, api_key)
+    with _slot(provider, _max_wait(max_wait)):
+        resp = _send(provider, api_key, payload, timeout, stream=True)
+        if resp.status_code < 400:
+            provider.record_result(True)
+        elif resp.status_code >= 500 or resp.status_code == 429:
+            provider.record_result(False)
+        try:
+            yield resp
+        finally:
+            resp.close()
+
+
+def queue_max_wait() -> float:
+    """默认最长排队时间（秒），即 AI_QUEUE_MAX_WAIT_SECONDS。"""
+    return _env_float("AI_QUEUE_MAX_WAIT_SECONDS", 120)
+
+
+def _max_wait(max_wait: Optional[float]) -> float:
+    if max_wait is None:
+        return queue_max_wait()
+    return max_wait
+
+
+def _send(provider: _Provider, api_key: str, payload: Dict[str, Any], timeout: float, stream: bool) -> requests.Response:
+    headers = {"Authorization": f"Bearer {api_key}"}
+    try:
+        resp = provider.session.post(provider.endpoint, headers=headers, json=payload, timeout=timeout, stream=stream)
+    except requests.exceptions.RequestException:
+        with provider.lock:
+            provider.errors += 1
+        provider.record_result(False)
+        raise
+    _observe_response(provider, resp)
+    return resp
+
+
+def record_latency(endpoint: str, api_key: str, latency: float) -> None:
+    """记录一次完整读完的流式请求耗时（stream 本身无法区分读完和中途断开），参与 p95 统计。"""
+    _get_provider(endpoint, api_key).record_result(True, latency)
+
+
+def latency_p95(endpoint: str, api_key: str) -> Optional[float]:
+    """
+    最近成功请求耗时的 p95（秒），样本数不足 AI_HEDGE_MIN_SAMPLES 时返回 None。
+    """
+    provider = _get_provider(endpoint, api_key)
+    with provider.lock:
+        count = len(provider.latencies)
+    if count < int(_env_float("AI_HEDGE_MIN_SAMPLES", 10)):
+        return None
+    return provider.latency_quantile(0.95)
+
+
+def is_healthy(endpoint: str, api_key: str) -> bool:
+    """
+    服务商当前是否可用：不在 Retry-After 冷却期，且没有在 AI_UNHEALTHY_SECONDS 内连续失败 3 次以上。
+    """
+    provider = _get_provider(endpoint, api_key)
+    now = time.monotonic()
+    with provider.lock:
+        if provider.cooldown_until > now:
+            return False
+        if provider.consecutive_failures >= 3 and now - provider.last_failure_at < _env_float("AI_UNHEALTHY_SECONDS", 60):
+            return False
+    return True
+
+
+def get_stats() -> List[Dict[str, Any]]:
+    with _PROVIDERS_LOCK:
+        providers = list(_PROVIDERS.values())
+    return [p.stats() for p in providers]
@@ -1,13 +1,19 @@
+import hashlib
+import json
 import logging
+import os
+import socket
 import time
 import threading
-from typing import Dict, Any, Optional
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from urllib.parse import urljoin
 
-import requests
-from requests.exceptions import RequestException
+from requests.exceptions import RequestException, Timeout
 
-from server.util.HelperFunctions import strip_markdown
+from server import ai_usage
+from server.coreApi import AiGateway
+from server.util.HelperFunctions import MarkdownStreamStripper, strip_markdown
 from server.util.LoggerContext import _log_ctx
 
 logger = logging.getLogger(__name__)
@@ -33,40 +39,18 @@ def _truncate_to_chars(text: str, max_chars: int) -> str:
     return text[:max_chars].rstrip()
 
 
-def generate_article(
-    config: Any,
-    title: str,
-    job_info: Dict[str, Any],
-    count: int = 500,
-    max_retries: int = 3,
-    retry_delay: int = 1,
-    timeout: int = 600,
-) -> str:
+def _build_request(config: Any, title: str, job_info: Dict[str, Any], count: int) -> Tuple[str, str, Dict[str, Any], int]:
     """
-    生成日报、周报、月报。
+    组装 chat/completions 请求。
 
-    Args:
-        config: 配置管理器，负责提供 API 配置。
-        title: 文章标题。
-        job_info: 工作相关信息字典。
-        count: 字数下限，默认500。
-        max_retries: 最大重试次数，默认3。
-        retry_delay: 每次重试的延迟时间（秒）。
-        timeout: 请求超时时间（秒）。
     Returns:
-        生成的文章内容字符串。
-    Raises:
-        ValueError: 超过最大重试、响应异常、内容异常。
+        Tuple[str, str, Dict[str, Any], int]: (接口地址, API Key, 请求体, 字数上限)。
     """
-
     # 获取所有配置，仅调用一次
     api_key = config.get_value("config.ai.apikey")
     api_base_url = config.get_value("config.ai.apiUrl")
     api_model = config.get_value("config.ai.model")
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-    }
     api_url = _resolve_chat_completions_url(api_base_url)
 
     min_count = _clamp_int(count, default=500, min_value=1, max_value=1000)
@@ -103,36 +87,362 @@ def generate_article(
         ],
         "max_tokens": 1200,
     }
+    return api_url, api_key, data, max_chars
 
-    def parse_response(resp_json: Dict) -> Optional[str]:
-        """
-        从接口响应解析content，返回None表示解析失败。
-        """
-        try:
-            choices = resp_json.get("choices")
-            if not choices or not isinstance(choices, list):
-                return None
-            return choices[0].get("message", {}).get("content",
-                                                     "").strip() or None
-        except Exception as e:
-            logger.exception("解析响应发生异常")
+
+def article_cache_key(config: Any, title: str, job_info: Dict[str, Any], count: int = 500) -> str:
+    """
+    生成内容缓存键：对实际发送的模型和提示词取哈希，模型、标题、字数或岗位信息任一变化都会得到不同的键。
+    """
+    _, _, data, _ = _build_request(config, title, job_info or {}, count)
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def resolve_providers(ai: Any) -> List[Dict[str, str]]:
+    """
+    按优先级返回 AI 服务商列表：用户主配置 -> config.ai.providers -> 全局默认池 AI_DEFAULT_PROVIDERS。
+
+    每个服务商为 {"apiUrl", "apikey", "model"}，字段不全的条目和重复条目会被忽略。
+    AI_DEFAULT_PROVIDERS 为 JSON 数组，格式同 config.ai.providers。
+    """
+    ai = ai if isinstance(ai, dict) else {}
+    candidates: List[Any] = [ai]
+    if isinstance(ai.get("providers"), list):
+        candidates.extend(ai["providers"])
+    try:
+        pool = json.loads(os.getenv("AI_DEFAULT_PROVIDERS") or "[]")
+        if isinstance(pool, list):
+            candidates.extend(pool)
+    except Exception as e:
+        logger.warning(f"AI_DEFAULT_PROVIDERS 格式错误: {e}")
+
+    providers: List[Dict[str, str]] = []
+    seen = set()
+    for item in candidates:
+        if not isinstance(item, dict):
+            continue
+        provider = {k: str(item.get(k) or "").strip() for k in ("apiUrl", "apikey", "model")}
+        if not all(provider.values()):
+            continue
+        key = (provider["apiUrl"].rstrip("/"), provider["apikey"], provider["model"])
+        if key in seen:
+            continue
+        seen.add(key)
+        providers.append(provider)
+    return providers
+
+
+def _parse_content(resp_json: Dict) -> Optional[str]:
+    """
+    从接口响应解析content，返回None表示解析失败。
+    """
+    try:
+        choices = resp_json.get("choices")
+        if not choices or not isinstance(choices, list):
             return None
+        return choices[0].get("message", {}).get("content",
+                                                 "").strip() or None
+    except Exception as e:
+        logger.exception("解析响应发生异常")
+        return None
+
+
+def _request_content(provider: Dict[str, str], data: Dict[str, Any], timeout: float, phone: Optional[str] = None, retries: int = 0) -> str:
+    api_url = _resolve_chat_completions_url(provider["apiUrl"])
+    started = time.monotonic()
+    outcome, error, tokens = "error", None, {}
+    try:
+        response = AiGateway.post(api_url, provider["apikey"], dict(data, model=provider["model"]), timeout=timeout)
+        response.raise_for_status()
+        resp_json = response.json()
+        tokens = ai_usage.usage_tokens(resp_json)
+        content = _parse_content(resp_json)
+        if not content:
+            outcome = "empty"
+            logger.error("AI 返回内容为空或格式不正确")
+            raise ValueError("AI 返回内容为空或格式不正确")
+        outcome = "ok"
+        return content
+    except AiGateway.AiGatewayBusy as e:
+        outcome, error = "busy", str(e)
+        raise
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        ai_usage.record_ai_call(
+            api_url, provider["model"], time.monotonic() - started, outcome,
+            phone=phone, retries=retries, error=error, **tokens,
+        )
+
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            workers = _clamp_int(os.getenv("AI_HEDGE_WORKERS"), default=32, min_value=2, max_value=256)
+            _hedge_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-hedge")
+        return _hedge_executor
+
+
+def _run_with_log_tag(tag: str, fn, *args):
+    _log_ctx.tag = tag
+    try:
+        return fn(*args)
+    finally:
+        _log_ctx.tag = "-"
+
+
+def _hedge_delay(provider: Dict[str, str]) -> Optional[float]:
+    """
+    等待多久后向下一个服务商发出对冲请求：取该服务商最近成功请求耗时的 p95，
+    样本不足时使用 AI_HEDGE_DEFAULT_SECONDS。AI_HEDGE=0 时不对冲，仅在失败后切换。
+    """
+    if (os.getenv("AI_HEDGE") or "1").strip().lower() in ["0", "false", "no", "off"]:
+        return None
+    p95 = AiGateway.latency_p95(_resolve_chat_completions_url(provider["apiUrl"]), provider["apikey"])
+    if p95 is None:
+        p95 = _clamp_int(os.getenv("AI_HEDGE_DEFAULT_SECONDS"), default=60, min_value=1, max_value=600)
+    return max(float(_clamp_int(os.getenv("AI_HEDGE_MIN_SECONDS"), default=3, min_value=0, max_value=600)), p95)
+
+
+def _ordered_by_health(providers: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    healthy = [p for p in providers if AiGateway.is_healthy(_resolve_chat_completions_url(p["apiUrl"]), p["apikey"])]
+    return healthy + [p for p in providers if p not in healthy]
+
+
+class _HedgeGroup:
+    """一组对冲请求共享的取消标记；某个请求胜出后关闭其余请求的连接，尽快归还线程和网关名额。"""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._responses: List[Any] = []
+
+    def register(self, response: Any) -> None:
+        with self._lock:
+            self._responses.append(response)
+        if self.cancelled.is_set():
+            self._abort(response)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        with self._lock:
+            responses = list(self._responses)
+        for response in responses:
+            self._abort(response)
+
+    @staticmethod
+    def _abort(response: Any) -> None:
+        # response.close() 会等待读取线程释放缓冲区锁；直接关闭底层 socket，阻塞中的读取立即返回，
+        # 由请求线程自己退出 with 块并归还名额。取不到 socket 时，请求线程在读到下一行时检查取消标记
+        raw = response.raw
+        sock = getattr(getattr(raw, "connection", None), "sock", None)
+        if sock is None:
+            # 服务端声明 Connection: close 时连接对象已不持有 socket，从响应的文件对象取
+            sock = getattr(getattr(getattr(getattr(raw, "_fp", None), "fp", None), "raw", None), "_sock", None)
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _request_content_streamed(
+    provider: Dict[str, str],
+    data: Dict[str, Any],
+    deadline: float,
+    group: _HedgeGroup,
+    phone: Optional[str] = None,
+    retries: int = 0,
+) -> str:
+    """
+    对冲使用的请求：以流式接口逐行读取，超时、排队时间都不超过调用方剩余的 deadline；
+    落选（group 已取消）时立即断开连接。不支持流式的服务商返回普通 JSON 时照常解析。
+    """
+    api_url = _resolve_chat_completions_url(provider["apiUrl"])
+    started = time.monotonic()
+    outcome, error, tokens = "error", None, {}
+    try:
+        if group.cancelled.is_set():
+            outcome = "cancelled"
+            raise Timeout("对冲请求已落选")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise Timeout("AI 请求已超过截止时间")
+        payload = dict(data, model=provider["model"], stream=True)
+        max_wait = min(AiGateway.queue_max_wait(), remaining)
+        with AiGateway.stream(api_url, provider["apikey"], payload, timeout=remaining, max_wait=max_wait) as response:
+            group.register(response)
+            response.raise_for_status()
+            if "text/event-stream" not in (response.headers.get("Content-Type") or ""):
+                resp_json = response.json()
+                tokens = ai_usage.usage_tokens(resp_json)
+                content = _parse_content(resp_json)
+            else:
+                response.encoding = "utf-8"
+                parts: List[str] = []
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if group.cancelled.is_set():
+                        break
+                    if time.monotonic() > deadline:
+                        raise Timeout("AI 请求已超过截止时间")
+                    line = line or ""
+                    if '"usage"' in line and line.startswith("data:"):
+                        try:
+                            tokens = ai_usage.usage_tokens(json.loads(line[5:].strip())) or tokens
+                        except Exception:
+                            pass
+                    delta = _parse_stream_delta(line)
+                    if delta is None:
+                        break
+                    parts.append(delta)
+                content = "".join(parts).strip() or None
+        if group.cancelled.is_set():
+            outcome = "cancelled"
+            raise Timeout("对冲请求已落选")
+        if not content:
+            outcome = "empty"
+            logger.error("AI 返回内容为空或格式不正确")
+            raise ValueError("AI 返回内容为空或格式不正确")
+        outcome = "ok"
+        AiGateway.record_latency(api_url, provider["apikey"], time.monotonic() - started)
+        return content
+    except AiGateway.AiGatewayBusy as e:
+        outcome, error = "busy", str(e)
+        raise
+    except Exception as e:
+        if group.cancelled.is_set():
+            # 被其他请求的胜出中断，连接关闭引起的异常不计为失败
+            outcome = "cancelled"
+        error = str(e)
+        raise
+    finally:
+        ai_usage.record_ai_call(
+            api_url, provider["model"], time.monotonic() - started, outcome,
+            phone=phone, retries=retries, error=error if outcome != "cancelled" else None, **tokens,
+        )
+
+
+def _hedged_request(providers: List[Dict[str, str]], data: Dict[str, Any], timeout: float, phone: Optional[str] = None, retries: int = 0) -> str:
+    """
+    按顺序请求多个服务商，取最先返回的有效结果。
+
+    当前请求超过其 p95 耗时仍未返回时向下一个服务商发出对冲请求（同时进行的请求数不超过
+    AI_HEDGE_MAX_PARALLEL），请求失败时立即切换到下一个。冷却中或连续失败的服务商排在最后。
+    所有请求共用 timeout 秒的截止时间；有请求胜出或超过截止时间后，其余请求立即断开，
+    归还对冲线程和网关名额。
+    """
+    order = _ordered_by_health(providers)
+    max_parallel = _clamp_int(os.getenv("AI_HEDGE_MAX_PARALLEL"), default=2, min_value=1, max_value=len(order))
+    executor = _get_hedge_executor()
+    log_tag = getattr(_log_ctx, "tag", "-")
+    deadline = time.monotonic() + timeout
+    group = _HedgeGroup()
+
+    pending: Dict[Future, Dict[str, str]] = {}
+    errors: List[Exception] = []
+    next_index = 0
+    launched_at = 0.0
+
+    def launch() -> None:
+        nonlocal next_index, launched_at
+        provider = order[next_index]
+        next_index += 1
+        launched_at = time.monotonic()
+        pending[executor.submit(
+            _run_with_log_tag, log_tag, _request_content_streamed, provider, data, deadline, group, phone, retries
+        )] = provider
+
+    try:
+        launch()
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise Timeout(f"AI 请求超过 {timeout:g} 秒仍未返回")
+            wait_for = remaining
+            hedging = False
+            if next_index < len(order) and len(pending) < max_parallel:
+                delay = _hedge_delay(order[next_index - 1])
+                if delay is not None and launched_at + delay - time.monotonic() < remaining:
+                    wait_for = max(0.0, launched_at + delay - time.monotonic())
+                    hedging = True
+            done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+            if not done:
+                if hedging:
+                    slow = order[next_index - 1]
+                    logger.info(f"{slow['model']} 超过 p95 耗时仍未返回，对冲请求 {order[next_index]['model']}")
+                    launch()
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    content = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    logger.warning(f"AI 服务 {provider['model']} ({provider['apiUrl']}) 请求失败：{e}")
+                    continue
+                if next_index > 1:
+                    logger.info(f"采用 {provider['model']} 的结果")
+                return content
+            if next_index < len(order) and len(pending) < max_parallel:
+                launch()
+    finally:
+        group.cancel()
+
+    # 有网络错误时抛出 RequestException，由外层按重试次数重试
+    for e in errors:
+        if isinstance(e, RequestException):
+            raise e
+    raise errors[-1]
+
+
+def generate_article(
+    config: Any,
+    title: str,
+    job_info: Dict[str, Any],
+    count: int = 500,
+    max_retries: int = 3,
+    retry_delay: int = 1,
+    timeout: int = 600,
+) -> str:
+    """
+    生成日报、周报、月报。
+
+    Args:
+        config: 配置管理器，负责提供 API 配置。
+        title: 文章标题。
+        job_info: 工作相关信息字典。
+        count: 字数下限，默认500。
+        max_retries: 最大重试次数，默认3。
+        retry_delay: 每次重试的延迟时间（秒）。
+        timeout: 请求超时时间（秒）。
+    Returns:
+        生成的文章内容字符串。
+    Raises:
+        ValueError: 超过最大重试、响应异常、内容异常。
+    """
+
+    _, _, data, max_chars = _build_request(config, title, job_info, count)
+    providers = resolve_providers(config.get_value("config.ai"))
+    if not providers:
+        raise ValueError("未配置可用的 AI 服务")
+    phone = config.get_value("config.user.phone")
 
     # === 主重试流程 ===
     for attempt in range(1, max_retries + 1):
         try:
             logger.info(f"第 {attempt} 次请求，标题：{title}")
-            response = requests.post(
-                url=api_url,
-                headers=headers,
-                json=data,
-                timeout=timeout,
-            )
-            response.raise_for_status()
-            content = parse_response(response.json())
-            if not content:
-                logger.error("AI 返回内容为空或格式不正确")
-                raise ValueError("AI 返回内容为空或格式不正确")
+            if len(providers) == 1:
+                content = _request_content(providers[0], data, timeout, phone, attempt - 1)
+            else:
+                content = _hedged_request(providers, data, timeout, phone, attempt - 1)
             logger.info("文章生成成功")
             cleaned = strip_markdown(content)
             return _truncate_to_chars(cleaned, max_chars)
@@ -152,3 +462,107 @@ def generate_article(
             time.sleep(retry_delay)
 
     raise ValueError("文章生成失败，所有重试均未成功")
+
+
+def _parse_stream_delta(line: str) -> Optional[str]:
+    """
+    解析一行 SSE 数据，返回增量文本；结束标记返回 None，其他无关行返回空字符串。
+    """
+    if not line.startswith("data:"):
+        return ""
+    payload = line[5:].strip()
+    if payload == "[DONE]":
+        return None
+    try:
+        choices = json.loads(payload).get("choices")
+        if not choices or not isinstance(choices, list):
+            return ""
+        return (choices[0].get("delta") or {}).get("content") or ""
+    except Exception:
+        return ""
+
+
+def generate_article_stream(
+    config: Any,
+    title: str,
+    job_info: Dict[str, Any],
+    count: int = 500,
+    max_retries: int = 3,
+    retry_delay: int = 1,
+    timeout: int = 600,
+) -> Iterator[str]:
+    """
+    流式生成日报、周报、月报，参数与 generate_article 相同。
+
+    使用 "stream": true 请求接口，边接收边过滤 Markdown 并按字数上限截断，
+    逐段产出过滤后的文本，拼接后即为完整文章。达到字数上限后立即断开连接。
+    尚未产出任何内容时，网络错误会切换到下一个服务商重试（见 resolve_providers）。
+
+    Yields:
+        str: 过滤后的增量文本。
+
+    Raises:
+        ValueError: 超过最大重试、响应异常、内容为空。
+    """
+    _, _, data, max_chars = _build_request(config, title, job_info, count)
+    providers = _ordered_by_health(resolve_providers(config.get_value("config.ai")))
+    if not providers:
+        raise ValueError("未配置可用的 AI 服务")
+    phone = config.get_value("config.user.phone")
+
+    attempts = max(max_retries, len(providers))
+    for attempt in range(1, attempts + 1):
+        provider = providers[(attempt - 1) % len(providers)]
+        api_url = _resolve_chat_completions_url(provider["apiUrl"])
+        payload = dict(data, model=provider["model"], stream=True)
+        stripper = MarkdownStreamStripper()
+        emitted = 0
+        started = time.monotonic()
+        outcome, error = "error", None
+        try:
+            logger.info(f"第 {attempt} 次流式请求，标题：{title}")
+            with AiGateway.stream(api_url, provider["apikey"], payload, timeout=timeout) as response:
+                response.raise_for_status()
+                response.encoding = "utf-8"
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    delta = _parse_stream_delta(line or "")
+                    if delta is None:
+                        break
+                    text = stripper.feed(delta)[:max_chars - emitted]
+                    if text:
+                        emitted += len(text)
+                        yield text
+                    if emitted >= max_chars:
+                        break
+                if emitted < max_chars:
+                    text = stripper.finish()[:max_chars - emitted]
+                    if text:
+                        emitted += len(text)
+                        yield text
+            if not emitted:
+                outcome = "empty"
+                logger.error("AI 返回内容为空或格式不正确")
+                raise ValueError("AI 返回内容为空或格式不正确")
+            outcome = "ok"
+            logger.info("文章生成成功（流式）")
+            return
+        except (RequestException, AiGateway.AiGatewayBusy) as e:
+            outcome = "busy" if isinstance(e, AiGateway.AiGatewayBusy) else "error"
+            error = str(e)
+            # 尚未输出内容时切换到下一个服务商，轮完一圈后再等待重试
+            logger.warning(f"网络请求错误 （尝试 {attempt}/{attempts}）：{e}")
+            if emitted or attempt == attempts:
+                raise ValueError(f"网络异常，生成失败: {e}")
+            if attempt % len(providers) == 0:
+                time.sleep(retry_delay)
+        except GeneratorExit:
+            # 调用方提前停止读取（如浏览器断开）
+            outcome = "cancelled"
+            raise
+        finally:
+            ai_usage.record_ai_call(
+                api_url, provider["model"], time.monotonic() - started, outcome,
+                phone=phone, retries=attempt - 1, error=error, kind="stream",
+            )
+
+    raise ValueError("文章生成失败，所有重试均未成功")
@@ -1,10 +1,57 @@
+import os
+import random
 import requests
+import threading
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
+from requests.adapters import HTTPAdapter
+
 logger = logging.getLogger(__name__)
 
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+# 上一次分配的微秒时间戳，保证同一进程内生成的 key 严格递增
+_LAST_KEY_US = 0
+_KEY_LOCK = threading.Lock()
+
+
+class UploadTokenExpired(Exception):
+    """七牛拒绝了上传令牌（过期或无效），需要重新获取令牌。"""
+
+
+def _env_int(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(os.getenv(name) or str(default))
+    except Exception:
+        value = default
+    return max(lo, min(value, hi))
+
+
+def _get_session() -> requests.Session:
+    """获取进程内共享的上传会话，复用到七牛的连接。"""
+    global _SESSION
+    if _SESSION is not None:
+        return _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            pool_size = _env_int("UPLOAD_POOL_SIZE", 16, 1, 100)
+            session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=pool_size))
+            _SESSION = session
+    return _SESSION
+
+
+def _next_key_timestamp() -> int:
+    global _LAST_KEY_US
+    with _KEY_LOCK:
+        ts = max(int(time.time() * 1000000), _LAST_KEY_US + 1)
+        _LAST_KEY_US = ts
+        return ts
+
 
 def build_upload_key(snowFlakeId: str, userId: str) -> str:
     """
@@ -19,7 +66,7 @@ def build_upload_key(snowFlakeId: str, userId: str) -> str:
     """
     return (f"upload/{snowFlakeId}"
             f"/{time.strftime('%Y-%m-%d', time.localtime())}"
-            f"/report/{userId}_{int(time.time() * 1000000)}.jpg")
+            f"/report/{userId}_{_next_key_timestamp()}.jpg")
 
 
 def upload_image(
@@ -30,7 +77,8 @@ def upload_image(
     token: str,
     key: str,
     max_retries: int = 3,
-    retry_delay: int = 5,
+    retry_delay: float = 2,
+    deadline: Optional[float] = None,
 ) -> Optional[str]:
     """
     上传单张图片并处理错误。
@@ -43,10 +91,14 @@ def upload_image(
         token (str): 用于身份验证的令牌。
         key (str): 上传图片的唯一标识符。
         max_retries (int): 最大重试次数。
-        retry_delay (int): 初始重试延迟时间（秒）。
+        retry_delay (float): 初始重试延迟时间（秒），实际等待带随机抖动。
+        deadline (Optional[float]): 截止时间（time.monotonic()），超过后不再重试。
 
     Returns:
         Optional[str]: 成功上传的图片标识符（去除前缀 "upload/"）。
+
+    Raises:
+        UploadTokenExpired: 上传令牌被拒绝（HTTP 401）。
     """
     data = {
         "token": token,
@@ -57,13 +109,19 @@ def upload_image(
     files = {"file": (key, image_data, "application/octet-stream")}
 
     for attempt in range(max_retries):
+        timeout = 30.0
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                logger.error("上传超时，已超过截止时间")
+                return None
         try:
             response = session.post(
                 url,
                 headers=headers,
                 files=files,
                 data=data,
-                timeout=30
+                timeout=timeout
             )
             response.raise_for_status()
 
@@ -74,16 +132,22 @@ def upload_image(
                 logger.warning("上传成功，但响应中没有key字段")
                 return None
         except requests.exceptions.RequestException as e:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if status == 401:
+                raise UploadTokenExpired(str(e))
             logger.warning(f"上传失败 (尝试 {attempt + 1}/{max_retries}): {e}")
             if attempt < max_retries - 1:
-                wait_time = retry_delay * (2**attempt)
+                base = retry_delay * (2**attempt)
+                wait_time = base / 2 + random.uniform(0, base / 2)
+                if deadline is not None and time.monotonic() + wait_time >= deadline:
+                    logger.error(f"上传失败，剩余时间不足以重试: {e}")
+                    return None
                 time.sleep(wait_time)
             else:
                 logger.error(f"上传失败，已达到最大重试次数: {e}")
                 return None
     return None
 
-
 def upload(
     token: str,
     snowFlakeId: str,
@@ -93,6 +157,9 @@ def upload(
     """
     上传图片（支持一次性上传多张图片）
 
+    多张图片在共享会话上并发上传，并发数由 UPLOAD_MAX_PARALLEL 限制，
+    整体耗时受 UPLOAD_DEADLINE_SECONDS 约束。
+
     Args:
         token (str): 上传文件的认证令牌。
         snowFlakeId (str): 组织ID。
@@ -101,6 +168,9 @@ def upload(
 
     Returns:
         str: 成功上传的图片链接，用逗号分隔。
+
+    Raises:
+        UploadTokenExpired: 上传令牌被拒绝（HTTP 401）。
     """
     url = "https://up.qiniup.com/"
     headers = {
@@ -109,20 +179,27 @@ def upload(
         "user-agent": "Dart / 2.17(dart:io)",
     }
 
-    successful_keys = []
-
-    with requests.Session() as session:
-        for image_data in images:
-            # 确保每个文件的key唯一，稍微延迟一下或者用计数器
-            # 原代码用微秒级时间戳，基本安全
-            key = build_upload_key(snowFlakeId, userId)
-
-            uploaded_key = upload_image(session, url, headers, image_data, token, key)
-
-            if uploaded_key:
-                successful_keys.append(uploaded_key)
-            
-            # 稍微暂停，避免key冲突概率（虽然极低）
-            time.sleep(0.01)
-
+    if not images:
+        return ""
+
+    max_parallel = _env_int("UPLOAD_MAX_PARALLEL", 4, 1, 16)
+    run_deadline = time.monotonic() + _env_int("UPLOAD_DEADLINE_SECONDS", 60, 5, 600)
+    item_seconds = _env_int("UPLOAD_ITEM_DEADLINE_SECONDS", 45, 5, 600)
+    session = _get_session()
+    keys = [build_upload_key(snowFlakeId, userId) for _ in images]
+
+    def _upload_one(index: int) -> Optional[str]:
+        deadline = min(run_deadline, time.monotonic() + item_seconds)
+        return upload_image(session, url, headers, images[index], token, keys[index], deadline=deadline)
+
+    if len(images) == 1 or max_parallel == 1:
+        results = [_upload_one(i) for i in range(len(images))]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_parallel, len(images))) as pool:
+            # map 按提交顺序返回结果，附件顺序与图片顺序一致
+            results = list(pool.map(_upload_one, range(len(images))))
+
+    successful_keys = [k for k in results if k]
+    if len(successful_keys) < len(images):
+        logger.warning(f"部分图片上传失败: {len(successful_keys)}/{len(images)}")
     return ",".join(successful_keys)
@@ -1,5 +1,7 @@
+import base64
 import json
 import logging
+import os
 import re
 import time
 import uuid
@@ -11,12 +13,76 @@ import requests
 
 from server.util.Config import ConfigManager
 from server.util.CryptoUtils import create_sign, aes_encrypt, aes_decrypt
-from server.util.CaptchaUtils import recognize_blockPuzzle_captcha, recognize_clickWord_captcha
+from server.util.CaptchaUtils import recognize_blockPuzzle_captcha, recognize_clickWord_captcha, save_captcha_sample
 from server.util.HelperFunctions import get_current_month_info
 from server.util.LoggerContext import _log_ctx
 
 logger = logging.getLogger(__name__)
 
+# 验证码统计：类型 -> [成功次数, 总尝试次数, 跳过提交次数]
+_CAPTCHA_STATS: Dict[str, List[int]] = {}
+_CAPTCHA_STATS_LOCK = threading.Lock()
+
+
+def _record_captcha_attempts(captcha_type: str, attempts: int, skipped: int, ok: bool) -> None:
+    with _CAPTCHA_STATS_LOCK:
+        stats = _CAPTCHA_STATS.setdefault(captcha_type, [0, 0, 0])
+        stats[0] += 1 if ok else 0
+        stats[1] += attempts
+        stats[2] += skipped
+        successes, total, total_skipped = stats
+    mean = f"{total / successes:.2f}" if successes else "-"
+    logger.info(
+        f"{captcha_type} 验证码本次尝试 {attempts} 次（跳过提交 {skipped} 次），"
+        f"累计平均每次成功尝试 {mean} 次，累计跳过 {total_skipped} 次"
+    )
+
+
+def get_captcha_stats() -> Dict[str, Dict[str, Any]]:
+    """获取当前进程内的验证码尝试统计"""
+    with _CAPTCHA_STATS_LOCK:
+        return {
+            k: {
+                "successes": v[0],
+                "attempts": v[1],
+                "skipped": v[2],
+                "mean_attempts_per_success": (v[1] / v[0]) if v[0] else None,
+            }
+            for k, v in _CAPTCHA_STATS.items()
+        }
+
+
+# 七牛上传令牌缓存：蘑菇丁 userId -> (token, 过期时间 time.time())
+_UPLOAD_TOKEN_CACHE: Dict[str, tuple] = {}
+_UPLOAD_TOKEN_LOCK = threading.Lock()
+
+
+def _upload_token_deadline(token: str) -> Optional[float]:
+    """
+    解析七牛上传令牌中的过期时间。
+
+    令牌格式为 AccessKey:EncodedSign:EncodedPutPolicy，
+    putPolicy 是 URL 安全的 base64 编码 JSON，其中 deadline 为过期的 Unix 时间戳（秒）。
+
+    Args:
+        token (str): 上传令牌。
+
+    Returns:
+        Optional[float]: 过期时间，无法解析时返回 None。
+    """
+    try:
+        encoded = token.split(":")[2]
+        policy = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+        return float(policy["deadline"])
+    except Exception:
+        return None
+
+
+def invalidate_upload_token(user_id: Any) -> None:
+    """丢弃指定用户缓存的上传令牌"""
+    with _UPLOAD_TOKEN_LOCK:
+        _UPLOAD_TOKEN_CACHE.pop(str(user_id), None)
+
 
 class ApiClient:
     """
@@ -113,6 +179,7 @@ class ApiClient:
 
     def pass_blockPuzzle_captcha(self, max_attempts: int = 5) -> str:
         """通过行为验证码（blockPuzzle）"""
+        skipped = 0
         for attempt in range(max_attempts):
             try:
                 captcha_url = "session/captcha/v1/get"
@@ -122,10 +189,16 @@ class ApiClient:
                 }
                 captcha_info = self._post_request(captcha_url, self.DEFAULT_HEADERS, request_data)
                 
+                # 验证码 token 校验一次即失效，无法在同一张图上尝试次优位置；
+                # 因此在提交前按候选排名拒绝低置信度结果，直接换一张图（最后一次仍然提交）
                 slider_data = recognize_blockPuzzle_captcha(
                     captcha_info["data"]["jigsawImageBase64"],
                     captcha_info["data"]["originalImageBase64"],
+                    reject_ambiguous=attempt < max_attempts - 1,
                 )
+                if slider_data is None:
+                    skipped += 1
+                    continue
                 
                 check_slider_url = "session/captcha/v1/check"
                 check_slider_data = {
@@ -135,8 +208,14 @@ class ApiClient:
                 }
                 
                 check_result = self._post_request(check_slider_url, self.DEFAULT_HEADERS, check_slider_data)
+                save_captcha_sample(
+                    "blockPuzzle",
+                    captcha_info["data"],
+                    {"x": json.loads(slider_data)["x"], "passed": check_result.get("code") != 6111},
+                )
                 
                 if check_result.get("code") != 6111:
+                    _record_captcha_attempts("blockPuzzle", attempt + 1, skipped, ok=True)
                     return aes_encrypt(
                         captcha_info["data"]["token"] + "---" + slider_data,
                         captcha_info["data"]["secretKey"],
@@ -146,6 +225,7 @@ class ApiClient:
                 logger.warning(f"滑块验证尝试 {attempt + 1}/{max_attempts} 失败: {e}")
                 time.sleep(random.uniform(1, 3))
                 
+        _record_captcha_attempts("blockPuzzle", max_attempts, skipped, ok=False)
         raise Exception("通过滑块验证码失败")
 
     def solve_click_word_captcha(self, max_retries: int = 5) -> str:
@@ -427,13 +507,56 @@ class ApiClient:
             data["captcha"] = self.solve_click_word_captcha()
             self._post_request(url, headers, data)
 
-    def get_upload_token(self) -> str:
-        """获取上传文件的认证令牌"""
+    def get_upload_token(self, force_refresh: bool = False) -> str:
+        """
+        获取上传文件的认证令牌。
+
+        令牌按用户缓存到其 deadline 前 UPLOAD_TOKEN_MARGIN_SECONDS 秒，
+        同一次运行以及相邻运行中的打卡、报告共用同一个令牌。
+
+        Args:
+            force_refresh (bool): 为 True 时忽略缓存重新获取。
+
+        Returns:
+            str: 上传令牌。
+        """
+        user_id = str(self.config.get_value("userInfo.userId") or "")
+        now = time.time()
+        if user_id and not force_refresh:
+            with _UPLOAD_TOKEN_LOCK:
+                cached = _UPLOAD_TOKEN_CACHE.get(user_id)
+            if cached and cached[1] > now:
+                return cached[0]
+
         url = "session/upload/v1/token"
         headers = self._get_authenticated_headers()
         data = {"t": aes_encrypt(str(int(time.time() * 1000)))}
         rsp = self._post_request(url, headers, data)
-        return rsp.get("data", "")
+        token = rsp.get("data", "")
+
+        if user_id:
+            if not token:
+                invalidate_upload_token(user_id)
+                return token
+            try:
+                margin = int(os.getenv("UPLOAD_TOKEN_MARGIN_SECONDS") or "120")
+            except Exception:
+                margin = 120
+            deadline = _upload_token_deadline(token)
+            if deadline is None:
+                try:
+                    deadline = now + int(os.getenv("UPLOAD_TOKEN_TTL_SECONDS") or "600")
+                except Exception:
+                    deadline = now + 600
+            expires_at = deadline - margin
+            if expires_at > now:
+                with _UPLOAD_TOKEN_LOCK:
+                    _UPLOAD_TOKEN_CACHE[user_id] = (token, expires_at)
+                    # 清理已过期的令牌，避免长期运行时无限增长
+                    if len(_UPLOAD_TOKEN_CACHE) > 1000:
+                        for k in [k for k, v in _UPLOAD_TOKEN_CACHE.items() if v[1] <= now]:
+                            _UPLOAD_TOKEN_CACHE.pop(k, None)
+        return token
 
     def _get_authenticated_headers(
         self,
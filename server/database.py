@@ -47,6 +47,10 @@ def _migrate_sqlite_schema():
                     conn.execute(text("ALTER TABLE batchjob ADD COLUMN cancel_requested INTEGER DEFAULT 0"))
                 if "paused" not in col_names:
                     conn.execute(text("ALTER TABLE batchjob ADD COLUMN paused INTEGER DEFAULT 0"))
+                if "kind" not in col_names:
+                    conn.execute(text("ALTER TABLE batchjob ADD COLUMN kind TEXT DEFAULT 'batch'"))
+                if "task_type" not in col_names:
+                    conn.execute(text("ALTER TABLE batchjob ADD COLUMN task_type TEXT"))
 
             if _table_exists("batchjobitem"):
                 columns = conn.execute(text("PRAGMA table_info('batchjobitem')")).fetchall()
@@ -57,6 +61,14 @@ def _migrate_sqlite_schema():
                     conn.execute(text("ALTER TABLE batchjobitem ADD COLUMN max_attempts INTEGER DEFAULT 3"))
                 if "next_run_at" not in col_names:
                     conn.execute(text("ALTER TABLE batchjobitem ADD COLUMN next_run_at TEXT"))
+                if "results" not in col_names:
+                    conn.execute(text("ALTER TABLE batchjobitem ADD COLUMN results TEXT"))
+
+            if _table_exists("notificationoutbox"):
+                columns = conn.execute(text("PRAGMA table_info('notificationoutbox')")).fetchall()
+                col_names = {row[1] for row in columns}
+                if "claimed_at" not in col_names:
+                    conn.execute(text("ALTER TABLE notificationoutbox ADD COLUMN claimed_at TEXT"))
             conn.commit()
     except Exception:
         return
@@ -0,0 +1,219 @@
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Optional
+
+from sqlmodel import Session, select
+from sqlalchemy import delete, func, text
+
+from server.database import engine
+from server.models import GeocodeCache
+
+logger = logging.getLogger(__name__)
+
+# 各服务商两次请求之间的最小间隔（秒）；Nominatim 使用政策要求不超过 1 次/秒
+_MIN_INTERVALS = {"osm": 1.0, "amap": 0.0}
+
+_last_touch: Dict[str, float] = {}
+_flights: Dict[str, "_Flight"] = {}
+_flights_lock = threading.Lock()
+_local_slots: Dict[str, float] = {}
+_local_slots_lock = threading.Lock()
+
+
+class GeocodeThrottled(Exception):
+    """等待服务商请求名额的时间超过上限。"""
+
+
+def _env_int(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(os.getenv(name) or str(default))
+    except Exception:
+        value = default
+    return max(lo, min(value, hi))
+
+
+def normalize_query(q: str) -> str:
+    """NFKC 归一化（全角转半角等）并合并空白，用于请求上游。"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", q or "")).strip()
+
+
+def make_key(kind: str, provider: str, *parts: Any) -> str:
+    """
+    缓存键：类型、服务商和归一化后的参数，文本参数再做大小写折叠。
+
+    Args:
+        kind (str): search / reverse。
+        provider (str): amap / osm。
+        parts (Any): 查询文本或经纬度。
+
+    Returns:
+        str: 缓存键。
+    """
+    norm = [normalize_query(p).casefold() if isinstance(p, str) else p for p in parts]
+    return json.dumps([kind, provider, *norm], ensure_ascii=False)
+
+
+def get(key: str) -> Optional[Any]:
+    """读取未过期的缓存；命中时更新最近使用时间（同一个键每分钟最多写一次）。"""
+    try:
+        with Session(engine) as session:
+            row = session.exec(select(GeocodeCache).where(GeocodeCache.key == key)).first()
+            if not row:
+                return None
+            now = datetime.datetime.utcnow()
+            if row.expires_at <= now:
+                return None
+            if time.monotonic() - _last_touch.get(key, 0.0) > 60:
+                _last_touch[key] = time.monotonic()
+                if len(_last_touch) > 10000:
+                    _last_touch.clear()
+                row.last_used_at = now
+                row.hits = int(row.hits or 0) + 1
+                session.add(row)
+                session.commit()
+            return row.value
+    except Exception as e:
+        logger.warning(f"读取地理编码缓存失败: {e}")
+        return None
+
+
+def put(key: str, value: Any, ttl_seconds: int) -> None:
+    """写入缓存，并清理过期记录、按 GEOCODE_CACHE_MAX_ENTRIES 淘汰最久未使用的记录。"""
+    now = datetime.datetime.utcnow()
+    try:
+        with Session(engine) as session:
+            row = session.exec(select(GeocodeCache).where(GeocodeCache.key == key)).first()
+            if not row:
+                row = GeocodeCache(key=key, value=value)
+            row.value = value
+            row.created_at = now
+            row.last_used_at = now
+            row.expires_at = now + datetime.timedelta(seconds=ttl_seconds)
+            session.add(row)
+            session.commit()
+            _evict(session, now)
+    except Exception as e:
+        logger.warning(f"写入地理编码缓存失败: {e}")
+
+
+def _evict(session: Session, now: datetime.datetime) -> None:
+    session.exec(delete(GeocodeCache).where(GeocodeCache.expires_at <= now))
+    max_entries = _env_int("GEOCODE_CACHE_MAX_ENTRIES", 20000, 100, 1000000)
+    total = session.exec(select(func.count()).select_from(GeocodeCache)).one()
+    if total > max_entries:
+        stale = session.exec(
+            select(GeocodeCache.id).order_by(GeocodeCache.last_used_at).limit(total - max_entries)
+        ).all()
+        session.exec(delete(GeocodeCache).where(GeocodeCache.id.in_(stale)))
+    session.commit()
+
+
+def _min_interval(provider: str) -> float:
+    interval = _MIN_INTERVALS.get(provider, 0.0)
+    try:
+        overrides = json.loads(os.getenv("GEOCODE_MIN_INTERVALS") or "{}")
+        interval = float(overrides.get(provider, interval))
+    except Exception:
+        pass
+    return max(0.0, interval)
+
+
+_RESERVE = text(
+    "INSERT INTO geocodethrottle (provider, next_at) VALUES (:provider, :now + :interval) "
+    "ON CONFLICT(provider) DO UPDATE SET next_at = MAX(next_at, :now) + :interval"
+)
+
+
+def _reserve_slot(provider: str, interval: float, now: float) -> float:
+    """在数据库中预约下一个请求时间，多个 worker 共用同一个节奏；出错时退回进程内预约。"""
+    try:
+        with engine.begin() as conn:
+            conn.execute(_RESERVE, {"provider": provider, "now": now, "interval": interval})
+            next_at = conn.execute(
+                text("SELECT next_at FROM geocodethrottle WHERE provider = :provider"), {"provider": provider}
+            ).scalar_one()
+        return float(next_at) - interval
+    except Exception as e:
+        logger.warning(f"地理编码限速记录失败，改用进程内限速: {e}")
+    with _local_slots_lock:
+        slot = max(now, _local_slots.get(provider, 0.0))
+        _local_slots[provider] = slot + interval
+        return slot
+
+
+def throttle(provider: str) -> None:
+    """
+    向服务商发请求前调用，按最小间隔排队（见 GEOCODE_MIN_INTERVALS，默认 osm 1 秒）。
+
+    Raises:
+        GeocodeThrottled: 需要等待的时间超过 GEOCODE_THROTTLE_MAX_WAIT_SECONDS（默认 15 秒）。
+    """
+    interval = _min_interval(provider)
+    if interval <= 0:
+        return
+    now = time.time()
+    wait = _reserve_slot(provider, interval, now) - now
+    if wait > _env_int("GEOCODE_THROTTLE_MAX_WAIT_SECONDS", 15, 1, 300):
+        raise GeocodeThrottled(f"地理编码请求过多，需排队 {wait:.0f} 秒")
+    if wait > 0:
+        time.sleep(wait)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def get_or_fetch(key: str, fetch: Callable[[], Any], ttl_seconds: int) -> Any:
+    """
+    先查缓存，未命中时调用 fetch 并写入缓存。
+
+    同一进程内相同键的并发未命中只有一个线程调用 fetch，其余线程等待并共享结果或异常。
+
+    Args:
+        key (str): 缓存键，见 make_key。
+        fetch (Callable[[], Any]): 请求上游的函数，内部应在每次请求前调用 throttle。
+        ttl_seconds (int): 缓存时间（秒）。
+
+    Returns:
+        Any: 缓存或 fetch 返回的结果。
+    """
+    cached = get(key)
+    if cached is not None:
+        return cached
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            _flights[key] = flight
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    try:
+        # 其他 worker 可能刚刚写入
+        value = get(key)
+        if value is None:
+            value = fetch()
+            put(key, value, ttl_seconds)
+        flight.value = value
+        return value
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
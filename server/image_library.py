@@ -0,0 +1,234 @@
+import hashlib
+import io
+import logging
+import os
+import random
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+from sqlmodel import Session, select
+from sqlalchemy import func
+
+from server.database import engine, sqlite_file_name
+from server.models import ImageAsset
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SCOPES = ("user", "org", "global")
+# 系统没有独立的租户概念，租户即组织（userInfo.orgJson.snowFlakeId）
+SCOPE_ALIASES = {"tenant": "org"}
+
+LIBRARY_DIR = os.getenv("IMAGE_LIBRARY_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(sqlite_file_name)), "image_library"
+)
+
+# 写操作（新增 / 删除）需要维护每个范围内 ordinal 连续，串行执行
+_WRITE_LOCK = threading.Lock()
+
+
+def _normalize_scope(scope: str, scope_id: Optional[str]) -> Tuple[str, str]:
+    scope = (scope or "").strip().lower()
+    scope = SCOPE_ALIASES.get(scope, scope)
+    if scope not in IMAGE_SCOPES:
+        raise ValueError(f"不支持的图片范围: {scope}")
+    scope_id = "" if scope == "global" else str(scope_id or "").strip()
+    if scope != "global" and not scope_id:
+        raise ValueError("缺少图片范围 ID")
+    return scope, scope_id
+
+
+def _asset_path(sha256: str) -> str:
+    return os.path.join(LIBRARY_DIR, sha256[:2], f"{sha256}.jpg")
+
+
+def _write_file(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+        f.write(data)
+        tmp = f.name
+    try:
+        os.replace(tmp, path)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+
+def _scope_size(session: Session, scope: str, scope_id: str) -> int:
+    # ordinal 在范围内连续（0..n-1），取最大值走复合索引，无需 count(*)
+    max_ordinal = session.exec(
+        select(func.max(ImageAsset.ordinal)).where((ImageAsset.scope == scope) & (ImageAsset.scope_id == scope_id))
+    ).one()
+    return 0 if max_ordinal is None else int(max_ordinal) + 1
+
+
+def add_image(scope: str, scope_id: Optional[str], data: bytes, original_name: Optional[str] = None, created_by: Optional[str] = None) -> ImageAsset:
+    """
+    向图片库添加一张图片：校验、预处理为上传用 JPEG，按内容哈希存储并建立索引。
+
+    同一范围内重复上传相同内容时返回已有记录。
+
+    Args:
+        scope (str): 范围，user / org / global，tenant 等同于 org。
+        scope_id (Optional[str]): 范围 ID，user 为手机号，org 为组织 snowFlakeId，global 忽略。
+        data (bytes): 原始图片数据。
+        original_name (Optional[str]): 原始文件名。
+        created_by (Optional[str]): 操作人。
+
+    Returns:
+        ImageAsset: 图片索引记录。
+
+    Raises:
+        ValueError: 范围参数不合法或图片无法解析。
+    """
+    from server.util.FileUploader import process_image
+
+    scope, scope_id = _normalize_scope(scope, scope_id)
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+            img.verify()
+    except Exception as e:
+        raise ValueError(f"无法解析图片: {e}")
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = _asset_path(sha256)
+    # 压缩较慢，放在锁外完成；文件检查、写入和建索引与 remove_image 的删除在同一把锁内，
+    # 避免并发新增和删除同一内容时留下指向已删除文件的记录或无人引用的文件
+    processed = None if os.path.exists(path) else process_image(io.BytesIO(data))
+
+    with _WRITE_LOCK, Session(engine) as session:
+        if not os.path.exists(path):
+            if processed is None:
+                processed = process_image(io.BytesIO(data))
+            _write_file(path, processed)
+        existing = session.exec(
+            select(ImageAsset).where(
+                (ImageAsset.scope == scope) & (ImageAsset.scope_id == scope_id) & (ImageAsset.sha256 == sha256)
+            )
+        ).first()
+        if existing:
+            return existing
+        asset = ImageAsset(
+            created_by=created_by,
+            scope=scope,
+            scope_id=scope_id,
+            sha256=sha256,
+            ordinal=_scope_size(session, scope, scope_id),
+            original_name=original_name,
+            width=width,
+            height=height,
+            size=os.path.getsize(path),
+        )
+        session.add(asset)
+        session.commit()
+        session.refresh(asset)
+        return asset
+
+
+def remove_image(asset_id: int) -> Optional[ImageAsset]:
+    """
+    删除图片：用范围内 ordinal 最大的记录填补空位，保持 ordinal 连续；
+    没有其他范围引用时同时删除存储文件。
+
+    Args:
+        asset_id (int): 图片 ID。
+
+    Returns:
+        Optional[ImageAsset]: 被删除的记录，不存在时返回 None。
+    """
+    with _WRITE_LOCK, Session(engine) as session:
+        asset = session.get(ImageAsset, asset_id)
+        if not asset:
+            return None
+        last = session.exec(
+            select(ImageAsset)
+            .where((ImageAsset.scope == asset.scope) & (ImageAsset.scope_id == asset.scope_id))
+            .order_by(ImageAsset.ordinal.desc())
+            .limit(1)
+        ).first()
+        hole = asset.ordinal
+        session.delete(asset)
+        session.flush()
+        if last and last.id != asset.id:
+            last.ordinal = hole
+            session.add(last)
+        session.commit()
+
+        still_used = session.exec(select(ImageAsset.id).where(ImageAsset.sha256 == asset.sha256).limit(1)).first()
+        if still_used is None:
+            try:
+                os.remove(_asset_path(asset.sha256))
+            except OSError:
+                pass
+        return asset
+
+
+def sample_images(scope: str, scope_id: Optional[str], count: int) -> Optional[List[bytes]]:
+    """
+    从指定范围随机抽取 count 张预处理好的图片，不足时返回 None。
+
+    通过连续 ordinal 直接随机取号，开销与图片库大小无关。
+    """
+    try:
+        scope, scope_id = _normalize_scope(scope, scope_id)
+    except ValueError:
+        return None
+    with Session(engine) as session:
+        size = _scope_size(session, scope, scope_id)
+        if size < count:
+            return None
+        ordinals = random.sample(range(size), count)
+        rows = session.exec(
+            select(ImageAsset.sha256).where(
+                (ImageAsset.scope == scope) & (ImageAsset.scope_id == scope_id) & (ImageAsset.ordinal.in_(ordinals))
+            )
+        ).all()
+    if len(rows) < count:
+        # 抽样期间有图片被删除
+        return None
+
+    images = []
+    for sha256 in rows:
+        try:
+            with open(_asset_path(sha256), "rb") as f:
+                images.append(f.read())
+        except OSError as e:
+            logger.warning(f"图片库文件缺失 {sha256}: {e}")
+            return None
+    return images
+
+
+def sample_for_user(phone: Optional[str], org_id: Optional[str], count: int) -> Optional[List[bytes]]:
+    """
+    按 用户 -> 组织 -> 全局 的顺序抽取图片，均不足时返回 None，由调用方回退到旧图片目录。
+
+    Args:
+        phone (Optional[str]): 用户手机号。
+        org_id (Optional[str]): 组织 snowFlakeId。
+        count (int): 需要的图片数量。
+
+    Returns:
+        Optional[List[bytes]]: 处理后的图片数据列表。
+    """
+    for scope, scope_id in (("user", phone), ("org", org_id), ("global", "")):
+        if scope != "global" and not scope_id:
+            continue
+        images = sample_images(scope, scope_id, count)
+        if images is not None:
+            return images
+    return None
+
+
+def library_stats() -> List[Dict[str, Any]]:
+    with Session(engine) as session:
+        rows = session.exec(
+            select(ImageAsset.scope, ImageAsset.scope_id, func.count(), func.sum(ImageAsset.size))
+            .group_by(ImageAsset.scope, ImageAsset.scope_id)
+            .order_by(ImageAsset.scope, ImageAsset.scope_id)
+        ).all()
+    return [
+        {"scope": scope, "scope_id": scope_id, "count": int(count or 0), "bytes": int(total or 0)}
+        for scope, scope_id, count, total in rows
+    ]
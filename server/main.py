@@ -2,12 +2,15 @@ import os
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from server.database import create_db_and_tables
 from server.api import router
 from server.scheduler import start_scheduler
 from server.admin_users import ensure_seed_admin_users
 from server.queue_worker import start_queue_worker, stop_queue_worker
+from server.report_drafts import start_report_pregen_worker, stop_report_pregen_worker
+from server.notification_outbox import start_notification_dispatcher, stop_notification_dispatcher
+from server.bulkhead import BulkheadFull, shutdown as shutdown_bulkheads
 
 app = FastAPI(title="AutoMoGuDing SaaS")
 
@@ -21,6 +24,10 @@ async def _security_headers(request, call_next):
     resp.headers.setdefault("Cross-Origin-Opener-Policy", "same-origin")
     return resp
 
+@app.exception_handler(BulkheadFull)
+async def _bulkhead_full(request: Request, exc: BulkheadFull):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
 def _strip_wrapping(s: str) -> str:
     s2 = (s or "").strip()
     while len(s2) >= 2 and s2[0] == s2[-1] and s2[0] in ["'", '"', "`"]:
@@ -68,11 +75,16 @@ def on_startup():
 
     start_scheduler()
     start_queue_worker()
+    start_report_pregen_worker()
+    start_notification_dispatcher()
 
 
 @app.on_event("shutdown")
 def on_shutdown():
     stop_queue_worker()
+    stop_report_pregen_worker()
+    stop_notification_dispatcher()
+    shutdown_bulkheads()
 
 
 app.include_router(router, prefix="/api")
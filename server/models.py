@@ -1,5 +1,6 @@
 from typing import Optional, List, Dict, Any
 from sqlmodel import Field, SQLModel, JSON, Column
+from sqlalchemy import Index
 from pydantic import BaseModel
 import datetime
 
@@ -81,6 +82,8 @@ class BatchJob(SQLModel, table=True):
     last_errors: List[Dict[str, Any]] = Field(default_factory=list, sa_column=Column(JSON))
     cancel_requested: bool = Field(default=False, index=True)
     paused: bool = Field(default=False, index=True)
+    kind: str = Field(default="batch", index=True)
+    task_type: Optional[str] = None
 
 class BatchJobItem(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -94,6 +97,7 @@ class BatchJobItem(SQLModel, table=True):
     attempts: int = Field(default=0, index=True)
     max_attempts: int = Field(default=3, index=True)
     next_run_at: Optional[datetime.datetime] = Field(default=None, index=True)
+    results: Optional[List[Dict[str, Any]]] = Field(default=None, sa_column=Column(JSON))
 
 class AdminUser(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -110,3 +114,134 @@ class AppUser(SQLModel, table=True):
     password_hash: str
     enabled: bool = Field(default=True, index=True)
     bound_user_id: Optional[int] = Field(default=None, index=True)
+
+class ImageAsset(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_imageasset_scope_ordinal", "scope", "scope_id", "ordinal", unique=True),
+        Index("ix_imageasset_scope_sha256", "scope", "scope_id", "sha256", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+    created_by: Optional[str] = Field(default=None, index=True)
+    scope: str = Field(default="global", index=True)
+    scope_id: str = Field(default="")
+    sha256: str = Field(index=True)
+    ordinal: int = 0
+    original_name: Optional[str] = None
+    width: int = 0
+    height: int = 0
+    size: int = 0
+
+class ReportDraft(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_reportdraft_period", "phone", "report_type", "period_key", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+    updated_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+    phone: str = Field(index=True)
+    report_type: str = Field(index=True)
+    period_key: str
+    status: str = Field(default="ready", index=True)
+    title: Optional[str] = None
+    content: Optional[str] = None
+    word_count: int = 500
+    job_info: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON))
+    job_hash: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+
+class ReportContentCache(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    key: str = Field(index=True, unique=True)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+    last_used_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+    model: Optional[str] = None
+    title: Optional[str] = None
+    content: str
+    hits: int = 0
+
+class AiUsage(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_aiusage_provider_time", "provider", "model", "created_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+    phone: Optional[str] = Field(default=None, index=True)
+    kind: str = "article"
+    provider: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: int = 0
+    retries: int = 0
+    outcome: str = Field(default="ok", index=True)
+    error: Optional[str] = None
+
+class AiUsageDaily(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_aiusagedaily_key", "day", "phone", "provider", "model", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: str = Field(index=True)
+    phone: str = ""
+    provider: str
+    model: str
+    calls: int = 0
+    ok_calls: int = 0
+    error_calls: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms_total: int = 0
+    latency_ms_max: int = 0
+
+class NotificationOutbox(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_notificationoutbox_due", "status", "next_attempt_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+    updated_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+    phone: Optional[str] = Field(default=None, index=True)
+    channel: str = Field(index=True)
+    channel_config: str
+    title: str
+    results: List[Dict[str, Any]] = Field(default_factory=list, sa_column=Column(JSON))
+    status: str = Field(default="pending", index=True)
+    attempts: int = 0
+    max_attempts: int = 5
+    next_attempt_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    sent_at: Optional[datetime.datetime] = None
+    last_error: Optional[str] = None
+    label: Optional[str] = None
+    digest_key: Optional[str] = Field(default=None, index=True)
+    digest_count: int = 0
+    merged_into: Optional[int] = None
+    batch_job_id: Optional[int] = Field(default=None, index=True)
+    claimed_at: Optional[datetime.datetime] = None
+
+class RateLimitBucket(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    win: int = 0
+    prev: int = 0
+    cur: int = 0
+    expires_at: float = Field(default=0, index=True)
+
+class GeocodeCache(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    key: str = Field(index=True, unique=True)
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+    last_used_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+    expires_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+    hits: int = 0
+    value: Any = Field(default=None, sa_column=Column(JSON))
+
+class GeocodeThrottle(SQLModel, table=True):
+    provider: str = Field(primary_key=True)
+    next_at: float = 0
@@ -0,0 +1,416 @@
+import datetime
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+from sqlmodel import Session, select
+from sqlalchemy import delete, func, update
+
+from server.database import engine
+from server.models import BatchJob, NotificationOutbox
+from server.secret_store import decrypt_secret, encrypt_secret
+from server.util.LoggerContext import _log_ctx
+from server.util.MessagePush import MessagePusher, UnsupportedPushChannel, channel_timeout, destination_key
+
+logger = logging.getLogger(__name__)
+
+_stop_event = threading.Event()
+_wake_event = threading.Event()
+_thread: threading.Thread | None = None
+_executor: ThreadPoolExecutor | None = None
+_inflight: Set[int] = set()
+_inflight_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(os.getenv(name) or str(default))
+    except Exception:
+        value = default
+    return max(lo, min(value, hi))
+
+
+def is_enabled() -> bool:
+    return (os.getenv("NOTIFY_OUTBOX") or "1").strip().lower() not in ["0", "false", "no", "off"]
+
+
+def digest_mode() -> str:
+    """
+    汇总推送模式 NOTIFY_DIGEST_MODE：
+        off: 每次执行单独推送（默认）。
+        window: 同一目的地在 NOTIFY_DIGEST_WINDOW_SECONDS 内的消息合并为一条。
+        batch: 批量任务中的消息暂存，任务结束后按目的地合并；非批量执行单独推送。
+    """
+    mode = (os.getenv("NOTIFY_DIGEST_MODE") or "off").strip().lower()
+    return mode if mode in ("off", "window", "batch") else "off"
+
+
+def _backoff_seconds(attempts: int) -> float:
+    """第 attempts 次失败后的等待时间：指数退避，上限 NOTIFY_RETRY_MAX_SECONDS，附加 ±20% 抖动。"""
+    base = _env_int("NOTIFY_RETRY_BASE_SECONDS", 10, 1, 3600)
+    cap = _env_int("NOTIFY_RETRY_MAX_SECONDS", 900, 1, 86400)
+    seconds = min(cap, base * (2 ** max(0, attempts - 1)))
+    return seconds * random.uniform(0.8, 1.2)
+
+
+def enqueue(
+    push_config: Any,
+    results: List[Dict[str, Any]],
+    phone: Optional[str] = None,
+    label: Optional[str] = None,
+    batch_job_id: Optional[int] = None,
+) -> int:
+    """
+    把任务结果写入推送发件箱，每个已启用的渠道一条记录，由后台分发线程发送。
+
+    渠道配置加密保存（见 secret_store），消息内容在发送时根据 results 生成。
+    开启汇总推送（见 digest_mode）时记录按目的地延后发送，发送前合并。
+
+    Args:
+        push_config (Any): 用户的 config.pushNotifications。
+        results (List[Dict[str, Any]]): 任务执行结果列表。
+        phone (Optional[str]): 账号手机号。
+        label (Optional[str]): 汇总消息中区分账号的名称，默认为脱敏手机号。
+        batch_job_id (Optional[int]): 所属批量任务。
+
+    Returns:
+        int: 写入的记录数。
+    """
+    if not MessagePusher.should_push(results):
+        logger.info("所有任务都被跳过，不发送推送消息")
+        return 0
+    channels = [c for c in (push_config or []) if isinstance(c, dict) and c.get("enabled", False)]
+    if not channels:
+        return 0
+    title = MessagePusher.build_title(results)
+    max_attempts = _env_int("NOTIFY_MAX_ATTEMPTS", 5, 1, 50)
+    mode = digest_mode()
+    digest = mode == "window" or (mode == "batch" and batch_job_id is not None)
+    now = datetime.datetime.utcnow()
+    with Session(engine) as session:
+        for channel in channels:
+            row = NotificationOutbox(
+                phone=phone or None,
+                label=label or _mask_phone(phone),
+                channel=str(channel.get("type") or ""),
+                channel_config=encrypt_secret(json.dumps(channel, ensure_ascii=False)),
+                title=title,
+                results=results,
+                max_attempts=max_attempts,
+                batch_job_id=batch_job_id,
+            )
+            if digest:
+                row.digest_key = destination_key(channel)
+                if mode == "batch":
+                    row.status = "held"
+                else:
+                    row.next_attempt_at = _window_end(session, row.digest_key, now)
+            session.add(row)
+        session.commit()
+    _wake_event.set()
+    return len(channels)
+
+
+def _mask_phone(phone: Optional[str]) -> str:
+    phone = phone or ""
+    return f"{phone[:3]}****{phone[-4:]}" if len(phone) >= 7 else (phone or "未知账号")
+
+
+def _window_end(session: Session, key: str, now: datetime.datetime) -> datetime.datetime:
+    """同一目的地已有未发送的汇总窗口时并入该窗口，否则从现在开启新窗口。"""
+    current = session.exec(
+        select(NotificationOutbox.next_attempt_at)
+        .where(
+            (NotificationOutbox.digest_key == key)
+            & (NotificationOutbox.status == "pending")
+            & (NotificationOutbox.attempts == 0)
+        )
+        .order_by(NotificationOutbox.next_attempt_at)
+    ).first()
+    if current:
+        return current
+    return now + datetime.timedelta(seconds=_env_int("NOTIFY_DIGEST_WINDOW_SECONDS", 300, 1, 86400))
+
+
+def notify(
+    push_config: Any,
+    results: List[Dict[str, Any]],
+    phone: Optional[str] = None,
+    label: Optional[str] = None,
+    batch_job_id: Optional[int] = None,
+) -> None:
+    """
+    发送任务结果通知：默认写入发件箱异步发送；NOTIFY_OUTBOX=0 或写入失败时直接同步推送（不汇总）。
+    """
+    if is_enabled():
+        try:
+            count = enqueue(push_config, results, phone=phone, label=label, batch_job_id=batch_job_id)
+            if count:
+                logger.info(f"已加入推送队列：{count} 个渠道")
+            return
+        except Exception as e:
+            logger.error(f"写入推送队列失败，改为直接推送: {e}")
+    MessagePusher(push_config or []).push(results)
+
+
+def _labelled(row: NotificationOutbox) -> List[Dict[str, Any]]:
+    if row.digest_count:
+        return list(row.results or [])
+    return [
+        dict(r, task_type=f"{row.label or '未知账号'} · {r.get('task_type', '未知任务')}")
+        for r in (row.results or [])
+        if r.get("status") != "skip"
+    ]
+
+
+def _claim(session: Session, row_id: int, now: datetime.datetime, status: str = "sending", **values: Any) -> bool:
+    """把仍为 pending 的记录原子地改成 status，多个进程同时分发时只有一方成功。"""
+    result = session.exec(
+        update(NotificationOutbox)
+        .where((NotificationOutbox.id == row_id) & (NotificationOutbox.status == "pending"))
+        .values(status=status, claimed_at=now if status == "sending" else None, updated_at=now, **values)
+    )
+    return result.rowcount == 1
+
+
+def _merge_digest(session: Session, leader: NotificationOutbox, now: datetime.datetime) -> None:
+    """把同一目的地已到期、未发送过的记录并入 leader，合并后的结果带上账号名称。"""
+    limit = _env_int("NOTIFY_DIGEST_MAX_ITEMS", 200, 2, 5000)
+    siblings = session.exec(
+        select(NotificationOutbox)
+        .where(
+            (NotificationOutbox.digest_key == leader.digest_key)
+            & (NotificationOutbox.status == "pending")
+            & (NotificationOutbox.attempts == 0)
+            & (NotificationOutbox.next_attempt_at <= now)
+            & (NotificationOutbox.id != leader.id)
+        )
+        .order_by(NotificationOutbox.id)
+        .limit(max(0, limit - max(1, leader.digest_count)))
+    ).all()
+    if not siblings:
+        return
+    results = _labelled(leader)
+    merged = 0
+    for row in siblings:
+        # 其他进程可能已把这条记录作为 leader 认领
+        if not _claim(session, row.id, now, status="merged", merged_into=leader.id):
+            continue
+        results.extend(_labelled(row))
+        merged += 1
+    if not merged:
+        return
+    leader.digest_count = max(1, leader.digest_count) + merged
+    leader.results = results
+    leader.title = MessagePusher.build_digest_title(results, leader.digest_count)
+
+
+def _release_held(session: Session, now: datetime.datetime) -> None:
+    """批量任务结束（或暂存超过 NOTIFY_DIGEST_MAX_HOLD_SECONDS）后放行暂存的记录。"""
+    job_ids = session.exec(
+        select(NotificationOutbox.batch_job_id).where(NotificationOutbox.status == "held").distinct()
+    ).all()
+    if not job_ids:
+        return
+    active = set(session.exec(
+        select(BatchJob.id).where(BatchJob.id.in_([j for j in job_ids if j is not None]) & BatchJob.status.in_(["queued", "running", "paused"]))
+    ).all())
+    finished = [j for j in job_ids if j not in active]
+    cutoff = now - datetime.timedelta(seconds=_env_int("NOTIFY_DIGEST_MAX_HOLD_SECONDS", 6 * 3600, 60, 7 * 86400))
+    cond = NotificationOutbox.created_at < cutoff
+    if finished:
+        cond = cond | NotificationOutbox.batch_job_id.in_(finished)
+        if None in finished:
+            cond = cond | NotificationOutbox.batch_job_id.is_(None)
+    session.exec(
+        update(NotificationOutbox)
+        .where((NotificationOutbox.status == "held") & cond)
+        .values(status="pending", next_attempt_at=now, updated_at=now)
+    )
+    session.commit()
+
+
+def _deliver(row_id: int) -> None:
+    try:
+        with Session(engine) as session:
+            row = session.get(NotificationOutbox, row_id)
+            if not row or row.status != "sending":
+                return
+            claimed_at = row.claimed_at
+            channel, title, results = row.channel, row.title, row.results or []
+            channel_config = row.channel_config
+            attempts = int(row.attempts or 0) + 1
+            max_attempts = int(row.max_attempts or 1)
+
+        # 发送期间不占用数据库连接
+        _log_ctx.tag = f"push-{row_id}"
+        error: Optional[str] = None
+        permanent = False
+        try:
+            config = json.loads(decrypt_secret(channel_config))
+            MessagePusher([]).send(config, title, results, timeout=channel_timeout(channel))
+        except UnsupportedPushChannel as e:
+            error, permanent = str(e), True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        now = datetime.datetime.utcnow()
+        values: Dict[str, Any] = {"attempts": attempts, "updated_at": now, "claimed_at": None}
+        if error is None:
+            values.update(status="sent", sent_at=now, last_error=None)
+        elif permanent or attempts >= max_attempts:
+            values.update(status="dead", last_error=error[:500])
+            logger.error(f"{channel} 消息推送失败，已放弃（第 {attempts} 次）: {error}")
+        else:
+            delay = _backoff_seconds(attempts)
+            values.update(status="pending", last_error=error[:500], next_attempt_at=now + datetime.timedelta(seconds=delay))
+            logger.warning(f"{channel} 消息推送失败，{delay:.0f} 秒后重试（第 {attempts} 次）: {error}")
+        with Session(engine) as session:
+            # 认领已过期并被其他进程重新认领时，不覆盖对方的结果
+            session.exec(
+                update(NotificationOutbox)
+                .where(
+                    (NotificationOutbox.id == row_id)
+                    & (NotificationOutbox.status == "sending")
+                    & (NotificationOutbox.claimed_at == claimed_at)
+                )
+                .values(**values)
+            )
+            session.commit()
+    except Exception as e:
+        logger.warning(f"推送记录 {row_id} 处理失败: {e}")
+    finally:
+        _log_ctx.tag = "-"
+        with _inflight_lock:
+            _inflight.discard(row_id)
+        _wake_event.set()
+
+
+def _dispatch() -> None:
+    global _executor
+    concurrency = _env_int("NOTIFY_DISPATCH_CONCURRENCY", 4, 1, 32)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="notify")
+
+    with _inflight_lock:
+        capacity = concurrency - len(_inflight)
+    if capacity <= 0:
+        return
+
+    now = datetime.datetime.utcnow()
+    with Session(engine) as session:
+        _release_held(session, now)
+        ids: List[int] = []
+        while len(ids) < capacity:
+            candidates = session.exec(
+                select(NotificationOutbox.id)
+                .where((NotificationOutbox.status == "pending") & (NotificationOutbox.next_attempt_at <= now))
+                .order_by(NotificationOutbox.next_attempt_at, NotificationOutbox.id)
+                .limit(capacity - len(ids))
+            ).all()
+            claimed = 0
+            for row_id in candidates:
+                if not _claim(session, row_id, now):
+                    session.commit()
+                    continue
+                row = session.get(NotificationOutbox, row_id)
+                if row.digest_key and row.attempts == 0:
+                    _merge_digest(session, row, now)
+                    session.add(row)
+                session.commit()
+                ids.append(row_id)
+                claimed += 1
+            if not claimed:
+                break
+        if not ids:
+            return
+
+    for row_id in ids:
+        with _inflight_lock:
+            _inflight.add(row_id)
+        _executor.submit(_deliver, row_id)
+
+
+def _recover(now: datetime.datetime) -> None:
+    """认领超过 NOTIFY_SENDING_LEASE_SECONDS 仍未完成的记录（发送进程已退出）重新排队。"""
+    cutoff = now - datetime.timedelta(seconds=_env_int("NOTIFY_SENDING_LEASE_SECONDS", 600, 60, 86400))
+    with Session(engine) as session:
+        session.exec(
+            update(NotificationOutbox)
+            .where(
+                (NotificationOutbox.status == "sending")
+                & (func.coalesce(NotificationOutbox.claimed_at, NotificationOutbox.updated_at) < cutoff)
+            )
+            .values(status="pending", claimed_at=None, next_attempt_at=now, updated_at=now)
+        )
+        session.commit()
+
+
+def _cleanup() -> None:
+    days = _env_int("NOTIFY_OUTBOX_RETENTION_DAYS", 14, 1, 3650)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    with Session(engine) as session:
+        session.exec(
+            delete(NotificationOutbox).where(
+                NotificationOutbox.status.in_(["sent", "dead", "merged"]) & (NotificationOutbox.updated_at < cutoff)
+            )
+        )
+        session.commit()
+
+
+def _loop() -> None:
+    last_cleanup = last_recover = 0.0
+    while not _stop_event.is_set():
+        _wake_event.clear()
+        try:
+            if time.time() - last_recover > 60:
+                _recover(datetime.datetime.utcnow())
+                last_recover = time.time()
+            _dispatch()
+            if time.time() - last_cleanup > 3600:
+                _cleanup()
+                last_cleanup = time.time()
+        except Exception as e:
+            logger.warning(f"推送队列分发失败: {e}")
+        _wake_event.wait(_env_int("NOTIFY_POLL_SECONDS", 5, 1, 300))
+
+
+def retry(row_id: int) -> bool:
+    """把放弃的记录重新排队，返回是否成功。"""
+    with Session(engine) as session:
+        row = session.get(NotificationOutbox, row_id)
+        if not row or row.status != "dead":
+            return False
+        row.status = "pending"
+        row.attempts = 0
+        row.next_attempt_at = datetime.datetime.utcnow()
+        row.updated_at = datetime.datetime.utcnow()
+        session.add(row)
+        session.commit()
+    _wake_event.set()
+    return True
+
+
+def start_notification_dispatcher() -> None:
+    global _thread
+    if not is_enabled():
+        return
+    if _thread and _thread.is_alive():
+        return
+    _stop_event.clear()
+    _thread = threading.Thread(target=_loop, daemon=True)
+    _thread.start()
+
+
+def stop_notification_dispatcher() -> None:
+    global _executor
+    _stop_event.set()
+    _wake_event.set()
+    if _executor:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
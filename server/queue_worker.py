@@ -68,7 +68,12 @@ def _run_item(job_id: int, item_id: int) -> None:
             return
         config_data = user_to_config(user)
         try:
-            results = run_task_by_config(config_data)
+            # 单账号手动运行不参与批量汇总推送
+            results = run_task_by_config(
+                config_data,
+                specific_task_type=job.task_type,
+                batch_job_id=job_id if job.kind == "batch" else None,
+            )
             user.last_run_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             status = "Success"
             for r in results:
@@ -83,7 +88,9 @@ def _run_item(job_id: int, item_id: int) -> None:
             if log_summary:
                 user.logs = log_summary
             user.last_execution_result = results
+            item.results = results
             session.add(user)
+            session.add(item)
             session.commit()
             if status == "Success":
                 _finalize_item(job_id, item_id, ok=True, error=None)
@@ -113,7 +120,10 @@ def _claim_items() -> None:
 
     with Session(engine) as session:
         jobs = session.exec(
-            select(BatchJob).where(BatchJob.status.in_(["queued", "running"])).order_by(BatchJob.id.asc()).limit(10)
+            select(BatchJob)
+            .where(BatchJob.status.in_(["queued", "running"]))
+            .order_by(case((BatchJob.kind == "run", 0), else_=1), BatchJob.id.asc())
+            .limit(10)
         ).all()
         for job in jobs:
             if job.cancel_requested:
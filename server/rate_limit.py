@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+from sqlalchemy import text
+
+from server.database import engine
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# key -> [窗口序号, 上一窗口计数, 当前窗口计数, 过期时间]
+_buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+_last_purge = 0.0
+
+
+def _env_int(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(os.getenv(name) or str(default))
+    except Exception:
+        value = default
+    return max(lo, min(value, hi))
+
+
+def backend() -> str:
+    """RATE_LIMIT_BACKEND：memory（默认，单进程）或 sqlite（多个 worker 共享计数）。"""
+    value = (os.getenv("RATE_LIMIT_BACKEND") or "memory").strip().lower()
+    return value if value in ("memory", "sqlite") else "memory"
+
+
+def _estimate(prev: float, cur: float, now: float, per_seconds: int) -> float:
+    """滑动窗口计数：上一窗口按剩余重叠比例折算，加上当前窗口计数。"""
+    elapsed = (now % per_seconds) / per_seconds
+    return prev * (1.0 - elapsed) + cur
+
+
+def _roll(bucket: List[float], window: int) -> None:
+    if bucket[0] == window:
+        return
+    bucket[1] = bucket[2] if bucket[0] == window - 1 else 0
+    bucket[2] = 0
+    bucket[0] = window
+
+
+def _hit_memory(key: str, limit: int, per_seconds: int, now: float) -> bool:
+    window = int(now // per_seconds)
+    max_keys = _env_int("RATE_LIMIT_MAX_KEYS", 100000, 100, 10000000)
+    with _lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = [window, 0, 0, 0.0]
+            _buckets[key] = bucket
+        else:
+            _buckets.move_to_end(key)
+        _roll(bucket, window)
+        # 两个窗口之后计数不再有影响
+        bucket[3] = (window + 2) * per_seconds
+        allowed = _estimate(bucket[1], bucket[2], now, per_seconds) < limit
+        if allowed:
+            bucket[2] += 1
+
+        # 最久未访问的键在最前面：先清掉已过期的，再按上限淘汰
+        while _buckets:
+            oldest = next(iter(_buckets.values()))
+            if oldest[3] > now and len(_buckets) <= max_keys:
+                break
+            _buckets.popitem(last=False)
+    return allowed
+
+
+_UPSERT = text(
+    "INSERT INTO ratelimitbucket (key, win, prev, cur, expires_at) VALUES (:key, :win, 0, 1, :exp) "
+    "ON CONFLICT(key) DO UPDATE SET "
+    "prev = CASE WHEN win = :win THEN prev WHEN win = :win - 1 THEN cur ELSE 0 END, "
+    "cur = CASE WHEN win = :win THEN cur + 1 ELSE 1 END, "
+    "win = :win, "
+    "expires_at = :exp"
+)
+
+
+def _hit_sqlite(key: str, limit: int, per_seconds: int, now: float) -> bool:
+    """
+    一条 UPSERT 完成换窗和计数，同一事务内读回计数；写锁保证多个进程之间的原子性。
+    超出限制时撤回本次计数，被拒绝的请求不占用额度。
+    """
+    global _last_purge
+    window = int(now // per_seconds)
+    expires = (window + 2) * per_seconds
+    with engine.begin() as conn:
+        conn.execute(_UPSERT, {"key": key, "win": window, "exp": expires})
+        prev, cur = conn.execute(text("SELECT prev, cur FROM ratelimitbucket WHERE key = :key"), {"key": key}).one()
+        allowed = _estimate(prev, cur - 1, now, per_seconds) < limit
+        if not allowed:
+            conn.execute(text("UPDATE ratelimitbucket SET cur = cur - 1 WHERE key = :key"), {"key": key})
+        if now - _last_purge > 60:
+            _last_purge = now
+            conn.execute(text("DELETE FROM ratelimitbucket WHERE expires_at < :now"), {"now": now})
+    return allowed
+
+
+def hit(key: str, limit: int, per_seconds: int) -> bool:
+    """
+    记录一次请求并判断是否在限制内。
+
+    使用两个固定窗口的滑动计数，每个键只保存两个计数，检查为 O(1)；
+    内存后端按 TTL 和 RATE_LIMIT_MAX_KEYS 淘汰最久未访问的键。
+    sqlite 后端出错时退回内存计数。
+
+    Args:
+        key (str): 限流键，通常包含操作、IP 和账号。
+        limit (int): 窗口内允许的次数。
+        per_seconds (int): 窗口长度（秒）。
+
+    Returns:
+        bool: 允许为 True，超出限制为 False。
+    """
+    per_seconds = max(1, int(per_seconds))
+    now = time.time()
+    if backend() == "sqlite":
+        try:
+            return _hit_sqlite(key, limit, per_seconds, now)
+        except Exception as e:
+            logger.warning(f"限流计数写入数据库失败，改用内存计数: {e}")
+    return _hit_memory(key, limit, per_seconds, now)
@@ -0,0 +1,228 @@
+import datetime
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlmodel import Session, select
+from sqlalchemy import delete, func
+
+from server.database import engine
+from server.models import ReportContentCache
+from server.coreApi.AiServiceClient import article_cache_key, generate_article, resolve_providers
+from server.util import ReportTemplate
+
+logger = logging.getLogger(__name__)
+
+# 同一个键同时只生成一次，避免重复点击或并发重试各自调用 AI
+_key_locks: Dict[str, List[Any]] = {}
+_key_locks_guard = threading.Lock()
+
+
+def _env_int(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(os.getenv(name) or str(default))
+    except Exception:
+        value = default
+    return max(lo, min(value, hi))
+
+
+def is_enabled() -> bool:
+    return (os.getenv("REPORT_CACHE") or "1").strip().lower() not in ["0", "false", "no", "off"]
+
+
+def _ttl() -> datetime.timedelta:
+    return datetime.timedelta(hours=_env_int("REPORT_CACHE_TTL_HOURS", 72, 1, 24 * 90))
+
+
+def cache_key(config: Any, title: str, job_info: Dict[str, Any], count: Any) -> str:
+    return article_cache_key(config, title, job_info, count)
+
+
+def get(key: str) -> Optional[str]:
+    """
+    读取缓存的报告内容，过期或不存在时返回 None。
+    """
+    if not is_enabled():
+        return None
+    try:
+        with Session(engine) as session:
+            row = session.exec(select(ReportContentCache).where(ReportContentCache.key == key)).first()
+            if not row:
+                return None
+            now = datetime.datetime.utcnow()
+            if row.created_at < now - _ttl():
+                session.delete(row)
+                session.commit()
+                return None
+            row.last_used_at = now
+            row.hits = int(row.hits or 0) + 1
+            session.add(row)
+            session.commit()
+            return row.content
+    except Exception as e:
+        logger.warning(f"读取报告内容缓存失败: {e}")
+        return None
+
+
+def put(key: str, content: str, model: Optional[str] = None, title: Optional[str] = None) -> None:
+    """
+    写入报告内容并按 TTL 和条数上限（REPORT_CACHE_MAX_ENTRIES）淘汰旧记录。
+    """
+    if not is_enabled() or not content:
+        return
+    now = datetime.datetime.utcnow()
+    try:
+        with Session(engine) as session:
+            row = session.exec(select(ReportContentCache).where(ReportContentCache.key == key)).first()
+            if not row:
+                row = ReportContentCache(key=key, content=content)
+            row.content = content
+            row.model = model
+            row.title = title
+            row.created_at = now
+            row.last_used_at = now
+            session.add(row)
+            session.commit()
+            _evict(session, now)
+    except Exception as e:
+        logger.warning(f"写入报告内容缓存失败: {e}")
+
+
+def forget(key: str) -> None:
+    """
+    报告提交成功后删除对应缓存，防止相同输入在之后被重复提交。
+    """
+    try:
+        with Session(engine) as session:
+            session.exec(delete(ReportContentCache).where(ReportContentCache.key == key))
+            session.commit()
+    except Exception as e:
+        logger.warning(f"删除报告内容缓存失败: {e}")
+
+
+def _evict(session: Session, now: datetime.datetime) -> None:
+    session.exec(delete(ReportContentCache).where(ReportContentCache.created_at < now - _ttl()))
+    max_entries = _env_int("REPORT_CACHE_MAX_ENTRIES", 5000, 10, 1000000)
+    total = session.exec(select(func.count()).select_from(ReportContentCache)).one()
+    if total > max_entries:
+        stale = session.exec(
+            select(ReportContentCache.id)
+            .order_by(ReportContentCache.last_used_at)
+            .limit(total - max_entries)
+        ).all()
+        session.exec(delete(ReportContentCache).where(ReportContentCache.id.in_(stale)))
+    session.commit()
+
+
+def _acquire_key(key: str) -> threading.Lock:
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+        return entry[0]
+
+
+def _release_key(key: str) -> None:
+    with _key_locks_guard:
+        entry = _key_locks.get(key)
+        if entry:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                _key_locks.pop(key, None)
+
+
+def generate_article_cached(
+    config: Any,
+    title: str,
+    job_info: Dict[str, Any],
+    count: Any = 500,
+    refresh: bool = False,
+) -> str:
+    """
+    带缓存的 generate_article：相同的模型、提示词、标题和字数直接复用上次生成的内容。
+
+    提交失败后的重试、手动生成后再提交都会命中缓存，不再重复调用 AI。
+
+    Args:
+        config: 配置管理器。
+        title (str): 文章标题。
+        job_info (Dict[str, Any]): 岗位信息。
+        count (Any): 字数下限。
+        refresh (bool): 为 True 时忽略缓存重新生成，并覆盖缓存。
+
+    Returns:
+        str: 文章内容。
+
+    Raises:
+        ValueError: 生成失败，见 generate_article。
+    """
+    key = cache_key(config, title, job_info, count)
+    lock = _acquire_key(key)
+    try:
+        with lock:
+            if not refresh:
+                content = get(key)
+                if content:
+                    logger.info(f"复用缓存的报告内容：{title}")
+                    return content
+            content = generate_article(config, title, job_info, count)
+            put(key, content, model=config.get_value("config.ai.model"), title=title)
+            return content
+    finally:
+        _release_key(key)
+
+
+_ai_executor: Optional[ThreadPoolExecutor] = None
+_ai_executor_lock = threading.Lock()
+
+
+def _get_ai_executor() -> ThreadPoolExecutor:
+    global _ai_executor
+    with _ai_executor_lock:
+        if _ai_executor is None:
+            workers = _env_int("REPORT_AI_WORKERS", 8, 1, 64)
+            _ai_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-ai")
+        return _ai_executor
+
+
+def generate_report_content(config: Any, title: str, job_info: Dict[str, Any], count: Any = 500) -> Tuple[str, str]:
+    """
+    按生成策略（见 ReportTemplate.resolve_policy）获取报告内容。
+
+    ai_first 时 AI 请求在后台线程执行，最多等待 REPORT_AI_DEADLINE_SECONDS（默认 90 秒），
+    超时或失败则使用本地模板；超时后 AI 仍会继续完成并写入缓存，供下次重试使用。
+    未配置 AI 时直接使用模板。
+
+    Returns:
+        Tuple[str, str]: (内容, 来源)，来源为 ai 或 template。
+
+    Raises:
+        ValueError: 策略为 ai 且生成失败。
+    """
+    ai_config = config.get_value("config.ai")
+    policy = ReportTemplate.resolve_policy(ai_config)
+    phone = config.get_value("config.user.phone")
+
+    def template() -> Tuple[str, str]:
+        return ReportTemplate.generate_template_article(title, job_info, count, seed=phone), "template"
+
+    if policy == "template":
+        return template()
+    if not resolve_providers(ai_config):
+        if policy == "ai":
+            raise ValueError("未配置可用的 AI 服务")
+        logger.info("未配置 AI，使用模板生成报告")
+        return template()
+    if policy == "ai":
+        return generate_article_cached(config, title, job_info, count), "ai"
+
+    deadline = _env_int("REPORT_AI_DEADLINE_SECONDS", 90, 1, 600)
+    future = _get_ai_executor().submit(generate_article_cached, config, title, job_info, count)
+    try:
+        return future.result(timeout=deadline), "ai"
+    except FutureTimeout:
+        logger.warning(f"AI 生成超过 {deadline} 秒，改用模板")
+    except Exception as e:
+        logger.warning(f"AI 生成失败，改用模板: {e}")
+    return template()
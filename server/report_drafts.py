@@ -0,0 +1,416 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlmodel import Session, select
+from sqlalchemy import case, exists, func, update
+
+from server.coreApi.AiServiceClient import resolve_providers
+from server.database import engine
+from server.models import ReportDraft, User
+from server.util import ReportTemplate
+from server.util.Config import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+REPORT_CONFIG_KEYS = {"day": "daily", "week": "weekly", "month": "monthly"}
+
+_stop_event = threading.Event()
+_thread: threading.Thread | None = None
+_executor: ThreadPoolExecutor | None = None
+_inflight: Set[Tuple[str, str, str]] = set()
+_inflight_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(os.getenv(name) or str(default))
+    except Exception:
+        value = default
+    return max(lo, min(value, hi))
+
+
+def _is_enabled() -> bool:
+    return (os.getenv("REPORT_PREGEN") or "1").strip().lower() not in ["0", "false", "no", "off"]
+
+
+def period_key(report_type: str, dt: datetime.datetime) -> str:
+    """报告所属周期：日报为日期，周报为 ISO 周（YYYY-Www），月报为 YYYY-MM。"""
+    if report_type == "week":
+        iso = dt.isocalendar()
+        return f"{iso[0]}-W{iso[1]:02d}"
+    if report_type == "month":
+        return dt.strftime("%Y-%m")
+    return dt.date().isoformat()
+
+
+def job_hash(job_info: Dict[str, Any]) -> str:
+    """只对参与提示词的岗位字段取哈希，岗位信息变化后旧草稿自动失效。"""
+    company = (job_info or {}).get("practiceCompanyEntity", {}) or {}
+    fields = [
+        (job_info or {}).get("jobAddress"),
+        (job_info or {}).get("quartersIntroduce"),
+        company.get("companyName"),
+        company.get("tradeValue"),
+    ]
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def take_draft(phone: str, report_type: str, period: str, title: str, job_info: Dict[str, Any]) -> Optional[str]:
+    """
+    获取本周期已就绪的草稿。
+
+    草稿标题是按上次提交的标题推算的，实际标题以提交时工学云返回的报告数为准；
+    两者不一致（如中间漏交或多交了一次）时不使用草稿，改为在线生成。
+
+    Args:
+        phone (str): 账号手机号。
+        report_type (str): 报告类型 day / week / month。
+        period (str): 周期键，见 period_key。
+        title (str): 本次提交实际使用的标题，如“第5周周报”。
+        job_info (Dict[str, Any]): 当前岗位信息，与生成草稿时不一致则不使用。
+
+    Returns:
+        Optional[str]: 草稿内容，没有可用草稿时返回 None。
+        草稿在提交成功后由 mark_submitted 标记为已使用，提交失败时可在重试中再次使用。
+    """
+    if not phone:
+        return None
+    with Session(engine) as session:
+        draft = session.exec(
+            select(ReportDraft).where(
+                (ReportDraft.phone == phone)
+                & (ReportDraft.report_type == report_type)
+                & (ReportDraft.period_key == period)
+                & (ReportDraft.status == "ready")
+            )
+        ).first()
+        if not draft or not draft.content:
+            return None
+        if draft.title != title:
+            logger.info(f"预生成草稿的标题（{draft.title}）与本次提交的标题（{title}）不一致，放弃草稿")
+            return None
+        if draft.job_hash != job_hash(job_info):
+            logger.info("岗位信息已变化，放弃预生成的草稿")
+            return None
+        return draft.content
+
+
+def mark_submitted(
+    phone: str,
+    report_type: str,
+    period: str,
+    title: str,
+    job_info: Dict[str, Any],
+    word_count: Any,
+    content: str,
+) -> None:
+    """
+    记录本周期已提交的报告，同时保存岗位信息快照，供后续周期预生成使用。
+    """
+    if not phone:
+        return
+    now = datetime.datetime.utcnow()
+    try:
+        wc = int(word_count)
+    except Exception:
+        wc = 500
+    with Session(engine) as session:
+        draft = session.exec(
+            select(ReportDraft).where(
+                (ReportDraft.phone == phone)
+                & (ReportDraft.report_type == report_type)
+                & (ReportDraft.period_key == period)
+            )
+        ).first()
+        if not draft:
+            draft = ReportDraft(phone=phone, report_type=report_type, period_key=period)
+        draft.status = "consumed"
+        draft.updated_at = now
+        draft.title = title
+        draft.content = content
+        draft.word_count = wc
+        draft.job_info = job_info or {}
+        draft.job_hash = job_hash(job_info)
+        draft.error = None
+        session.add(draft)
+        session.commit()
+
+
+def _parse_hhmm(value: Any) -> Tuple[int, int]:
+    if isinstance(value, str) and ":" in value:
+        try:
+            hh, mm = value.split(":", 1)
+            return int(hh), int(mm)
+        except Exception:
+            return 12, 0
+    return 12, 0
+
+
+def scheduled_submit_at(report_settings: Dict[str, Any], report_type: str, day: datetime.date) -> Optional[datetime.datetime]:
+    """
+    计算某一天的报告提交时间，与 task_runner 中各报告的提交时间判断保持一致。
+
+    Returns:
+        Optional[datetime.datetime]: 当天不需要提交时返回 None。
+    """
+    settings = (report_settings or {}).get(REPORT_CONFIG_KEYS[report_type]) or {}
+    if not settings.get("enabled"):
+        return None
+
+    if report_type == "day":
+        submit_days = settings.get("submitDays")
+        if isinstance(submit_days, list) and (day.isoweekday() not in submit_days):
+            return None
+        hh, mm = _parse_hhmm(settings.get("submitTime"))
+    elif report_type == "week":
+        if day.isoweekday() != settings.get("submitTime"):
+            return None
+        hh, mm = _parse_hhmm(settings.get("submitAt") or "12:00")
+    else:
+        submit_day = settings.get("submitTime")
+        if not isinstance(submit_day, int):
+            submit_day = 20
+        next_month = day.replace(day=28) + datetime.timedelta(days=4)
+        last_day = (next_month - datetime.timedelta(days=next_month.day)).day
+        if day.day != min(submit_day, last_day):
+            return None
+        hh, mm = _parse_hhmm(settings.get("submitAt") or "12:00")
+
+    try:
+        return datetime.datetime.combine(day, datetime.time(hh, mm))
+    except ValueError:
+        return None
+
+
+def _ai_configured(ai: Dict[str, Any]) -> bool:
+    # 只用模板的用户无需预生成
+    return bool(resolve_providers(ai)) and ReportTemplate.resolve_policy(ai) != "template"
+
+
+def _next_title(report_type: str, last_title: Optional[str]) -> str:
+    unit = {"day": "天日报", "week": "周周报", "month": "月月报"}[report_type]
+    m = re.search(r"第(\d+)", last_title or "")
+    n = int(m.group(1)) + 1 if m else 1
+    return f"第{n}{unit}"
+
+
+def _pregen_one(user_id: int, report_type: str, period: str) -> None:
+    # scheduler 依赖 task_runner，task_runner 又依赖本模块，延迟导入避免循环
+    from server.scheduler import user_to_config
+
+    key_phone = ""
+    try:
+        with Session(engine) as session:
+            user = session.get(User, user_id)
+            if not user:
+                return
+            key_phone = user.phone
+            config_data = user_to_config(user)
+            snapshot = session.exec(
+                select(ReportDraft)
+                .where(
+                    (ReportDraft.phone == user.phone)
+                    & (ReportDraft.report_type == report_type)
+                    & (ReportDraft.status == "consumed")
+                )
+                .order_by(ReportDraft.updated_at.desc())
+                .limit(1)
+            ).first()
+            if not snapshot or not snapshot.job_info:
+                # 还没有成功提交过，缺少岗位信息，等待首次在线生成
+                return
+            job_info = dict(snapshot.job_info)
+            word_count = snapshot.word_count
+            title = _next_title(report_type, snapshot.title)
+
+            draft = session.exec(
+                select(ReportDraft).where(
+                    (ReportDraft.phone == user.phone)
+                    & (ReportDraft.report_type == report_type)
+                    & (ReportDraft.period_key == period)
+                )
+            ).first()
+            if draft and draft.status in ["ready", "consumed"]:
+                return
+            if not draft:
+                draft = ReportDraft(phone=user.phone, report_type=report_type, period_key=period, status="pending")
+            draft.attempts = int(draft.attempts or 0) + 1
+            draft.updated_at = datetime.datetime.utcnow()
+            session.add(draft)
+            session.commit()
+            draft_id = draft.id
+
+        from server.coreApi.AiServiceClient import generate_article
+
+        started = time.monotonic()
+        content = generate_article(ConfigManager(config=config_data), title, job_info, word_count)
+        with Session(engine) as session:
+            session.exec(
+                update(ReportDraft)
+                .where((ReportDraft.id == draft_id) & (ReportDraft.status.in_(["pending", "failed"])))
+                .values(
+                    status="ready",
+                    title=title,
+                    content=content,
+                    word_count=word_count,
+                    job_info=job_info,
+                    job_hash=job_hash(job_info),
+                    error=None,
+                    updated_at=datetime.datetime.utcnow(),
+                )
+            )
+            session.commit()
+        logger.info(f"已预生成{title}草稿（{period}），耗时 {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        logger.warning(f"预生成报告草稿失败 ({report_type} {period}): {e}")
+        try:
+            with Session(engine) as session:
+                session.exec(
+                    update(ReportDraft)
+                    .where(
+                        (ReportDraft.phone == key_phone)
+                        & (ReportDraft.report_type == report_type)
+                        & (ReportDraft.period_key == period)
+                        & (ReportDraft.status == "pending")
+                    )
+                    .values(status="failed", error=str(e)[:500], updated_at=datetime.datetime.utcnow())
+                )
+                session.commit()
+        except Exception:
+            pass
+    finally:
+        with _inflight_lock:
+            _inflight.discard((str(user_id), report_type, period))
+
+
+def _candidate_users(session: Session, report_type: str, days: List[datetime.date]) -> List[Tuple[int, str, Dict[str, Any], Dict[str, Any]]]:
+    """
+    在数据库中筛出可能需要预生成的账号：该类报告已启用、已有成功提交的快照，
+    周报 / 月报的提交日落在 days 之内。精确的提交时间仍由 scheduled_submit_at 判断。
+    """
+    key = REPORT_CONFIG_KEYS[report_type]
+    settings = User.reportSettings
+    cond = (func.json_extract(settings, f"$.{key}.enabled") == 1) & exists().where(
+        (ReportDraft.phone == User.phone)
+        & (ReportDraft.report_type == report_type)
+        & (ReportDraft.status == "consumed")
+    )
+    if report_type == "week":
+        cond = cond & func.json_extract(settings, f"$.{key}.submitTime").in_([d.isoweekday() for d in days])
+    elif report_type == "month":
+        submit_day = case(
+            (func.json_type(settings, f"$.{key}.submitTime") == "integer", func.json_extract(settings, f"$.{key}.submitTime")),
+            else_=20,
+        )
+        month_cond = None
+        for d in days:
+            # 月末之后的提交日按当月最后一天提交
+            is_last_day = (d + datetime.timedelta(days=1)).month != d.month
+            c = (submit_day >= d.day) if is_last_day else (submit_day == d.day)
+            month_cond = c if month_cond is None else (month_cond | c)
+        cond = cond & month_cond
+    return session.exec(select(User.id, User.phone, User.reportSettings, User.ai).where(cond)).all()
+
+
+def _due_targets(now: datetime.datetime) -> List[Tuple[datetime.datetime, int, str, str]]:
+    lead = datetime.timedelta(minutes=_env_int("REPORT_PREGEN_LEAD_MINUTES", 180, 10, 24 * 60))
+    max_attempts = _env_int("REPORT_PREGEN_MAX_ATTEMPTS", 3, 1, 10)
+    retry_after = datetime.timedelta(minutes=_env_int("REPORT_PREGEN_RETRY_MINUTES", 10, 1, 24 * 60))
+    days = sorted({now.date(), (now + lead).date()})
+    targets = []
+    with Session(engine) as session:
+        for report_type in REPORT_CONFIG_KEYS:
+            for user_id, phone, report_settings, ai in _candidate_users(session, report_type, days):
+                if not _ai_configured(ai):
+                    continue
+                for day in days:
+                    submit_at = scheduled_submit_at(report_settings, report_type, day)
+                    if not submit_at or not (now < submit_at <= now + lead):
+                        continue
+                    period = period_key(report_type, submit_at)
+                    draft = session.exec(
+                        select(ReportDraft).where(
+                            (ReportDraft.phone == phone)
+                            & (ReportDraft.report_type == report_type)
+                            & (ReportDraft.period_key == period)
+                        )
+                    ).first()
+                    if draft:
+                        if draft.status in ["ready", "consumed"]:
+                            continue
+                        if int(draft.attempts or 0) >= max_attempts:
+                            continue
+                        if draft.updated_at and datetime.datetime.utcnow() - draft.updated_at < retry_after:
+                            continue
+                    targets.append((submit_at, user_id, report_type, period))
+    targets.sort()
+    return targets
+
+
+def _cleanup() -> None:
+    days = _env_int("REPORT_DRAFT_RETENTION_DAYS", 62, 7, 3650)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    with Session(engine) as session:
+        rows = session.exec(select(ReportDraft).where(ReportDraft.updated_at < cutoff)).all()
+        for row in rows:
+            session.delete(row)
+        if rows:
+            session.commit()
+
+
+def _scan() -> None:
+    global _executor
+    concurrency = _env_int("REPORT_PREGEN_CONCURRENCY", 2, 1, 20)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    for _, user_id, report_type, period in _due_targets(datetime.datetime.now()):
+        key = (str(user_id), report_type, period)
+        with _inflight_lock:
+            # 提交的任务数不超过并发预算，其余等下一轮扫描
+            if len(_inflight) >= concurrency:
+                break
+            if key in _inflight:
+                continue
+            _inflight.add(key)
+        _executor.submit(_pregen_one, user_id, report_type, period)
+
+
+def _loop() -> None:
+    last_cleanup = 0.0
+    while not _stop_event.is_set():
+        try:
+            _scan()
+            if time.time() - last_cleanup > 3600:
+                _cleanup()
+                last_cleanup = time.time()
+        except Exception as e:
+            logger.warning(f"报告预生成扫描失败: {e}")
+        _stop_event.wait(_env_int("REPORT_PREGEN_SCAN_SECONDS", 120, 10, 3600))
+
+
+def start_report_pregen_worker() -> None:
+    global _thread
+    if not _is_enabled():
+        return
+    if _thread and _thread.is_alive():
+        return
+    _stop_event.clear()
+    _thread = threading.Thread(target=_loop, daemon=True)
+    _thread.start()
+
+
+def stop_report_pregen_worker() -> None:
+    global _executor
+    _stop_event.set()
+    if _executor:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
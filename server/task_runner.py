@@ -7,15 +7,29 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Callable
 
 from server.coreApi.MainLogicApi import ApiClient
-from server.coreApi.AiServiceClient import generate_article
+from server.coreApi.FileUploadApi import UploadTokenExpired
 from server.util.Config import ConfigManager
-from server.util.MessagePush import MessagePusher
 from server.util.HelperFunctions import desensitize_name, is_holiday
 from server.util.FileUploader import upload_img
 from server.util.LoggerContext import _log_ctx
+from server import notification_outbox, report_cache, report_drafts
 
 logger = logging.getLogger("server.task_runner")
 
+def _upload_attachments(api_client: ApiClient, config: ConfigManager, img_count: int) -> str:
+    """上传附件图片；缓存的上传令牌被七牛拒绝时刷新令牌重试一次"""
+    args = (
+        config.get_value("userInfo.orgJson.snowFlakeId"),
+        config.get_value("userInfo.userId"),
+        img_count,
+    )
+    phone = config.get_value("config.user.phone")
+    try:
+        return upload_img(api_client.get_upload_token(), *args, phone=phone)
+    except UploadTokenExpired:
+        logger.info("上传令牌已失效，重新获取后重试")
+        return upload_img(api_client.get_upload_token(force_refresh=True), *args, phone=phone)
+
 def perform_clock_in(
     api_client: ApiClient, config: ConfigManager, forced_checkin_type: Optional[str] = None
 ) -> Dict[str, Any]:
@@ -105,12 +119,7 @@ def perform_clock_in(
         if not isinstance(img_count, int) or img_count < 0:
             img_count = 1
             
-        attachments = upload_img(
-            api_client.get_upload_token(),
-            config.get_value("userInfo.orgJson.snowFlakeId"),
-            config.get_value("userInfo.userId"),
-            img_count,
-        )
+        attachments = _upload_attachments(api_client, config, img_count)
 
         description_list = config.get_value("config.clockIn.description")
         description = random.choice(description_list) if description_list else None
@@ -239,26 +248,33 @@ def _submit_report_common(
                     "task_type": task_name,
                 }
 
-        # 生成内容
+        # 生成内容：优先使用预生成的草稿，未命中时在线生成
         job_info = api_client.get_job_info()
-        content = generate_article(
-            config,
-            title,
-            job_info,
-            config.get_value(paper_num_key),
-        )
+        phone = config.get_value("config.user.phone")
+        period = report_drafts.period_key(report_type, current_time)
+        draft = None
+        try:
+            draft = report_drafts.take_draft(phone, report_type, period, title, job_info)
+        except Exception as e:
+            logger.warning(f"读取预生成草稿失败: {e}")
+        if draft:
+            content, source = draft, "ai"
+            logger.info(f"使用预生成的{task_name}草稿")
+        else:
+            # 上次生成后提交失败的重试会命中缓存，不再重复调用 AI；AI 超时或不可用时按策略改用模板
+            content, source = report_cache.generate_report_content(
+                config,
+                title,
+                job_info,
+                config.get_value(paper_num_key),
+            )
 
         # 上传图片
         img_count = config.get_value(image_count_key)
         if not isinstance(img_count, int) or img_count < 0:
             img_count = 1
 
-        attachments = upload_img(
-            api_client.get_upload_token(),
-            config.get_value("userInfo.orgJson.snowFlakeId"),
-            config.get_value("userInfo.userId"),
-            img_count,
-        )
+        attachments = _upload_attachments(api_client, config, img_count)
 
         report_info = {
             "title": title,
@@ -289,6 +305,14 @@ def _submit_report_common(
 
         logger.info(f"{title}已提交")
 
+        report_cache.forget(report_cache.cache_key(config, title, job_info, config.get_value(paper_num_key)))
+        try:
+            report_drafts.mark_submitted(
+                phone, report_type, period, title, job_info, config.get_value(paper_num_key), content
+            )
+        except Exception as e:
+            logger.warning(f"记录报告草稿失败: {e}")
+
         return {
             "status": "success",
             "message": f"{title}已提交",
@@ -296,6 +320,7 @@ def _submit_report_common(
             "details": {
                 "标题": title,
                 "提交时间": current_time.strftime("%Y-%m-%d %H:%M:%S"),
+                "内容来源": "AI" if source == "ai" else "模板",
                 "附件": attachments,
                 **extra_details,
             },
@@ -433,8 +458,9 @@ def run_task_by_config(
     config_data: Dict[str, Any],
     forced_checkin_type: Optional[str] = None,
     specific_task_type: Optional[str] = None,
+    batch_job_id: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
-    """根据配置字典执行任务"""
+    """根据配置字典执行任务，batch_job_id 用于批量任务结束后汇总推送"""
     config = ConfigManager(config=config_data)
     
     # 设置日志上下文
@@ -445,11 +471,8 @@ def run_task_by_config(
         _log_ctx.tag = "-"
 
     results: List[Dict[str, Any]] = []
-    pusher = None
 
     try:
-        pusher = MessagePusher(config.get_value("config.pushNotifications"))
-
         api_client = ApiClient(config)
         if not config.get_value("userInfo.token"):
             api_client.login()
@@ -492,11 +515,16 @@ def run_task_by_config(
             {"status": "fail", "message": error_message, "task_type": "系统错误"}
         )
     finally:
-        if pusher:
-            try:
-                pusher.push(results)
-            except Exception as e:
-                logger.error(f"消息推送失败: {e}")
+        try:
+            notification_outbox.notify(
+                config.get_value("config.pushNotifications"),
+                results,
+                phone=config.get_value("config.user.phone"),
+                label=desensitize_name(config.get_value("userInfo.nikeName")),
+                batch_job_id=batch_job_id,
+            )
+        except Exception as e:
+            logger.error(f"消息推送失败: {e}")
 
         logger.info(
             f"执行结束：{desensitize_name(config.get_value('userInfo.nikeName'))}"
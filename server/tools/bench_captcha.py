@@ -0,0 +1,183 @@
+"""
+验证码识别基准测试：离线测量 recognize_blockPuzzle_captcha / recognize_clickWord_captcha
+在单线程与多线程下的耗时分位数、吞吐、准确率和峰值内存。
+
+用法：
+    python -m server.tools.captcha_fixtures ./fixtures --count 200
+    python -m server.tools.bench_captcha ./fixtures --threads 4
+
+默认关闭背景缓存，只测量识别算法本身；--with-cache 可打开。
+clickWord 依赖 yolov5n.onnx / ocr.onnx，模型不存在时跳过。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+TOLERANCE_PX = 3
+
+
+def _max_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _block_puzzle_cases(fixture_dir: str) -> List[Tuple[Callable[[], Any], Callable[[Any], bool]]]:
+    from server.tools.captcha_fixtures import iter_samples
+    from server.util import CaptchaUtils
+
+    cases = []
+    for sample in iter_samples(fixture_dir, "blockPuzzle"):
+        data, answer = sample["data"], sample.get("answer") or {}
+        if "x1" not in answer:
+            continue
+        label = float(answer["x1"])
+
+        def solve(data=data):
+            return CaptchaUtils.recognize_blockPuzzle_captcha(data["jigsawImageBase64"], data["originalImageBase64"])
+
+        def check(result, label=label):
+            # 滑块图片与缺口等宽时，滑动距离即为缺口左边界
+            return bool(result) and abs(json.loads(result)["x"] - label) <= TOLERANCE_PX
+
+        cases.append((solve, check))
+    return cases
+
+
+def _click_word_cases(fixture_dir: str) -> List[Tuple[Callable[[], Any], Callable[[Any], bool]]]:
+    from server.tools.captcha_fixtures import iter_samples
+    from server.util import CaptchaUtils
+
+    cases = []
+    for sample in iter_samples(fixture_dir, "clickWord"):
+        data, boxes = sample["data"], sample["answer"]["boxes"]
+
+        def solve(data=data):
+            return CaptchaUtils.recognize_clickWord_captcha(data["originalImageBase64"], data["wordList"])
+
+        def check(result, boxes=boxes):
+            points = json.loads(result)
+            return len(points) == len(boxes) and all(
+                b[0] <= p["x"] <= b[2] and b[1] <= p["y"] <= b[3] for p, b in zip(points, boxes)
+            )
+
+        cases.append((solve, check))
+    return cases
+
+
+def _models_available() -> bool:
+    from server.util.CaptchaUtils import MODEL_DIR
+
+    return all(os.path.exists(os.path.join(MODEL_DIR, name)) for name in ("yolov5n.onnx", "ocr.onnx"))
+
+
+def _run_one(case) -> Tuple[float, bool]:
+    solve, check = case
+    t0 = time.perf_counter()
+    try:
+        result = solve()
+    except Exception:
+        return (time.perf_counter() - t0) * 1000, False
+    elapsed = (time.perf_counter() - t0) * 1000
+    try:
+        return elapsed, check(result)
+    except Exception:
+        return elapsed, False
+
+
+def run_bench(cases, threads: int, repeat: int) -> Dict[str, Any]:
+    work = cases * repeat
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    if threads <= 1:
+        results = [_run_one(c) for c in work]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(_run_one, work))
+    wall = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = [r[0] for r in results]
+    return {
+        "threads": threads,
+        "n": len(results),
+        "p50_ms": _percentile(latencies, 0.50),
+        "p90_ms": _percentile(latencies, 0.90),
+        "p99_ms": _percentile(latencies, 0.99),
+        "throughput": len(results) / wall if wall > 0 else 0.0,
+        "accuracy": sum(r[1] for r in results) / max(1, len(results)),
+        "py_peak_mb": peak / (1024 * 1024),
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+
+def _print_table(name: str, rows: List[Dict[str, Any]]) -> None:
+    print(f"\n[{name}]")
+    print(f"{'threads':>7} {'n':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'qps':>8} {'acc':>7} {'py_peak':>9} {'max_rss':>9}")
+    for r in rows:
+        print(
+            f"{r['threads']:>7} {r['n']:>6} {r['p50_ms']:>6.1f}ms {r['p90_ms']:>6.1f}ms {r['p99_ms']:>6.1f}ms "
+            f"{r['throughput']:>8.1f} {r['accuracy']:>7.1%} {r['py_peak_mb']:>7.1f}MB {r['max_rss_mb']:>7.1f}MB"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="验证码识别基准测试")
+    parser.add_argument("fixture_dir", help="夹具目录（captcha_fixtures 生成或线上保存的样本）")
+    parser.add_argument("--kind", default="both", choices=["blockPuzzle", "clickWord", "both"])
+    parser.add_argument("--threads", type=int, default=4, help="多线程测试的线程数")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--with-cache", action="store_true", help="启用滑块背景缓存")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    if not args.with_cache:
+        os.environ["CAPTCHA_BG_CACHE"] = "0"
+
+    suites = []
+    if args.kind in ("blockPuzzle", "both"):
+        suites.append(("blockPuzzle", _block_puzzle_cases(args.fixture_dir)))
+    if args.kind in ("clickWord", "both"):
+        if _models_available():
+            suites.append(("clickWord", _click_word_cases(args.fixture_dir)))
+        else:
+            print("clickWord: 模型文件不存在，跳过")
+
+    report = {}
+    for name, cases in suites:
+        if not cases:
+            print(f"{name}: 没有可用的夹具，跳过")
+            continue
+        # 预热：加载模型 / 初始化 OpenCV，避免计入首个样本
+        _run_one(cases[0])
+        rows = [run_bench(cases, 1, args.repeat)]
+        if args.threads > 1:
+            rows.append(run_bench(cases, args.threads, args.repeat))
+        report[name] = rows
+        if not args.json:
+            _print_table(name, rows)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+验证码模型精度/耗时基准：对比原始模型与 INT8 量化模型。
+
+用法：
+    python -m server.tools.quantize_models          # 先生成 *.int8.onnx
+    python -m server.tools.bench_models ./fixtures/clickword --tolerance 0.01
+
+夹具为 JSON 文件（可由 server.tools.captcha_fixtures 生成）：
+    {"captchaType": "clickWord",
+     "data": {"originalImageBase64": "...", "wordList": ["士", "候", "之"]},
+     "answer": {"boxes": [[x1, y1, x2, y2], ...]}}   # 与 wordList 一一对应
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+from server.util import CaptchaUtils
+from server.util.CaptchaUtils import MODEL_DIR, MODEL_VARIANTS, variant_filename
+
+
+def load_fixtures(fixture_dir: str) -> List[Dict[str, Any]]:
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            sample = json.load(f)
+        if sample.get("captchaType") != "clickWord":
+            continue
+        data = sample["data"]
+        image = cv2.imdecode(
+            np.frombuffer(base64.b64decode(data["originalImageBase64"]), np.uint8), cv2.IMREAD_COLOR
+        )
+        fixtures.append({
+            "b64": data["originalImageBase64"],
+            "image": image,
+            "words": list(data["wordList"]),
+            "boxes": [list(map(int, b)) for b in sample["answer"]["boxes"]],
+        })
+    return fixtures
+
+
+def _iou(a: List[int], b: List[int]) -> float:
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _summary(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    return {
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def bench_detector(path: str, fixtures) -> Dict[str, Any]:
+    CaptchaUtils.detect_objects(path, fixtures[0]["image"])  # 预热
+    latencies, matched, total_gt = [], 0, 0
+    for fx in fixtures:
+        t0 = time.perf_counter()
+        pred = CaptchaUtils.detect_objects(path, fx["image"])
+        latencies.append((time.perf_counter() - t0) * 1000)
+        total_gt += len(fx["boxes"])
+        matched += sum(1 for gt in fx["boxes"] if any(_iou(gt, p) >= 0.5 for p in pred))
+    return {**_summary(latencies), "accuracy": matched / max(1, total_gt)}
+
+
+def bench_ocr(path: str, fixtures) -> Dict[str, Any]:
+    latencies, correct, total = [], 0, 0
+    for fx in fixtures:
+        for word, (x1, y1, x2, y2) in zip(fx["words"], fx["boxes"]):
+            crop = fx["image"][y1:y2, x1:x2]
+            t0 = time.perf_counter()
+            text = CaptchaUtils.predict_ocr(path, crop)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            total += 1
+            correct += text == word
+    return {**_summary(latencies), "accuracy": correct / max(1, total)}
+
+
+def bench_end_to_end(variant: str, fixtures) -> Dict[str, Any]:
+    os.environ["CAPTCHA_MODEL_VARIANT"] = variant
+    latencies, solved = [], 0
+    for fx in fixtures:
+        t0 = time.perf_counter()
+        points = json.loads(CaptchaUtils.recognize_clickWord_captcha(fx["b64"], fx["words"]))
+        latencies.append((time.perf_counter() - t0) * 1000)
+        ok = len(points) == len(fx["boxes"]) and all(
+            b[0] <= p["x"] <= b[2] and b[1] <= p["y"] <= b[3] for p, b in zip(points, fx["boxes"])
+        )
+        solved += ok
+    return {**_summary(latencies), "accuracy": solved / max(1, len(fixtures))}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="验证码模型精度/耗时基准")
+    parser.add_argument("fixture_dir", help="clickWord 夹具目录")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="允许的准确率下降（绝对值）")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixture_dir)
+    if not fixtures:
+        raise SystemExit(f"{args.fixture_dir} 中没有 clickWord 夹具")
+
+    rows = []
+    for variant in MODEL_VARIANTS:
+        det = os.path.join(MODEL_DIR, variant_filename("yolov5n.onnx", variant))
+        ocr = os.path.join(MODEL_DIR, variant_filename("ocr.onnx", variant))
+        if os.path.exists(det):
+            rows.append(("yolov5n.onnx", variant, bench_detector(det, fixtures)))
+        if os.path.exists(ocr):
+            rows.append(("ocr.onnx", variant, bench_ocr(ocr, fixtures)))
+        if os.path.exists(det) or os.path.exists(ocr):
+            rows.append(("end-to-end", variant, bench_end_to_end(variant, fixtures)))
+
+    baseline = {name: r for name, variant, r in rows if variant == "fp32"}
+    print(f"夹具数: {len(fixtures)}")
+    print(f"{'model':<14} {'variant':<7} {'mean_ms':>8} {'p50_ms':>8} {'p95_ms':>8} {'accuracy':>9} {'verdict':>8}")
+    for name, variant, r in rows:
+        verdict = ""
+        if variant != "fp32" and name in baseline:
+            verdict = "ok" if baseline[name]["accuracy"] - r["accuracy"] <= args.tolerance else "reject"
+        print(
+            f"{name:<14} {variant:<7} {r['mean_ms']:>8.2f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+            f"{r['accuracy']:>9.1%} {verdict:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
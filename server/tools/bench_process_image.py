@@ -0,0 +1,175 @@
+"""
+上传图片处理基准测试：对比单次预测编码与原始二分法的 CPU 耗时、峰值内存和输出大小。
+
+用法：
+    python -m server.tools.bench_process_image --dir ./photos
+    python -m server.tools.bench_process_image --synthetic 5     # 生成 4032x3024 的模拟手机照片
+
+每张图片在独立子进程中处理，以便分别统计峰值 RSS。
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+MAX_SIZE = 1 * 1024 * 1024
+
+
+def legacy_process_image(image_path: str) -> bytes:
+    """原始实现：整图解码，对质量做二分查找，最多编码约 6 次。"""
+    with Image.open(image_path) as img:
+        if (img.format is None) or (str(img.format).upper() != "JPEG"):
+            img = img.convert("RGB")
+        quality, min_quality, max_quality = 85, 5, 95
+        buf = io.BytesIO()
+        while max_quality - min_quality > 5:
+            buf.seek(0)
+            buf.truncate(0)
+            img.save(buf, format="JPEG", quality=quality)
+            current_size = buf.tell()
+            if current_size > MAX_SIZE:
+                max_quality = quality
+                quality = (min_quality + quality) // 2
+            elif current_size < MAX_SIZE:
+                min_quality = quality
+                quality = (max_quality + quality) // 2
+            else:
+                break
+        buf.seek(0)
+        buf.truncate(0)
+        img.save(buf, format="JPEG", quality=quality)
+        return buf.getvalue()
+
+
+def _synthetic_photo(seed: int, size=(4032, 3024)) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    w, h = size
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    base = np.stack([
+        128 + 90 * np.sin(xx / rng.uniform(200, 900) + rng.uniform(0, 6)),
+        128 + 90 * np.cos(yy / rng.uniform(200, 900) + rng.uniform(0, 6)),
+        128 + 60 * np.sin((xx + yy) / rng.uniform(300, 1200)),
+    ], axis=-1)
+    img = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(img)
+    for _ in range(120):
+        x0, y0 = int(rng.integers(0, w)), int(rng.integers(0, h))
+        x1, y1 = x0 + int(rng.integers(50, 900)), y0 + int(rng.integers(50, 700))
+        draw.rectangle([x0, y0, x1, y1], fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+    img = img.filter(ImageFilter.GaussianBlur(2))
+    # 传感器噪声
+    noise = rng.normal(0, 6, (h, w, 3))
+    return Image.fromarray(np.clip(np.asarray(img, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+
+
+def _peak_rss_kb(resource) -> int:
+    # ru_maxrss 在 exec 后仍保留父进程的峰值，Linux 上优先读取 VmHWM
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _child(mode: str, path: str) -> None:
+    import resource
+    import time
+
+    # 两种模式导入相同的模块，使峰值 RSS 可比
+    from server.util.FileUploader import process_image
+
+    fn = legacy_process_image if mode == "legacy" else process_image
+    try:
+        # 重置 VmHWM，只统计图片处理本身
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+    cpu0 = time.process_time()
+    wall0 = time.perf_counter()
+    data = fn(path)
+    cpu = time.process_time() - cpu0
+    wall = time.perf_counter() - wall0
+    with Image.open(io.BytesIO(data)) as out:
+        out_size = out.size
+    rss_kb = _peak_rss_kb(resource)
+    print(json.dumps({
+        "cpu_ms": cpu * 1000,
+        "wall_ms": wall * 1000,
+        "peak_rss_mb": rss_kb / 1024,
+        "bytes": len(data),
+        "dims": list(out_size),
+    }))
+
+
+def _measure(mode: str, path: str) -> Dict[str, Any]:
+    proc = subprocess.run(
+        [sys.executable, "-m", "server.tools.bench_process_image", "--child", mode, path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _summary(rows: List[Dict[str, Any]], key: str) -> str:
+    values = [r[key] for r in rows]
+    return f"mean={statistics.fmean(values):8.1f}  max={max(values):8.1f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="上传图片处理基准测试")
+    parser.add_argument("--dir", default=None, help="图片目录（jpg/jpeg/png）")
+    parser.add_argument("--synthetic", type=int, default=0, help="生成指定数量的模拟手机照片")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+
+    paths: List[str] = []
+    if args.dir:
+        paths = [
+            p for p in sorted(glob.glob(os.path.join(args.dir, "*")))
+            if p.lower().endswith((".png", ".jpg", ".jpeg"))
+        ]
+    tmp_dir = None
+    if args.synthetic:
+        tmp_dir = tempfile.mkdtemp(prefix="bench_img_")
+        for i in range(args.synthetic):
+            path = os.path.join(tmp_dir, f"photo_{i}.jpg")
+            _synthetic_photo(i).save(path, format="JPEG", quality=95)
+            paths.append(path)
+    if not paths:
+        raise SystemExit("没有可用的图片，请指定 --dir 或 --synthetic")
+
+    results: Dict[str, List[Dict[str, Any]]] = {"legacy": [], "current": []}
+    for path in paths:
+        for mode in results:
+            r = _measure(mode, path)
+            results[mode].append(r)
+            print(f"{os.path.basename(path):<24} {mode:<8} cpu={r['cpu_ms']:8.1f}ms "
+                  f"rss={r['peak_rss_mb']:7.1f}MB out={r['bytes'] / 1024:7.1f}KB dims={r['dims']}")
+
+    print()
+    for mode, rows in results.items():
+        print(f"{mode:<8} cpu_ms {_summary(rows, 'cpu_ms')}   peak_rss_mb {_summary(rows, 'peak_rss_mb')}   "
+              f"over_limit={sum(r['bytes'] > MAX_SIZE for r in rows)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+滑块匹配基准测试：对比条带金字塔匹配与原始全图匹配的耗时与准确率。
+
+用法：
+    CAPTCHA_SAMPLE_DIR=./captcha_samples  # 线上运行时自动保存样本
+    python -m server.tools.bench_slide_match ./captcha_samples --repeat 5
+
+样本为 JSON 文件：
+    {"captchaType": "blockPuzzle",
+     "data": {"jigsawImageBase64": "...", "originalImageBase64": "..."},
+     "answer": {"x1": 123}}            # 或线上保存的 {"x": 123.4, "passed": true}
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# 基准测试只比较匹配算法本身，关闭背景缓存
+os.environ["CAPTCHA_BG_CACHE"] = "0"
+
+from server.util import CaptchaUtils  # noqa: E402
+
+TOLERANCE_PX = 3
+
+
+def _label_x1(answer: Dict[str, Any]) -> Optional[float]:
+    if "x1" in answer:
+        return float(answer["x1"])
+    if answer.get("passed") and "x" in answer:
+        # 滑动距离 = 缺口中心 - 滑块中心，滑块图片与缺口等宽时即为缺口左边界
+        return float(answer["x"])
+    return None
+
+
+def load_samples(sample_dir: str) -> List[Tuple[bytes, bytes, Optional[float]]]:
+    samples = []
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            sample = json.load(f)
+        if sample.get("captchaType") != "blockPuzzle":
+            continue
+        data = sample.get("data") or {}
+        samples.append((
+            base64.b64decode(data["jigsawImageBase64"]),
+            base64.b64decode(data["originalImageBase64"]),
+            _label_x1(sample.get("answer") or {}),
+        ))
+    return samples
+
+
+def run_matcher(matcher: str, samples, repeat: int) -> Dict[str, Any]:
+    os.environ["CAPTCHA_SLIDE_MATCHER"] = matcher
+    latencies: List[float] = []
+    results: List[int] = []
+    for target, background, _ in samples:
+        best = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            best = CaptchaUtils.slide_match_candidates(target, background, top_k=3)[0]
+            latencies.append((time.perf_counter() - t0) * 1000)
+        results.append(best["x1"])
+    latencies.sort()
+    return {
+        "matcher": matcher,
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "x1": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="滑块匹配基准测试")
+    parser.add_argument("sample_dir", help="样本目录")
+    parser.add_argument("--repeat", type=int, default=3, help="每个样本重复次数")
+    args = parser.parse_args()
+
+    samples = load_samples(args.sample_dir)
+    if not samples:
+        raise SystemExit(f"{args.sample_dir} 中没有 blockPuzzle 样本")
+
+    labelled = [i for i, s in enumerate(samples) if s[2] is not None]
+    reports = [run_matcher(m, samples, max(1, args.repeat)) for m in ("legacy", "fast")]
+    print(f"样本数: {len(samples)}（有标注 {len(labelled)}）")
+    print(f"{'matcher':<8} {'mean_ms':>8} {'p50_ms':>8} {'p95_ms':>8} {'accuracy':>9}")
+    for r in reports:
+        if labelled:
+            hit = sum(1 for i in labelled if abs(r["x1"][i] - samples[i][2]) <= TOLERANCE_PX)
+            acc = f"{hit / len(labelled):.1%}"
+        else:
+            acc = "-"
+        print(f"{r['matcher']:<8} {r['mean_ms']:>8.2f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {acc:>9}")
+    agree = sum(1 for a, b in zip(reports[0]["x1"], reports[1]["x1"]) if abs(a - b) <= TOLERANCE_PX)
+    print(f"两种匹配结果一致率: {agree / len(samples):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+本地生成带标注的验证码夹具（blockPuzzle / clickWord），用于离线评估识别算法。
+
+用法：
+    python -m server.tools.captcha_fixtures ./fixtures --kind both --count 200
+    python -m server.tools.captcha_fixtures ./fixtures --kind clickWord --font /path/to/NotoSansCJK.ttc
+
+clickWord 需要可渲染中文的字体；未指定 --font 时会在常见路径中查找。
+输出格式与线上保存的样本一致（见 CaptchaUtils.save_captcha_sample），
+可直接用于 bench_slide_match / bench_models / bench_captcha。
+"""
+import argparse
+import base64
+import glob
+import io
+import json
+import os
+import random
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from server.util.CaptchaUtils import OCR_CHARSET
+
+BG_SIZE = (310, 155)
+PIECE_SIZE = 47
+
+FONT_CANDIDATES = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+    "C:/Windows/Fonts/msyh.ttc",
+]
+
+
+def iter_samples(sample_dir: str, captcha_type: str) -> Iterator[Dict[str, Any]]:
+    """按文件名顺序读取目录中指定类型的样本。"""
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            sample = json.load(f)
+        if sample.get("captchaType") == captcha_type:
+            yield sample
+
+
+def _b64_png(img: Image.Image) -> str:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def _random_background(rng: random.Random) -> Image.Image:
+    w, h = BG_SIZE
+    c1 = [rng.randint(0, 255) for _ in range(3)]
+    c2 = [rng.randint(0, 255) for _ in range(3)]
+    img = Image.new("RGB", BG_SIZE)
+    draw = ImageDraw.Draw(img)
+    for x in range(w):
+        t = x / (w - 1)
+        draw.line([(x, 0), (x, h)], fill=tuple(int(a + (b - a) * t) for a, b in zip(c1, c2)))
+    for _ in range(rng.randint(8, 16)):
+        x0, y0 = rng.randint(-40, w), rng.randint(-40, h)
+        x1, y1 = x0 + rng.randint(20, 120), y0 + rng.randint(20, 80)
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.ellipse([x0, y0, x1, y1], fill=color)
+        else:
+            draw.rectangle([x0, y0, x1, y1], fill=color)
+    return img.filter(ImageFilter.GaussianBlur(rng.uniform(1.0, 2.5)))
+
+
+def _jigsaw_mask(rng: random.Random) -> Image.Image:
+    s = PIECE_SIZE
+    r = 7
+    mask = Image.new("L", (s, s), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.rectangle([r, r, s - r - 1, s - r - 1], fill=255)
+    cx, cy = s // 2, s // 2
+    # 上、右各一个凸起，左侧随机一个凹槽
+    draw.ellipse([cx - r, 0, cx + r, 2 * r], fill=255)
+    draw.ellipse([s - 2 * r - 1, cy - r, s - 1, cy + r], fill=255)
+    if rng.random() < 0.5:
+        draw.ellipse([r - r // 2, cy - r // 2 - 1, r + r // 2 + 1, cy + r // 2 + 1], fill=0)
+    return mask
+
+
+def make_block_puzzle(rng: random.Random) -> Dict[str, Any]:
+    """生成一张滑块验证码及其缺口左边界。"""
+    w, h = BG_SIZE
+    background = _random_background(rng)
+    mask = _jigsaw_mask(rng)
+    x = rng.randint(PIECE_SIZE + 10, w - PIECE_SIZE - 5)
+    y = rng.randint(5, h - PIECE_SIZE - 5)
+
+    piece = Image.new("RGBA", (PIECE_SIZE, h), (0, 0, 0, 0))
+    region = background.crop((x, y, x + PIECE_SIZE, y + PIECE_SIZE)).convert("RGBA")
+    region.putalpha(mask)
+    piece.paste(region, (0, y), region)
+
+    shade = Image.new("RGB", (PIECE_SIZE, PIECE_SIZE), (255, 255, 255))
+    holed = background.copy()
+    hole = Image.blend(region.convert("RGB"), shade, rng.uniform(0.45, 0.7))
+    holed.paste(hole, (x, y), mask)
+
+    return {
+        "captchaType": "blockPuzzle",
+        "data": {"jigsawImageBase64": _b64_png(piece), "originalImageBase64": _b64_png(holed)},
+        "answer": {"x1": x},
+    }
+
+
+def _render_char(ch: str, font: ImageFont.FreeTypeFont, rng: random.Random) -> Image.Image:
+    size = int(font.size * 1.6)
+    tile = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    color = tuple(rng.randint(0, 200) for _ in range(3)) + (255,)
+    ImageDraw.Draw(tile).text((size // 2, size // 2), ch, font=font, fill=color, anchor="mm")
+    tile = tile.rotate(rng.uniform(-35, 35), resample=Image.BICUBIC)
+    return tile.crop(tile.getbbox() or (0, 0, size, size))
+
+
+def _overlaps(box: Tuple[int, int, int, int], boxes: List[Tuple[int, int, int, int]]) -> bool:
+    return any(not (box[2] <= b[0] or b[2] <= box[0] or box[3] <= b[1] or b[3] <= box[1]) for b in boxes)
+
+
+def make_click_word(rng: random.Random, font_path: str, n_chars: int = 5, n_words: int = 3) -> Dict[str, Any]:
+    """生成一张点选文字验证码，wordList 中每个字对应一个标注框。"""
+    w, h = BG_SIZE
+    background = _random_background(rng)
+    chars = rng.sample(OCR_CHARSET, n_chars)
+    boxes: List[Tuple[int, int, int, int]] = []
+    placed: List[str] = []
+    for ch in chars:
+        font = ImageFont.truetype(font_path, rng.randint(24, 32))
+        glyph = _render_char(ch, font, rng)
+        gw, gh = glyph.size
+        for _ in range(50):
+            x, y = rng.randint(2, w - gw - 2), rng.randint(2, h - gh - 2)
+            box = (x, y, x + gw, y + gh)
+            if not _overlaps(box, boxes):
+                background.paste(glyph, (x, y), glyph)
+                boxes.append(box)
+                placed.append(ch)
+                break
+
+    order = rng.sample(range(len(placed)), min(n_words, len(placed)))
+    return {
+        "captchaType": "clickWord",
+        "data": {
+            "originalImageBase64": _b64_png(background),
+            "wordList": [placed[i] for i in order],
+        },
+        "answer": {"boxes": [list(boxes[i]) for i in order]},
+    }
+
+
+def find_font(font_path: Optional[str]) -> Optional[str]:
+    if font_path:
+        return font_path
+    for path in FONT_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="生成带标注的验证码夹具")
+    parser.add_argument("out_dir", help="输出目录")
+    parser.add_argument("--kind", default="both", choices=["blockPuzzle", "clickWord", "both"])
+    parser.add_argument("--count", type=int, default=100, help="每种验证码的数量")
+    parser.add_argument("--font", default=None, help="可渲染中文的字体文件")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    makers = []
+    if args.kind in ("blockPuzzle", "both"):
+        makers.append(("blockPuzzle", make_block_puzzle))
+    if args.kind in ("clickWord", "both"):
+        font_path = find_font(args.font)
+        if not font_path:
+            raise SystemExit("未找到中文字体，请通过 --font 指定")
+        makers.append(("clickWord", lambda r: make_click_word(r, font_path)))
+
+    for name, maker in makers:
+        for i in range(args.count):
+            with open(os.path.join(args.out_dir, f"{name}_{i:05d}.json"), "w", encoding="utf-8") as f:
+                json.dump(maker(rng), f, ensure_ascii=False)
+        print(f"{name}: 已生成 {args.count} 个夹具 -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+离线生成验证码模型的 INT8 动态量化版本。
+
+用法（需要额外安装 onnx：pip install onnx）：
+    python -m server.tools.quantize_models
+    python -m server.tools.quantize_models --models ocr.onnx --per-channel
+
+输出文件与原模型放在同一 MODEL_DIR 下，命名为 <name>.int8.onnx。
+运行时设置 CAPTCHA_MODEL_VARIANT=int8 即可启用（CAPTCHA_INT8_MODELS 可限定模型）。
+"""
+import argparse
+import os
+import tempfile
+
+from server.util.CaptchaUtils import MODEL_DIR, MODEL_URLS, ensure_model_exists, variant_filename
+
+
+def quantize(filename: str, per_channel: bool, weight_type: str) -> str:
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise SystemExit(f"缺少量化依赖（pip install onnx）: {e}")
+
+    ensure_model_exists(filename, MODEL_URLS[filename])
+    src = os.path.join(MODEL_DIR, filename)
+    dst = os.path.join(MODEL_DIR, variant_filename(filename, "int8"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_input = src
+        try:
+            # 先做形状推断与图优化，量化覆盖的算子更多；失败时直接量化原模型
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+
+            pre = os.path.join(tmp, "pre.onnx")
+            quant_pre_process(src, pre)
+            model_input = pre
+        except Exception as e:
+            print(f"[{filename}] 跳过预处理: {e}")
+
+        quantize_dynamic(
+            model_input,
+            dst,
+            per_channel=per_channel,
+            weight_type=QuantType.QInt8 if weight_type == "qint8" else QuantType.QUInt8,
+        )
+
+    print(f"[{filename}] {os.path.getsize(src) / 1024:.0f} KB -> {os.path.getsize(dst) / 1024:.0f} KB: {dst}")
+    return dst
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="生成 INT8 动态量化模型")
+    parser.add_argument("--models", nargs="*", default=list(MODEL_URLS), choices=list(MODEL_URLS))
+    parser.add_argument("--per-channel", action="store_true", help="按通道量化权重")
+    parser.add_argument("--weight-type", default="quint8", choices=["qint8", "quint8"])
+    args = parser.parse_args()
+
+    for filename in args.models:
+        quantize(filename, args.per_channel, args.weight_type)
+
+
+if __name__ == "__main__":
+    main()
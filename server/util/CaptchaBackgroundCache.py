@@ -0,0 +1,252 @@
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv(
+    "CAPTCHA_BG_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "captcha_bg"),
+)
+
+# dHash 尺寸：17x16 灰度图 -> 256 bit 指纹
+_HASH_W = 17
+_HASH_H = 16
+# 指纹汉明距离阈值（缺口只占背景很小一部分，同一张底图的两次缺口最多翻转少量比特）
+_HASH_MAX_DISTANCE = 48
+# 像素差异阈值（灰度）
+_DIFF_THRESHOLD = 30
+# 缺口以外区域允许的差异像素比例，超过则认为不是同一张底图
+_OUTSIDE_DIFF_RATIO = 0.01
+
+_INDEX: Dict[int, str] = {}
+_INDEX_LOADED = False
+_LOCK = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name) or str(default))
+    except Exception:
+        return default
+
+
+def is_enabled() -> bool:
+    return (os.getenv("CAPTCHA_BG_CACHE") or "1").strip().lower() not in ["0", "false", "no", "off"]
+
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def background_hash(gray: np.ndarray) -> int:
+    """
+    计算背景图的感知哈希（dHash）。
+
+    Args:
+        gray (np.ndarray): 灰度背景图。
+
+    Returns:
+        int: 256 位指纹。
+    """
+    small = cv2.resize(gray, (_HASH_W, _HASH_H), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _entry_path(h: int) -> str:
+    return os.path.join(CACHE_DIR, f"{h:064x}.npz")
+
+
+def _load_index() -> None:
+    global _INDEX_LOADED
+    if _INDEX_LOADED:
+        return
+    _INDEX_LOADED = True
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".npz"):
+            continue
+        try:
+            _INDEX[int(name[:-4], 16)] = os.path.join(CACHE_DIR, name)
+        except ValueError:
+            continue
+
+
+def _find_nearest(h: int, limit: int = 3) -> List[int]:
+    """返回汉明距离在阈值内的缓存键，按距离升序，最多 limit 个。"""
+    near = sorted((_hamming(h, key), key) for key in _INDEX)
+    return [key for d, key in near[:limit] if d <= _HASH_MAX_DISTANCE]
+
+
+def _read_entry(key: int) -> Optional[Tuple[np.ndarray, Tuple[int, int]]]:
+    path = _INDEX.get(key)
+    if not path:
+        return None
+    try:
+        with np.load(path) as data:
+            image = data["image"]
+            cut = tuple(int(v) for v in data["cut"])
+        os.utime(path)
+        return image, cut
+    except Exception as e:
+        logger.warning(f"读取背景缓存失败，已丢弃: {e}")
+        _INDEX.pop(key, None)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+
+def _write_entry(key: int, image: np.ndarray, cut: Tuple[int, int]) -> None:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key)
+    # 临时文件名唯一，多个进程同时写入也不会冲突
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix=".tmp", delete=False) as f:
+        np.savez(f, image=image, cut=np.array(cut, dtype=np.int32))
+        tmp = f.name
+    try:
+        os.replace(tmp, path)
+    except Exception:
+        os.remove(tmp)
+        raise
+    _INDEX[key] = path
+    _evict()
+
+
+def _evict() -> None:
+    max_entries = max(1, _env_int("CAPTCHA_BG_CACHE_MAX", 256))
+    if len(_INDEX) <= max_entries:
+        return
+    aged: List[Tuple[float, int]] = []
+    for key, path in _INDEX.items():
+        try:
+            aged.append((os.path.getmtime(path), key))
+        except OSError:
+            aged.append((0.0, key))
+    aged.sort()
+    for _, key in aged[: len(_INDEX) - max_entries]:
+        path = _INDEX.pop(key, None)
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _column_mass(mask: np.ndarray) -> np.ndarray:
+    return mask.sum(axis=0).astype(np.int64)
+
+
+def _best_window(mass: np.ndarray, width: int) -> Tuple[int, int]:
+    window = np.convolve(mass, np.ones(width, dtype=np.int64), mode="valid")
+    x = int(np.argmax(window))
+    return x, int(window[x])
+
+
+def lookup(background: np.ndarray, piece_width: int) -> Optional[int]:
+    """
+    通过与缓存中同一底图的像素差分定位缺口，未命中时返回 None。
+
+    Args:
+        background (np.ndarray): 带缺口的背景图。
+        piece_width (int): 滑块图片宽度。
+
+    Returns:
+        Optional[int]: 缺口左边界 x 坐标。
+    """
+    if not is_enabled():
+        return None
+    gray = to_gray(background)
+    h = background_hash(gray)
+    with _LOCK:
+        _load_index()
+        keys = _find_nearest(h)
+    for key in keys:
+        with _LOCK:
+            entry = _read_entry(key)
+        if entry is None:
+            continue
+        x = _locate(key, entry, gray, piece_width)
+        if x is not None:
+            logger.info(f"背景缓存命中，缺口位置: {x}")
+            return x
+    return None
+
+
+def _locate(key: int, entry: Tuple[np.ndarray, Tuple[int, int]], gray: np.ndarray, piece_width: int) -> Optional[int]:
+    ref, cut = entry
+    if ref.shape != gray.shape or piece_width <= 0 or piece_width >= gray.shape[1]:
+        return None
+
+    mask = cv2.absdiff(gray, ref) > _DIFF_THRESHOLD
+    mass = _column_mass(mask)
+    ref_clean = cut[0] < 0
+    if not ref_clean:
+        mass[max(0, cut[0]) : cut[1]] = 0
+
+    x, inside = _best_window(mass, piece_width)
+    outside = int(mass.sum()) - inside
+    if outside > _OUTSIDE_DIFF_RATIO * mask.size:
+        return None
+    if inside < 0.2 * piece_width * piece_width:
+        return None
+    if not ref_clean and x < cut[1] and cut[0] < x + piece_width:
+        # 缺口与缓存图自身的缺口重叠，差分结果不可靠
+        return None
+
+    if not ref_clean:
+        # 用当前图补全缓存图的缺口，得到干净底图
+        clean = ref.copy()
+        clean[:, cut[0] : cut[1]] = gray[:, cut[0] : cut[1]]
+        with _LOCK:
+            try:
+                _write_entry(key, clean, (-1, -1))
+            except Exception as e:
+                logger.warning(f"写入背景缓存失败: {e}")
+    return x
+
+
+def remember(background: np.ndarray, x_start: int, piece_width: int) -> None:
+    """
+    记录已确认可靠的匹配结果（通过置信度检查的匹配）对应的背景图及其缺口范围，供后续差分使用。
+
+    只新增或覆盖同一指纹的记录，不会替换相近的已有底图；条目数超过 CAPTCHA_BG_CACHE_MAX 时
+    按最近使用时间淘汰。
+
+    Args:
+        background (np.ndarray): 带缺口的背景图。
+        x_start (int): 缺口左边界 x 坐标。
+        piece_width (int): 滑块图片宽度。
+    """
+    if not is_enabled():
+        return
+    gray = to_gray(background)
+    h = background_hash(gray)
+    cut = (max(0, int(x_start)), min(gray.shape[1], int(x_start) + int(piece_width)))
+    with _LOCK:
+        _load_index()
+        if h in _INDEX:
+            entry = _read_entry(h)
+            if entry is not None and entry[1][0] < 0:
+                # 已有干净底图
+                return
+        try:
+            _write_entry(h, gray, cut)
+        except Exception as e:
+            logger.warning(f"写入背景缓存失败: {e}")
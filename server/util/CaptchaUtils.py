@@ -3,6 +3,9 @@ import json
 import logging
 import random
 import struct
+import time
+import uuid
+from typing import Optional
 
 from cv2.typing import MatLike
 import numpy as np
@@ -13,15 +16,52 @@ import os
 import requests
 import threading
 
+from server.util import CaptchaBackgroundCache
+
 logger = logging.getLogger(__name__)
 
 MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "models_onnx"))
 
+MODEL_VARIANTS = ("fp32", "int8")
+_MISSING_VARIANT_WARNED = set()
+
+
+def variant_filename(filename: str, variant: str) -> str:
+    """返回模型指定精度版本的文件名，例如 ocr.onnx -> ocr.int8.onnx。"""
+    if variant == "fp32":
+        return filename
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{variant}{ext}"
+
+
+def _model_variant(filename: str) -> str:
+    variant = (os.getenv("CAPTCHA_MODEL_VARIANT") or "fp32").strip().lower()
+    if variant not in MODEL_VARIANTS:
+        return "fp32"
+    only = [x.strip() for x in (os.getenv("CAPTCHA_INT8_MODELS") or "").split(",") if x.strip()]
+    if only and filename not in only:
+        return "fp32"
+    return variant
+
+
 def get_model_path(filename: str) -> str:
+    """
+    获取模型路径。设置 CAPTCHA_MODEL_VARIANT=int8 时优先使用量化模型
+    （可用 CAPTCHA_INT8_MODELS 限定模型），量化文件不存在时回退到原模型。
+    """
+    variant = _model_variant(filename)
+    if variant != "fp32":
+        path = os.path.join(MODEL_DIR, variant_filename(filename, variant))
+        if os.path.exists(path):
+            return path
+        if filename not in _MISSING_VARIANT_WARNED:
+            _MISSING_VARIANT_WARNED.add(filename)
+            logger.warning(f"未找到 {variant} 模型 {path}，使用原始模型")
     return os.path.join(MODEL_DIR, filename)
 
 def ensure_model_exists(filename: str, url: str):
-    path = get_model_path(filename)
+    # 始终保证原始（fp32）模型存在，量化模型缺失或损坏时 get_model_path 才有可回退的文件
+    path = os.path.join(MODEL_DIR, filename)
     if os.path.exists(path):
         return
 
@@ -63,6 +103,33 @@ def _get_ort_session(model_path: str, use_gpu: bool = False):
         return session
 
 
+def save_captcha_sample(captcha_type: str, data: dict, answer: dict) -> None:
+    """
+    设置 CAPTCHA_SAMPLE_DIR 时，把验证码图片及识别结果保存为样本，供离线基准测试使用。
+
+    Args:
+        captcha_type (str): 验证码类型（blockPuzzle / clickWord）。
+        data (dict): 验证码接口返回的 data 字段（仅保存图片与文字列表）。
+        answer (dict): 识别结果及校验结论。
+    """
+    sample_dir = (os.getenv("CAPTCHA_SAMPLE_DIR") or "").strip()
+    if not sample_dir:
+        return
+    keep = ("jigsawImageBase64", "originalImageBase64", "wordList")
+    sample = {
+        "captchaType": captcha_type,
+        "data": {k: data.get(k) for k in keep if k in data},
+        "answer": answer,
+    }
+    try:
+        os.makedirs(sample_dir, exist_ok=True)
+        name = f"{captcha_type}_{int(time.time() * 1000)}_{uuid.uuid4().hex[:6]}.json"
+        with open(os.path.join(sample_dir, name), "w", encoding="utf-8") as f:
+            json.dump(sample, f, ensure_ascii=False)
+    except Exception as e:
+        logger.warning(f"保存验证码样本失败: {e}")
+
+
 def calculate_precise_slider_distance(target_start_x: int, target_end_x: int, slider_width: int) -> float:
     """
     计算滑块需要移动的精确距离，并添加微小随机偏移。
@@ -118,6 +185,161 @@ def extract_png_width(png_binary: bytes) -> int:
         raise
 
 
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or str(default))
+    except Exception:
+        return default
+
+
+def _top_k_peaks(res: np.ndarray, k: int, suppress_width: int) -> list:
+    """
+    从模板匹配响应图中取前 k 个峰值，并做横向非极大值抑制。
+
+    Args:
+        res (np.ndarray): matchTemplate 的响应图。
+        k (int): 候选数量。
+        suppress_width (int): 抑制半径（像素），通常为滑块宽度。
+
+    Returns:
+        list: [(x, y, score), ...]，按得分降序。
+    """
+    res = res.copy()
+    peaks = []
+    for _ in range(max(1, k)):
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        if peaks and max_val <= -1:
+            break
+        peaks.append((int(max_loc[0]), int(max_loc[1]), float(max_val)))
+        x0 = max(0, max_loc[0] - suppress_width + 1)
+        x1 = min(res.shape[1], max_loc[0] + suppress_width)
+        res[:, x0:x1] = -1
+    return peaks
+
+
+def _legacy_template_candidates(target: np.ndarray, background: np.ndarray, top_k: int) -> list:
+    """全图三通道边缘模板匹配（原始实现，作为快速匹配失败时的回退）。"""
+    background = cv2.Canny(background, 100, 200)
+    target = cv2.Canny(target, 100, 200)
+
+    background = cv2.cvtColor(background, cv2.COLOR_GRAY2RGB)
+    target = cv2.cvtColor(target, cv2.COLOR_GRAY2RGB)
+
+    res = cv2.matchTemplate(background, target, cv2.TM_CCOEFF_NORMED)
+    return [(x, score) for x, _, score in _top_k_peaks(res, top_k, target.shape[1])]
+
+
+def _fast_template_candidates(target: np.ndarray, background: np.ndarray, top_k: int) -> Optional[list]:
+    """
+    单通道、限定纵向条带的金字塔模板匹配。
+
+    利用滑块图片的透明通道裁出拼图块及其所在的纵向条带，只在该条带内做边缘匹配：
+    先在半分辨率上粗搜，再在全分辨率的小窗口内精修。
+
+    Args:
+        target (np.ndarray): 带透明通道的滑块图片（BGRA）。
+        background (np.ndarray): 背景图片。
+        top_k (int): 候选数量。
+
+    Returns:
+        Optional[list]: [(滑块图片左边界 x, 相似度), ...]；无法使用快速路径时返回 None。
+    """
+    if target.ndim != 3 or target.shape[2] != 4:
+        return None
+    ys, xs = np.nonzero(target[:, :, 3] > 0)
+    if ys.size == 0:
+        return None
+
+    margin = 2
+    th, tw = target.shape[:2]
+    py0, py1 = max(0, int(ys.min()) - margin), min(th, int(ys.max()) + 1 + margin)
+    px0, px1 = max(0, int(xs.min()) - margin), min(tw, int(xs.max()) + 1 + margin)
+
+    bg_gray = CaptchaBackgroundCache.to_gray(background)
+    by0, by1 = max(0, py0 - margin), min(bg_gray.shape[0], py1 + margin)
+    piece = cv2.Canny(cv2.cvtColor(target[py0:py1, px0:px1, :3], cv2.COLOR_BGR2GRAY), 100, 200)
+    band = cv2.Canny(bg_gray[by0:by1], 100, 200)
+    ph, pw = piece.shape
+    if band.shape[0] < ph or band.shape[1] < pw:
+        return None
+
+    if min(ph, pw) >= 16:
+        coarse = cv2.matchTemplate(cv2.pyrDown(band), cv2.pyrDown(piece), cv2.TM_CCOEFF_NORMED)
+        seeds = [x * 2 for x, _, _ in _top_k_peaks(coarse, top_k, max(1, pw // 2))]
+        radius = 3
+    else:
+        seeds = [0]
+        radius = band.shape[1]
+
+    found = {}
+    for seed in seeds:
+        lo = max(0, seed - radius)
+        hi = min(band.shape[1], seed + radius + pw)
+        if hi - lo < pw:
+            continue
+        res = cv2.matchTemplate(band[:, lo:hi], piece, cv2.TM_CCOEFF_NORMED)
+        for x, _, score in _top_k_peaks(res, 1 if radius == 3 else top_k, pw):
+            left = lo + x - px0
+            if score > found.get(left, -2.0):
+                found[left] = score
+
+    ranked = sorted(found.items(), key=lambda kv: kv[1], reverse=True)
+    deduped = []
+    for x, score in ranked:
+        if all(abs(x - x2) >= pw // 2 for x2, _ in deduped):
+            deduped.append((x, score))
+    return deduped[:top_k] or None
+
+
+def slide_match_candidates(target_bytes: bytes, background_bytes: bytes, top_k: int = 3) -> list:
+    """
+    获取验证区域的候选坐标，按置信度降序排列。
+    底图命中背景缓存时使用差分定位；未命中时使用条带金字塔匹配，失败再回退到全图模板匹配。
+
+    Args:
+        target_bytes (bytes): 滑块图片二进制数据。
+        background_bytes (bytes): 背景图片二进制数据。
+        top_k (int): 最多返回的候选数量。
+
+    Returns:
+        list: [{"x1": 左边界, "x2": 右边界, "score": 相似度, "source": cache / fast / legacy}, ...]。
+    """
+    try:
+        target_raw = cv2.imdecode(np.frombuffer(target_bytes, np.uint8), cv2.IMREAD_UNCHANGED)
+        background = cv2.imdecode(np.frombuffer(background_bytes, np.uint8), cv2.IMREAD_ANYCOLOR)
+        target = target_raw[:, :, :3] if target_raw.ndim == 3 and target_raw.shape[2] == 4 else target_raw
+        w = target.shape[1]
+
+        # 同一底图见过时，直接与缓存的干净底图做差分定位缺口
+        try:
+            cached_x = CaptchaBackgroundCache.lookup(background, w)
+        except Exception as e:
+            logger.warning(f"背景缓存查询失败: {e}")
+            cached_x = None
+        if cached_x is not None:
+            return [{"x1": int(cached_x), "x2": int(cached_x + w), "score": 1.0, "source": "cache"}]
+
+        peaks = None
+        source = "fast"
+        if (os.getenv("CAPTCHA_SLIDE_MATCHER") or "fast").strip().lower() != "legacy":
+            try:
+                peaks = _fast_template_candidates(target_raw, background, top_k)
+            except Exception as e:
+                logger.warning(f"快速滑块匹配失败，回退到全图匹配: {e}")
+            if peaks and peaks[0][1] < _env_float("CAPTCHA_FAST_MATCH_MIN_SCORE", 0.1):
+                peaks = None
+        if not peaks:
+            peaks = _legacy_template_candidates(target, background, top_k)
+            source = "legacy"
+
+        logger.info(f"滑块匹配成功，候选相似度: {[round(p[1], 3) for p in peaks]}")
+        return [{"x1": int(x), "x2": int(x + w), "score": float(score), "source": source} for x, score in peaks]
+
+    except Exception as e:
+        logger.error(f"滑块匹配时发生错误: {e}")
+        raise
+
+
 def slide_match(target_bytes: bytes, background_bytes: bytes) -> list:
     """
     获取验证区域坐标，使用目标检测算法。
@@ -129,50 +351,84 @@ def slide_match(target_bytes: bytes, background_bytes: bytes) -> list:
     Returns:
         list: 目标区域左边界坐标，右边界坐标。
     """
-    try:
-        target = cv2.imdecode(np.frombuffer(target_bytes, np.uint8), cv2.IMREAD_ANYCOLOR)
-        background = cv2.imdecode(np.frombuffer(background_bytes, np.uint8), cv2.IMREAD_ANYCOLOR)
+    best = slide_match_candidates(target_bytes, background_bytes, top_k=1)[0]
+    return [best["x1"], best["x2"]]
 
-        background = cv2.Canny(background, 100, 200)
-        target = cv2.Canny(target, 100, 200)
 
-        background = cv2.cvtColor(background, cv2.COLOR_GRAY2RGB)
-        target = cv2.cvtColor(target, cv2.COLOR_GRAY2RGB)
+# 各匹配方式的 (最低得分, 最小差距) 默认值。两种匹配的得分尺度不同（条带匹配在裁剪后的拼图块上计算，
+# 得分整体偏高），阈值分别用 server.tools.captcha_fixtures 生成的 600 张样本校准：
+# fast 在 0.25 / 0.08 时约 1.2% 的正确结果被拒、错误结果从 5 个降到 1 个；legacy 在 0.2 / 0.05 时约 0.5% 被拒
+_AMBIGUITY_THRESHOLDS = {
+    "fast": (0.25, 0.08),
+    "legacy": (0.2, 0.05),
+}
 
-        res = cv2.matchTemplate(background, target, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(res)
 
-        h, w = target.shape[:2]
-        bottom_right = (max_loc[0] + w, max_loc[1] + h)
+def is_ambiguous_match(candidates: list) -> bool:
+    """
+    根据候选排名判断本次匹配是否置信度过低。
+
+    按最佳候选的匹配方式（source）取阈值：最佳得分低于 CAPTCHA_SLIDER_MIN_SCORE_<SOURCE>，
+    或与次优候选的差距小于 CAPTCHA_SLIDER_MIN_MARGIN_<SOURCE> 时，认为结果不可靠；
+    背景缓存差分定位的结果不做检查。
 
-        logger.info(f"滑块匹配成功，最大相似度: {max_val}")
-        return [int(max_loc[0]), int(bottom_right[0])]
+    Args:
+        candidates (list): slide_match_candidates 的返回值。
 
+    Returns:
+        bool: 是否应放弃提交。
+    """
+    if not candidates:
+        return True
+    source = candidates[0].get("source") or "legacy"
+    if source == "cache":
+        return False
+    min_score, min_margin = _AMBIGUITY_THRESHOLDS.get(source, _AMBIGUITY_THRESHOLDS["legacy"])
+    best = candidates[0]["score"]
+    if best < _env_float(f"CAPTCHA_SLIDER_MIN_SCORE_{source.upper()}", min_score):
+        return True
+    margin = _env_float(f"CAPTCHA_SLIDER_MIN_MARGIN_{source.upper()}", min_margin)
+    if len(candidates) > 1 and best - candidates[1]["score"] < margin:
+        return True
+    return False
+
+
+def _remember_background(background_bytes: bytes, x_start: int, piece_width: int) -> None:
+    try:
+        background = cv2.imdecode(np.frombuffer(background_bytes, np.uint8), cv2.IMREAD_ANYCOLOR)
+        CaptchaBackgroundCache.remember(background, x_start, piece_width)
     except Exception as e:
-        logger.error(f"滑块匹配时发生错误: {e}")
-        raise
+        logger.warning(f"背景缓存写入失败: {e}")
 
 
-def recognize_blockPuzzle_captcha(target: str, background: str) -> str:
+def recognize_blockPuzzle_captcha(target: str, background: str, reject_ambiguous: bool = False) -> Optional[str]:
     """
     识别图像验证码。
 
     Args:
         target (str): 目标图像的二进制数据的base64编码。
         background (str): 背景图像的二进制数据的base64编码。
+        reject_ambiguous (bool): 为 True 时，低置信度的结果返回 None，由调用方重新获取验证码。
 
     Returns:
-        str: 滑块需要滑动的距离。
+        Optional[str]: 滑块需要滑动的距离。
     """
     try:
         target_bytes = base64.b64decode(target)
         background_bytes = base64.b64decode(background)
 
-        res = slide_match(target_bytes=target_bytes, background_bytes=background_bytes)
+        candidates = slide_match_candidates(target_bytes=target_bytes, background_bytes=background_bytes)
+        ambiguous = is_ambiguous_match(candidates)
+        if reject_ambiguous and ambiguous:
+            logger.info(f"滑块匹配置信度过低，放弃提交: {[round(c['score'], 3) for c in candidates]}")
+            return None
+        if not ambiguous and candidates[0].get("source") != "cache":
+            # 只缓存通过置信度检查的匹配，避免错误的缺口位置污染背景缓存
+            _remember_background(background_bytes, candidates[0]["x1"], candidates[0]["x2"] - candidates[0]["x1"])
 
         target_width = extract_png_width(target_bytes)
 
-        slider_distance = calculate_precise_slider_distance(res[0], res[1], target_width)
+        slider_distance = calculate_precise_slider_distance(candidates[0]["x1"], candidates[0]["x2"], target_width)
 
         slider_data = {
             "x": slider_distance,
@@ -186,6 +442,37 @@ def recognize_blockPuzzle_captcha(target: str, background: str) -> str:
         raise
 
 
+# OCR 模型输出类别对应的字符表
+OCR_CHARSET = [
+    "士", "候", "之", "科", "孩", "雪", "万", "章", "导", "治", "亲", "社", "所", "似", "验", "习", "吃", "历", "写", "业",
+    "为", "睛", "睡", "将", "林", "法", "你", "观", "信", "掉", "觉", "站", "确", "老", "方", "道", "海", "性", "好", "感",
+    "女", "术", "如", "重", "细", "青", "流", "心", "包", "越", "且", "风", "哥", "菜", "劳", "必", "阶", "代", "令", "志",
+    "国", "们", "记", "知", "谁", "讲", "眼", "提", "由", "民", "怎", "度", "村", "没", "呀", "许", "以", "四", "政", "点",
+    "离", "说", "带", "关", "答", "出", "放", "告", "夜", "识", "兴", "做", "难", "八", "叶", "月", "马", "办", "行", "三",
+    "最", "小", "亮", "作", "晚", "义", "活", "公", "旁", "色", "看", "从", "话", "系", "高", "水", "您", "到", "装", "中",
+    "研", "雨", "住", "因", "少", "原", "什", "片", "准", "脚", "张", "深", "力", "让", "顶", "石", "山", "类", "野", "阵",
+    "赶", "见", "七", "立", "整", "屋", "再", "读", "相", "弟", "两", "接", "种", "车", "近", "外", "几", "停", "认", "特",
+    "战", "化", "子", "定", "边", "多", "产", "形", "她", "衣", "共", "音", "分", "级", "别", "千", "连", "理", "往", "先",
+    "队", "围", "满", "在", "领", "画", "他", "反", "花", "农", "被", "名", "这", "席", "众", "很", "渐", "乡", "极", "实",
+    "城", "取", "题", "儿", "响", "那", "主", "进", "去", "思", "找", "总", "应", "船", "身", "牛", "歌", "团", "爬", "岁",
+    "着", "冲", "早", "利", "受", "忽", "苦", "也", "表", "通", "有", "像", "现", "对", "头", "开", "般", "呼", "又", "的",
+    "把", "帮", "收", "军", "怕", "饭", "或", "就", "年", "背", "来", "革", "压", "斗", "位", "房", "飞", "都", "块", "跳",
+    "变", "今", "命", "区", "爱", "门", "入", "九", "动", "根", "南", "造", "其", "者", "便", "每", "事", "座", "算", "然",
+    "笑", "阳", "半", "大", "是", "会", "一", "非", "树", "旧", "里", "至", "无", "问", "发", "河", "物", "东", "叔", "它",
+    "百", "拿", "叫", "明", "刚", "脸", "干", "样", "呢", "更", "底", "忙", "我", "结", "地", "界", "草", "论", "还", "轻",
+    "数", "世", "只", "用", "长", "个", "光", "此", "沙", "面", "白", "转", "哪", "想", "件", "文", "未", "啦", "口", "十",
+    "人", "各", "并", "敌", "打", "古", "合", "完", "啊", "线", "回", "嘴", "究", "岸", "听", "内", "土", "跑", "日", "平",
+    "咱", "快", "坚", "真", "够", "工", "些", "已", "争", "得", "望", "伟", "却", "处", "但", "过", "唱", "时", "热", "走",
+    "书", "不", "起", "神", "使", "本", "自", "倒", "比", "前", "新", "直", "经", "解", "步", "胜", "次", "该", "六", "后",
+    "报", "体", "家", "急", "际", "五", "北", "等", "员", "何", "火", "吗", "机", "当", "么", "天", "枪", "量", "意", "同",
+    "决", "钱", "情", "手", "强", "全", "了", "可", "果", "气", "加", "学", "息", "黑", "刻", "而", "慢", "紧", "照", "指",
+    "改", "上", "运", "声", "二", "吧", "己", "字", "才", "教", "于", "向", "要", "建", "展", "句", "史", "给", "坐", "和",
+    "第", "成", "落", "跟", "群", "星", "生", "部", "送", "服", "穿", "友", "下", "拉", "任", "太", "常", "场", "敢", "清",
+    "路", "破", "传", "空", "师", "切", "条",
+]
+OCR_CHARSET_INDEX = {c: i for i, c in enumerate(OCR_CHARSET)}
+
+
 def detect_objects(model_path: str, image_data: MatLike, use_gpu: bool = False) -> list[list[int]]:
     """
     使用ONNX模型进行目标检测。
@@ -245,6 +532,18 @@ def detect_objects(model_path: str, image_data: MatLike, use_gpu: bool = False)
         raise ValueError(f"目标检测失败: {e}")
 
 
+def _run_ocr(model_path: str, image: np.ndarray, use_gpu: bool = False) -> list:
+    session = _get_ort_session(model_path, use_gpu=use_gpu)
+
+    image = np.expand_dims(
+        cv2.cvtColor(cv2.resize(image, (64, 64)), cv2.COLOR_BGR2RGB).transpose((2, 0, 1)).astype(np.float32)
+        / 255.0,
+        axis=0,
+    )
+
+    return session.run(None, {session.get_inputs()[0].name: image})
+
+
 def predict_ocr(model_path: str, image: np.ndarray, use_gpu: bool = False) -> str:
     """
     使用ONNX模型进行OCR预测。
@@ -255,515 +554,131 @@ def predict_ocr(model_path: str, image: np.ndarray, use_gpu: bool = False) -> st
     :raises: Exception 如果模型加载或推理过程中发生错误。
     """
     try:
-        session = _get_ort_session(model_path, use_gpu=use_gpu)
+        return "".join(OCR_CHARSET[item] for item in _run_ocr(model_path, image, use_gpu)[1])
 
-        image = np.expand_dims(
-            cv2.cvtColor(cv2.resize(image, (64, 64)), cv2.COLOR_BGR2RGB).transpose((2, 0, 1)).astype(np.float32)
-            / 255.0,
-            axis=0,
-        )
+    except Exception as e:
+        raise Exception(f"OCR预测失败: {e}")
 
-        charset = [
-            "士",
-            "候",
-            "之",
-            "科",
-            "孩",
-            "雪",
-            "万",
-            "章",
-            "导",
-            "治",
-            "亲",
-            "社",
-            "所",
-            "似",
-            "验",
-            "习",
-            "吃",
-            "历",
-            "写",
-            "业",
-            "为",
-            "睛",
-            "睡",
-            "将",
-            "林",
-            "法",
-            "你",
-            "观",
-            "信",
-            "掉",
-            "觉",
-            "站",
-            "确",
-            "老",
-            "方",
-            "道",
-            "海",
-            "性",
-            "好",
-            "感",
-            "女",
-            "术",
-            "如",
-            "重",
-            "细",
-            "青",
-            "流",
-            "心",
-            "包",
-            "越",
-            "且",
-            "风",
-            "哥",
-            "菜",
-            "劳",
-            "必",
-            "阶",
-            "代",
-            "令",
-            "志",
-            "国",
-            "们",
-            "记",
-            "知",
-            "谁",
-            "讲",
-            "眼",
-            "提",
-            "由",
-            "民",
-            "怎",
-            "度",
-            "村",
-            "没",
-            "呀",
-            "许",
-            "以",
-            "四",
-            "政",
-            "点",
-            "离",
-            "说",
-            "带",
-            "关",
-            "答",
-            "出",
-            "放",
-            "告",
-            "夜",
-            "识",
-            "兴",
-            "做",
-            "难",
-            "八",
-            "叶",
-            "月",
-            "马",
-            "办",
-            "行",
-            "三",
-            "最",
-            "小",
-            "亮",
-            "作",
-            "晚",
-            "义",
-            "活",
-            "公",
-            "旁",
-            "色",
-            "看",
-            "从",
-            "话",
-            "系",
-            "高",
-            "水",
-            "您",
-            "到",
-            "装",
-            "中",
-            "研",
-            "雨",
-            "住",
-            "因",
-            "少",
-            "原",
-            "什",
-            "片",
-            "准",
-            "脚",
-            "张",
-            "深",
-            "力",
-            "让",
-            "顶",
-            "石",
-            "山",
-            "类",
-            "野",
-            "阵",
-            "赶",
-            "见",
-            "七",
-            "立",
-            "整",
-            "屋",
-            "再",
-            "读",
-            "相",
-            "弟",
-            "两",
-            "接",
-            "种",
-            "车",
-            "近",
-            "外",
-            "几",
-            "停",
-            "认",
-            "特",
-            "战",
-            "化",
-            "子",
-            "定",
-            "边",
-            "多",
-            "产",
-            "形",
-            "她",
-            "衣",
-            "共",
-            "音",
-            "分",
-            "级",
-            "别",
-            "千",
-            "连",
-            "理",
-            "往",
-            "先",
-            "队",
-            "围",
-            "满",
-            "在",
-            "领",
-            "画",
-            "他",
-            "反",
-            "花",
-            "农",
-            "被",
-            "名",
-            "这",
-            "席",
-            "众",
-            "很",
-            "渐",
-            "乡",
-            "极",
-            "实",
-            "城",
-            "取",
-            "题",
-            "儿",
-            "响",
-            "那",
-            "主",
-            "进",
-            "去",
-            "思",
-            "找",
-            "总",
-            "应",
-            "船",
-            "身",
-            "牛",
-            "歌",
-            "团",
-            "爬",
-            "岁",
-            "着",
-            "冲",
-            "早",
-            "利",
-            "受",
-            "忽",
-            "苦",
-            "也",
-            "表",
-            "通",
-            "有",
-            "像",
-            "现",
-            "对",
-            "头",
-            "开",
-            "般",
-            "呼",
-            "又",
-            "的",
-            "把",
-            "帮",
-            "收",
-            "军",
-            "怕",
-            "饭",
-            "或",
-            "就",
-            "年",
-            "背",
-            "来",
-            "革",
-            "压",
-            "斗",
-            "位",
-            "房",
-            "飞",
-            "都",
-            "块",
-            "跳",
-            "变",
-            "今",
-            "命",
-            "区",
-            "爱",
-            "门",
-            "入",
-            "九",
-            "动",
-            "根",
-            "南",
-            "造",
-            "其",
-            "者",
-            "便",
-            "每",
-            "事",
-            "座",
-            "算",
-            "然",
-            "笑",
-            "阳",
-            "半",
-            "大",
-            "是",
-            "会",
-            "一",
-            "非",
-            "树",
-            "旧",
-            "里",
-            "至",
-            "无",
-            "问",
-            "发",
-            "河",
-            "物",
-            "东",
-            "叔",
-            "它",
-            "百",
-            "拿",
-            "叫",
-            "明",
-            "刚",
-            "脸",
-            "干",
-            "样",
-            "呢",
-            "更",
-            "底",
-            "忙",
-            "我",
-            "结",
-            "地",
-            "界",
-            "草",
-            "论",
-            "还",
-            "轻",
-            "数",
-            "世",
-            "只",
-            "用",
-            "长",
-            "个",
-            "光",
-            "此",
-            "沙",
-            "面",
-            "白",
-            "转",
-            "哪",
-            "想",
-            "件",
-            "文",
-            "未",
-            "啦",
-            "口",
-            "十",
-            "人",
-            "各",
-            "并",
-            "敌",
-            "打",
-            "古",
-            "合",
-            "完",
-            "啊",
-            "线",
-            "回",
-            "嘴",
-            "究",
-            "岸",
-            "听",
-            "内",
-            "土",
-            "跑",
-            "日",
-            "平",
-            "咱",
-            "快",
-            "坚",
-            "真",
-            "够",
-            "工",
-            "些",
-            "已",
-            "争",
-            "得",
-            "望",
-            "伟",
-            "却",
-            "处",
-            "但",
-            "过",
-            "唱",
-            "时",
-            "热",
-            "走",
-            "书",
-            "不",
-            "起",
-            "神",
-            "使",
-            "本",
-            "自",
-            "倒",
-            "比",
-            "前",
-            "新",
-            "直",
-            "经",
-            "解",
-            "步",
-            "胜",
-            "次",
-            "该",
-            "六",
-            "后",
-            "报",
-            "体",
-            "家",
-            "急",
-            "际",
-            "五",
-            "北",
-            "等",
-            "员",
-            "何",
-            "火",
-            "吗",
-            "机",
-            "当",
-            "么",
-            "天",
-            "枪",
-            "量",
-            "意",
-            "同",
-            "决",
-            "钱",
-            "情",
-            "手",
-            "强",
-            "全",
-            "了",
-            "可",
-            "果",
-            "气",
-            "加",
-            "学",
-            "息",
-            "黑",
-            "刻",
-            "而",
-            "慢",
-            "紧",
-            "照",
-            "指",
-            "改",
-            "上",
-            "运",
-            "声",
-            "二",
-            "吧",
-            "己",
-            "字",
-            "才",
-            "教",
-            "于",
-            "向",
-            "要",
-            "建",
-            "展",
-            "句",
-            "史",
-            "给",
-            "坐",
-            "和",
-            "第",
-            "成",
-            "落",
-            "跟",
-            "群",
-            "星",
-            "生",
-            "部",
-            "送",
-            "服",
-            "穿",
-            "友",
-            "下",
-            "拉",
-            "任",
-            "太",
-            "常",
-            "场",
-            "敢",
-            "清",
-            "路",
-            "破",
-            "传",
-            "空",
-            "师",
-            "切",
-            "条",
-        ]
 
-        return "".join(charset[item] for item in session.run(None, {session.get_inputs()[0].name: image})[1])
+def predict_ocr_probs(model_path: str, image: np.ndarray, use_gpu: bool = False) -> np.ndarray:
+    """
+    使用ONNX模型进行OCR预测，返回每个字符类别的概率。
+    :param model_path: ONNX模型路径。
+    :param image: 待检测的图片（OpenCV格式，numpy.ndarray）。
+    :param use_gpu: 是否使用GPU进行推理。
+    :return: 长度为 len(OCR_CHARSET) 的概率向量。
+    :raises: Exception 如果模型加载或推理过程中发生错误。
+    """
+    try:
+        outputs = _run_ocr(model_path, image, use_gpu)
+        n = len(OCR_CHARSET)
+        scores = np.asarray(outputs[0], dtype=np.float64)
+        if scores.size % n != 0:
+            # 模型未导出类别得分时退化为 argmax 的 one-hot
+            probs = np.full(n, 1e-6)
+            probs[int(np.asarray(outputs[1]).flatten()[0])] = 1.0
+            return probs / probs.sum()
+        scores = scores.reshape(-1, n)[0]
+        if scores.min() < 0 or abs(scores.sum() - 1.0) > 1e-3:
+            scores = np.exp(scores - scores.max())
+        return scores / scores.sum()
 
     except Exception as e:
         raise Exception(f"OCR预测失败: {e}")
 
 
+def _linear_sum_assignment(cost: np.ndarray) -> list:
+    """
+    匈牙利算法求最小代价匹配（行数不超过列数）。
+
+    Args:
+        cost (np.ndarray): 代价矩阵，形状为 (n, m)，n <= m。
+
+    Returns:
+        list: 每一行分配到的列下标。
+    """
+    n, m = cost.shape
+    inf = float("inf")
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                cur = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                if cur < minv[j]:
+                    minv[j] = cur
+                    way[j] = j0
+                if minv[j] < delta:
+                    delta = minv[j]
+                    j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    assignment = [-1] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            assignment[p[j] - 1] = j - 1
+    return assignment
+
+
+def assign_words_to_boxes(wordlist: list, box_probs: list) -> list:
+    """
+    按最大似然将目标文字分配到检测框（对数概率上的匈牙利匹配）。
+
+    Args:
+        wordlist (list): 要点击的文字列表。
+        box_probs (list): 每个检测框的类别概率向量。
+
+    Returns:
+        list: 与 wordlist 对应的检测框下标，无法分配时为 -1。
+    """
+    if not wordlist or not box_probs:
+        return [-1] * len(wordlist)
+    log_probs = np.log(np.clip(np.array(box_probs), 1e-12, 1.0))
+    cost = np.zeros((len(wordlist), len(box_probs)))
+    for i, word in enumerate(wordlist):
+        idx = OCR_CHARSET_INDEX.get(word)
+        # 字符表外的文字对所有框代价相同，只占用剩余的框
+        cost[i] = -log_probs[:, idx] if idx is not None else -np.log(1e-12)
+
+    if len(wordlist) <= len(box_probs):
+        return _linear_sum_assignment(cost)
+    # 文字多于检测框时，转置后为每个框分配一个文字
+    assignment = [-1] * len(wordlist)
+    for box, word_idx in enumerate(_linear_sum_assignment(cost.T)):
+        if word_idx >= 0:
+            assignment[word_idx] = box
+    return assignment
+
+
 def recognize_clickWord_captcha(target: str, wordlist: list) -> str:
     """
     从给定的图像中识别点击文字验证码，并返回单词的坐标。
 
-    此函数初始化ddddocr检测器和识别器，以检测和识别验证码中的单词。然后，它使用识别到的单词为给定单词列表中的单词生成随机坐标。
+    先检测文字框并计算每个框的字符类别概率，再按最大似然将目标文字分配到各个框，
+    即使某个字的识别结果不是第一候选，也能给出最可能的位置。
 
     Args:
         target (str): base64编码的图像字符串。
@@ -781,22 +696,28 @@ def recognize_clickWord_captcha(target: str, wordlist: list) -> str:
 
     bboxes = detect_objects(get_model_path("yolov5n.onnx"), image)
 
-    recognized_dict = {}
+    boxes = []
+    box_probs = []
     for bbox in bboxes:
         try:
             x_min, y_min, x_max, y_max = bbox
-            text = predict_ocr(get_model_path("ocr.onnx"), image[y_min:y_max, x_min:x_max])
-            recognized_dict[text] = bbox
+            box_probs.append(predict_ocr_probs(get_model_path("ocr.onnx"), image[y_min:y_max, x_min:x_max]))
+            boxes.append(bbox)
         except Exception as e:
             logger.warning(f"处理文本框时出错: {e}")
 
+    assignment = assign_words_to_boxes(list(wordlist), box_probs)
+
     random_coordinates = []
-    for word in wordlist:
-        bbox = recognized_dict.get(word)
-        if bbox:
-            x = random.randint(bbox[0], bbox[2])
-            y = random.randint(bbox[1], bbox[3])
-            random_coordinates.append({"x": x, "y": y})
-        else:
+    for word, box_idx in zip(wordlist, assignment):
+        if box_idx < 0:
             logger.warning(f"未找到字符: {word}")
+            continue
+        bbox = boxes[box_idx]
+        top = OCR_CHARSET[int(np.argmax(box_probs[box_idx]))]
+        if top != word:
+            logger.info(f"字符 {word} 按最大似然匹配到识别结果为 {top} 的文本框")
+        x = random.randint(bbox[0], bbox[2])
+        y = random.randint(bbox[1], bbox[3])
+        random_coordinates.append({"x": x, "y": y})
     return json.dumps(random_coordinates, separators=(",", ":"))
@@ -1,79 +1,221 @@
 import os
 import io
+import logging
+import math
 import random
-from typing import Optional
+import threading
+from typing import BinaryIO, List, Optional, Tuple, Union
 
 from PIL import Image
 
+from server import image_library
 from server.coreApi.FileUploadApi import upload
+from server.util import ProcessedImageCache
 
+logger = logging.getLogger(__name__)
 
-def process_image(image_path: str) -> bytes:
+# 图片目录列表缓存：(目录路径, 目录 mtime_ns) -> 图片路径列表
+_LISTING_CACHE: Optional[Tuple[str, int, List[str]]] = None
+_LISTING_LOCK = threading.Lock()
+
+
+# JPEG 输出大小上限（1MB）
+MAX_IMAGE_BYTES = 1 * 1024 * 1024
+
+# 探测图采样的质量点，以及探测图拼块的尺寸（按 16px MCU 对齐）
+_PROBE_QUALITIES = (30, 60, 85, 95)
+_PROBE_TILE = 48
+_PROBE_GRID = 6
+# JPEG 文件头（量化表、霍夫曼表等）的近似固定开销
+_JPEG_OVERHEAD = 620
+
+# 图片处理器版本：process_image 的输出有任何变化时加一，使已缓存的处理结果失效
+PROCESSOR_VERSION = 2
+
+# 探测图到整图的体积修正系数，按实际编码结果滑动校准
+_size_correction = 1.0
+_size_correction_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(os.getenv(name) or str(default))
+    except Exception:
+        value = default
+    return max(lo, min(value, hi))
+
+
+def _encode_jpeg(img: Image.Image, quality: int) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _probe_mosaic(img: Image.Image) -> Image.Image:
+    """从整图均匀取若干小块拼成探测图，保留原图的纹理密度。"""
+    w, h = img.size
+    tile, grid = _PROBE_TILE, _PROBE_GRID
+    if w <= tile * grid or h <= tile * grid:
+        return img
+    mosaic = Image.new(img.mode, (tile * grid, tile * grid))
+    for gy in range(grid):
+        y = (h - tile) * gy // (grid - 1)
+        for gx in range(grid):
+            x = (w - tile) * gx // (grid - 1)
+            mosaic.paste(img.crop((x, y, x + tile, y + tile)), (gx * tile, gy * tile))
+    return mosaic
+
+
+def _fit_size_model(img: Image.Image) -> List[Tuple[int, float]]:
+    """
+    在探测图上按几个质量点编码，得到该图片的 每像素字节数-质量 曲线。
+
+    Returns:
+        List[Tuple[int, float]]: (质量, 每像素字节数) 列表，按质量升序。
+    """
+    probe = _probe_mosaic(img)
+    pixels = probe.size[0] * probe.size[1]
+    return [
+        (q, max(1.0, len(_encode_jpeg(probe, q)) - _JPEG_OVERHEAD) / pixels)
+        for q in _PROBE_QUALITIES
+    ]
+
+
+def _predict_size(model: List[Tuple[int, float]], quality: int, pixels: int, correction: float) -> float:
+    # 每像素字节数在对数空间按质量分段线性插值，两端外推
+    for (q0, b0), (q1, b1) in zip(model, model[1:]):
+        if quality <= q1 or (q1, b1) == model[-1]:
+            t = (quality - q0) / (q1 - q0)
+            bpp = math.exp(math.log(b0) + t * (math.log(b1) - math.log(b0)))
+            return _JPEG_OVERHEAD + bpp * pixels * correction
+    return float("inf")
+
+
+def _choose_quality(model, pixels: int, correction: float, budget: float, min_q: int, max_q: int) -> int:
+    for q in range(max_q, min_q - 1, -1):
+        if _predict_size(model, q, pixels, correction) <= budget:
+            return q
+    return min_q
+
+
+def processing_params() -> Tuple[int, int, int, int]:
+    """当前生效的处理参数：(处理器版本, UPLOAD_IMAGE_MAX_DIM, UPLOAD_IMAGE_MAX_QUALITY, 体积上限)，用作缓存键的一部分。"""
+    return (
+        PROCESSOR_VERSION,
+        _env_int("UPLOAD_IMAGE_MAX_DIM", 2048, 256, 10000),
+        _env_int("UPLOAD_IMAGE_MAX_QUALITY", 92, 5, 95),
+        MAX_IMAGE_BYTES,
+    )
+
+
+def _plan_encode(model, pixels: int, correction: float, budget: float, min_q: int, max_q: int) -> Tuple[int, float]:
+    """
+    预测本次编码的质量和缩放比例。
+
+    最低质量仍超出预算时（极端噪声图）按面积比例缩小，缩放与质量在同一次编码中生效。
+
+    Returns:
+        Tuple[int, float]: (质量, 边长缩放比例，1.0 表示不缩放)。
+    """
+    quality = _choose_quality(model, pixels, correction, budget, min_q, max_q)
+    predicted = _predict_size(model, quality, pixels, correction)
+    if predicted <= budget:
+        return quality, 1.0
+    # 缩小后细节更密集，每像素字节数会上升，额外留 10% 余量
+    return quality, math.sqrt((budget - _JPEG_OVERHEAD) / (predicted - _JPEG_OVERHEAD)) * 0.9
+
+
+def _resized(img: Image.Image, scale: float) -> Image.Image:
+    if scale >= 1.0:
+        return img
+    return img.resize((max(1, int(img.size[0] * scale)), max(1, int(img.size[1] * scale))), Image.LANCZOS)
+
+
+def process_image(image_path: Union[str, BinaryIO]) -> bytes:
     """
     读取并处理图片，确保格式为JPEG，且大小不超过1MB。
-    通过动态调整JPEG压缩质量来控制文件大小。
+
+    先借助 draft() 以缩小尺寸解码 JPEG 并缩放到 UPLOAD_IMAGE_MAX_DIM 以内，
+    再用探测图拟合的体积模型直接预测合适的压缩质量（必要时连同缩放比例），
+    整图编码一次校验，超出上限时按实测结果修正后最多重编码一次，整图最多编码两次。
 
     Args:
-        image_path (str): 图片路径。
+        image_path (Union[str, BinaryIO]): 图片路径或文件对象。
 
     Returns:
         bytes: 处理后的图片二进制数据。
     """
-    # 打开原始图片
-    with Image.open(image_path) as img:
-        # 如果图片格式不是JPEG，则转换为RGB模式
-        if (img.format is None) or (str(img.format).upper() != "JPEG"):
-            img = img.convert("RGB")
-
-        # 定义文件大小上限（1MB）
-        max_size = 1 * 1024 * 1024
-
-        # 初始化质量参数
-        quality = 85
-        min_quality = 5
-        max_quality = 95
-
-        # 使用二分查找方法优化质量压缩
-        # 预先定义BytesIO对象，避免循环中重复创建（虽然差异不大，但更清晰）
-        img_byte_arr = io.BytesIO()
-
-        while max_quality - min_quality > 5:
-            img_byte_arr.seek(0)
-            img_byte_arr.truncate(0)
-            img.save(img_byte_arr, format="JPEG", quality=quality)
-
-            # 获取当前图片大小
-            current_size = img_byte_arr.tell()
-
-            # 根据当前大小调整压缩质量
-            if current_size > max_size:
-                # 如果太大，降低质量
-                max_quality = quality
-                quality = (min_quality + quality) // 2
-            elif current_size < max_size:
-                # 如果太小，可以尝试提高质量
-                min_quality = quality
-                quality = (max_quality + quality) // 2
-            else:
-                # 恰好等于目标大小，退出循环
-                break
-
-        # 最终保存并返回图片数据
-        img_byte_arr.seek(0)
-        img_byte_arr.truncate(0)
-        img.save(img_byte_arr, format="JPEG", quality=quality)
-
-        return img_byte_arr.getvalue()
-
-
-def upload_img(token: str, snowFlakeId: str, userId: str, count: int) -> str:
+    global _size_correction
+
+    _, max_dim, max_q, _ = processing_params()
+    min_q = 5
+
+    with Image.open(image_path) as src:
+        if str(src.format or "").upper() == "JPEG" and max(src.size) > max_dim:
+            # 以 1/2、1/4、1/8 的比例直接解码，避免完整解码超大照片；
+            # 长边允许略低于上限（如 4032 -> 2016），省去一次整图缩放
+            ratio = max_dim * 0.75 / max(src.size)
+            src.draft("RGB", (int(src.size[0] * ratio), int(src.size[1] * ratio)))
+        img = src.convert("RGB") if src.mode not in ("RGB", "L") else src.copy()
+
+    if max(img.size) > max_dim:
+        img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+
+    model = _fit_size_model(img)
+    with _size_correction_lock:
+        correction = _size_correction
+
+    quality, scale = _plan_encode(model, img.size[0] * img.size[1], correction, MAX_IMAGE_BYTES * 0.92, min_q, max_q)
+    encoded = _resized(img, scale)
+    data = _encode_jpeg(encoded, quality)
+
+    pixels = encoded.size[0] * encoded.size[1]
+    predicted = _predict_size(model, quality, pixels, 1.0)
+    if predicted > _JPEG_OVERHEAD:
+        observed = (len(data) - _JPEG_OVERHEAD) / (predicted - _JPEG_OVERHEAD)
+        with _size_correction_lock:
+            _size_correction = 0.8 * _size_correction + 0.2 * max(0.3, min(observed, 3.0))
+        correction = max(0.3, observed)
+
+    if len(data) > MAX_IMAGE_BYTES:
+        # 唯一一次修正：用本次实测的修正系数重新预测质量和缩放比例，留出更大余量
+        quality2, scale2 = _plan_encode(model, pixels, correction, MAX_IMAGE_BYTES * 0.85, min_q, max_q)
+        if scale2 >= 1.0:
+            quality2 = min(quality - 1, quality2)
+        data = _encode_jpeg(_resized(encoded, scale2), max(min_q, quality2))
+
+    return data
+
+
+def _list_images(images_dir: str) -> List[str]:
+    """列出目录中的图片，目录未变化时直接复用上次的结果。"""
+    global _LISTING_CACHE
+    mtime = os.stat(images_dir).st_mtime_ns
+    with _LISTING_LOCK:
+        cached = _LISTING_CACHE
+        if cached is not None and cached[0] == images_dir and cached[1] == mtime:
+            return cached[2]
+
+    all_images = [
+        os.path.join(images_dir, f) for f in os.listdir(images_dir)
+        if f.lower().endswith((".png", ".jpg", ".jpeg"))
+    ]
+    with _LISTING_LOCK:
+        _LISTING_CACHE = (images_dir, mtime, all_images)
+    return all_images
+
+
+def upload_img(token: str, snowFlakeId: str, userId: str, count: int, phone: Optional[str] = None) -> str:
     """上传指定数量的处理后图片
 
+    优先从图片库按 用户 -> 组织 -> 全局 抽取预处理好的图片，都不足时回退到 server/images 目录。
+
     Args:
         token (str): 上传令牌。
         snowFlakeId (str): 组织ID。
         userId (str): 用户ID。
         count (int): 需要上传的图片数量。
+        phone (Optional[str]): 账号手机号，用于查找用户专属图片。
 
     Returns:
         str: 上传成功的图片链接。
@@ -81,6 +223,14 @@ def upload_img(token: str, snowFlakeId: str, userId: str, count: int) -> str:
     if count < 1:
         return ""
 
+    try:
+        library_images = image_library.sample_for_user(phone, snowFlakeId, count)
+    except Exception as e:
+        logger.warning(f"读取图片库失败: {e}")
+        library_images = None
+    if library_images:
+        return upload(token, snowFlakeId, userId, library_images)
+
     # 获取图片文件夹路径
     # 使用abspath确保路径正确
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -90,10 +240,7 @@ def upload_img(token: str, snowFlakeId: str, userId: str, count: int) -> str:
         return ""
 
     # 获取所有符合条件的图片文件路径
-    all_images = [
-        os.path.join(images_dir, f) for f in os.listdir(images_dir)
-        if f.lower().endswith((".png", ".jpg", ".jpeg"))
-    ]
+    all_images = _list_images(images_dir)
 
     # 如果图片数量不够，直接返回空 (或者上传所有可用的?)
     # 原逻辑是直接返回空，保持原样
@@ -107,10 +254,10 @@ def upload_img(token: str, snowFlakeId: str, userId: str, count: int) -> str:
     processed_images = []
     for img_path in selected_images:
         try:
-            processed_images.append(process_image(img_path))
+            processed_images.append(ProcessedImageCache.get_or_process(img_path, process_image, processing_params()))
         except Exception as e:
-            # 记录日志或忽略坏图
-            print(f"处理图片失败 {img_path}: {e}") # 这里应该用logger，但这个文件没有logger
+            # 记录日志并忽略坏图
+            logger.warning(f"处理图片失败 {img_path}: {e}")
             continue
             
     if not processed_images:
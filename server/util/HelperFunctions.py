@@ -124,6 +124,16 @@ def strip_markdown(text: str) -> str:
     if not text:
         return ""
 
+    text = _strip_markdown_marks(text)
+
+    # 16. 多空白行合并
+    text = re.sub(r"\n\s*\n", "\n\n", text)
+
+    return text.strip()
+
+
+def _strip_markdown_marks(text: str) -> str:
+    """strip_markdown 的第 1~15 步：只移除标记，不合并空行、不去除首尾空白。"""
     # 1. 移除注释
     text = re.sub(r"<!--.*?-->", "", text, flags=re.DOTALL)
 
@@ -177,7 +187,123 @@ def strip_markdown(text: str) -> str:
     # 15. 移除行内HTML标签
     text = re.sub(r"</?[^>]+>", "", text)
 
-    # 16. 多空白行合并
-    text = re.sub(r"\n\s*\n", "\n\n", text)
-    
-    return text.strip()
+    return text
+
+
+class MarkdownStreamStripper:
+    """
+    增量版 strip_markdown，用于流式输出。
+
+    完整的行交给 strip_markdown 的同一套规则处理；尚未结束的行只输出第一个可能开启行内标记的
+    字符之前的部分，且要等行首能判断是否为标题、列表等标记后才输出。代码块和注释缓冲到闭合后统一处理。
+    空行合并与首尾空白去除在输出时增量完成，拼接所有输出即可得到与 strip_markdown 基本一致的结果。
+    """
+
+    # 可能开启行内标记（代码、强调、删除线、链接、图片、HTML、注释）的字符
+    _INLINE_START = re.compile(r"[`*_~\[!<]")
+    # 仅由这些字符组成时，还无法判断行首是否为标题 / 列表 / 引用 / 表格分隔 / 分割线
+    _LINE_PREFIX = re.compile(r"[\s#\d.\-*+>|:_]*")
+
+    def __init__(self):
+        self._block = ""        # 未闭合的代码块或注释
+        self._line = ""         # 当前未结束的行
+        self._line_clean = ""   # 当前行已输出部分（过滤后）
+        self._started = False   # 是否已输出过非空白内容
+        self._newlines = 0      # 上一段内容之后累计的换行数
+        self._spaces = ""       # 上一段内容的行尾空白
+        self._indent = ""       # 新行的行首空白（该行可能是空行）
+
+    @staticmethod
+    def _is_open_block(text: str) -> bool:
+        return text.count("```") % 2 == 1 or text.rfind("<!--") > text.rfind("-->")
+
+    def _write(self, piece: str) -> str:
+        if not piece:
+            return ""
+        if not piece.strip():
+            if self._started:
+                if self._newlines:
+                    self._indent += piece
+                else:
+                    self._spaces += piece
+            return ""
+
+        core = piece.rstrip()
+        if not self._started:
+            out = core.lstrip()
+            self._started = True
+        else:
+            out = self._spaces + "\n" * min(self._newlines, 2) + self._indent + core
+        self._spaces = piece[len(core):]
+        self._newlines = 0
+        self._indent = ""
+        return out
+
+    def _newline(self) -> None:
+        if self._started:
+            self._newlines += 1
+            self._indent = ""
+
+    def _emit_clean(self, clean: str, line_end: bool) -> str:
+        # clean 可能包含多行（代码块），首行扣除已输出的部分
+        lines = clean.split("\n")
+        done = self._line_clean
+        first = lines[0]
+        out = [self._write(first[len(done):] if first.startswith(done) else first)]
+        for line in lines[1:]:
+            self._newline()
+            out.append(self._write(line))
+        if line_end:
+            self._newline()
+        self._line_clean = ""
+        return "".join(out)
+
+    def _emit_partial(self) -> str:
+        if self._block or not self._line:
+            return ""
+        m = self._INLINE_START.search(self._line)
+        safe = self._line[:m.start()] if m else self._line
+        if self._LINE_PREFIX.fullmatch(safe):
+            return ""
+        clean = _strip_markdown_marks(safe)
+        if not clean.startswith(self._line_clean):
+            return ""
+        piece = clean[len(self._line_clean):]
+        self._line_clean = clean
+        return self._write(piece)
+
+    def feed(self, chunk: str) -> str:
+        """
+        输入一段原始文本，返回可以立即输出的过滤后文本（可能为空）。
+        """
+        if not chunk:
+            return ""
+        self._line += chunk
+        out = []
+        while "\n" in self._line:
+            line, self._line = self._line.split("\n", 1)
+            if self._block:
+                self._block += "\n" + line
+            elif self._is_open_block(line):
+                self._block = line
+            else:
+                out.append(self._emit_clean(_strip_markdown_marks(line), True))
+                continue
+            if not self._is_open_block(self._block):
+                out.append(self._emit_clean(_strip_markdown_marks(self._block), True))
+                self._block = ""
+        out.append(self._emit_partial())
+        return "".join(out)
+
+    def finish(self) -> str:
+        """
+        输入结束，输出剩余内容（未闭合的代码块按原规则处理）。
+        """
+        rest = self._line
+        if self._block:
+            rest = self._block + "\n" + rest
+        self._block = ""
+        self._line = ""
+        if not rest:
+            return ""
+        return self._emit_clean(_strip_markdown_marks(rest), False)
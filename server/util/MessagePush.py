@@ -1,7 +1,12 @@
+import hashlib
+import json
 import logging
+import os
 import random
 import threading
-from typing import Dict, List, Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 from collections import Counter
 import smtplib
 from email.mime.text import MIMEText
@@ -10,6 +15,7 @@ from email.header import Header
 from email.utils import formataddr
 
 import requests
+from requests.adapters import HTTPAdapter
 
 # 尝试导入主模块的日志上下文，失败则创建本地版本
 try:
@@ -19,6 +25,182 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_TYPES = ("Server", "PushPlus", "AnPush", "WxPusher", "SMTP")
+
+# 邮件需要建立 TLS 连接并登录，默认给更长的超时
+_MIN_TIMEOUTS = {"SMTP": 20.0}
+
+
+class UnsupportedPushChannel(ValueError):
+    """推送渠道类型不支持或配置不完整。"""
+
+
+def channel_timeout(service_type: str) -> float:
+    """
+    读取推送渠道的超时时间（秒）。
+
+    默认值为 NOTIFY_TIMEOUT_SECONDS（10 秒），SMTP 不少于 20 秒，
+    可通过 NOTIFY_CHANNEL_TIMEOUTS 按渠道覆盖，例如 {"SMTP": 30, "WxPusher": 5}。
+    """
+    try:
+        timeout = float(os.getenv("NOTIFY_TIMEOUT_SECONDS") or "10")
+    except Exception:
+        timeout = 10.0
+    timeout = max(timeout, _MIN_TIMEOUTS.get(service_type, 0.0))
+    try:
+        overrides = json.loads(os.getenv("NOTIFY_CHANNEL_TIMEOUTS") or "{}")
+        if service_type in overrides:
+            timeout = float(overrides[service_type])
+    except Exception:
+        pass
+    return max(1.0, min(timeout, 300.0))
+
+
+# 各渠道决定消息发往何处的配置项，用于汇总推送时合并同一目的地的消息
+_DESTINATION_FIELDS = {
+    "Server": ("sendKey",),
+    "PushPlus": ("token",),
+    "AnPush": ("token", "channel", "to"),
+    "WxPusher": ("spt",),
+    "SMTP": ("host", "port", "username", "to"),
+}
+
+
+def destination_key(service_config: Dict[str, Any]) -> str:
+    """推送目的地的哈希：渠道类型加上 token/uid/收件地址等字段。"""
+    service_type = str(service_config.get("type") or "")
+    fields = [str(service_config.get(name) or "").strip() for name in _DESTINATION_FIELDS.get(service_type, ())]
+    raw = json.dumps([service_type, fields], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+_http_session: Optional[requests.Session] = None
+_fanout_executor: Optional[ThreadPoolExecutor] = None
+_shared_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int, lo: int, hi: int) -> int:
+    try:
+        value = int(os.getenv(name) or str(default))
+    except Exception:
+        value = default
+    return max(lo, min(value, hi))
+
+
+def _get_http_session() -> requests.Session:
+    """各推送渠道共用的 HTTP 会话，复用到同一服务的 TLS 连接。"""
+    global _http_session
+    with _shared_lock:
+        if _http_session is None:
+            size = _env_int("NOTIFY_HTTP_POOL_SIZE", 16, 1, 100)
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=size))
+            session.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=size))
+            _http_session = session
+        return _http_session
+
+
+def _get_fanout_executor() -> ThreadPoolExecutor:
+    global _fanout_executor
+    with _shared_lock:
+        if _fanout_executor is None:
+            workers = _env_int("NOTIFY_FANOUT_WORKERS", 8, 1, 64)
+            _fanout_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="push")
+        return _fanout_executor
+
+
+class _SmtpPool:
+    """
+    按 (host, port, username) 缓存已登录的 SMTP 连接。
+
+    连接空闲超过 SMTP_IDLE_SECONDS（默认 60 秒）后关闭；取用前先 NOOP 确认连接仍可用。
+    同一时刻一个连接只借给一个线程，并发发送时各自新建连接，归还时每个键最多保留 SMTP_POOL_PER_KEY 个。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle: Dict[Tuple[str, int, str], List[Tuple[smtplib.SMTP_SSL, float]]] = {}
+
+    @staticmethod
+    def _idle_seconds() -> int:
+        return _env_int("SMTP_IDLE_SECONDS", 60, 0, 3600)
+
+    @staticmethod
+    def _close(conn: smtplib.SMTP_SSL) -> None:
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _sweep_locked(self, now: float) -> List[smtplib.SMTP_SSL]:
+        expired = []
+        for key in list(self.idle):
+            alive = []
+            for conn, last_used in self.idle[key]:
+                if now - last_used > self._idle_seconds():
+                    expired.append(conn)
+                else:
+                    alive.append((conn, last_used))
+            if alive:
+                self.idle[key] = alive
+            else:
+                self.idle.pop(key, None)
+        return expired
+
+    def acquire(self, config: Dict[str, Any], timeout: float) -> Tuple[smtplib.SMTP_SSL, bool]:
+        """
+        取一个已登录的连接。
+
+        Returns:
+            Tuple[smtplib.SMTP_SSL, bool]: (连接, 是否为复用的旧连接)。
+        """
+        key = (str(config["host"]), int(config["port"]), str(config["username"]))
+        while True:
+            with self.lock:
+                expired = self._sweep_locked(time.monotonic())
+                conns = self.idle.get(key)
+                conn = conns.pop()[0] if conns else None
+            for old in expired:
+                self._close(old)
+            if conn is None:
+                break
+            try:
+                conn.sock.settimeout(timeout)
+                if conn.noop()[0] == 250:
+                    return conn, True
+            except Exception:
+                pass
+            self._close(conn)
+
+        conn = smtplib.SMTP_SSL(key[0], key[1], timeout=timeout)
+        try:
+            conn.login(config["username"], config["password"])
+        except Exception:
+            self._close(conn)
+            raise
+        return conn, False
+
+    def release(self, config: Dict[str, Any], conn: smtplib.SMTP_SSL) -> None:
+        key = (str(config["host"]), int(config["port"]), str(config["username"]))
+        if self._idle_seconds() <= 0:
+            self._close(conn)
+            return
+        with self.lock:
+            conns = self.idle.setdefault(key, [])
+            if len(conns) < _env_int("SMTP_POOL_PER_KEY", 2, 1, 16):
+                conns.append((conn, time.monotonic()))
+                return
+        self._close(conn)
+
+    def discard(self, conn: smtplib.SMTP_SSL) -> None:
+        self._close(conn)
+
+
+_smtp_pool = _SmtpPool()
+
 
 class MessagePusher:
     STATUS_EMOJIS = {"success": "✅", "fail": "❌", "skip": "⏭️", "unknown": "❓"}
@@ -42,77 +224,139 @@ class MessagePusher:
         Returns:
             bool: 是否推送成功。
         """
-        skip_count = sum(1 for result in results
-                         if result.get("status") == "skip")
-        if skip_count == len(results):
+        if not self.should_push(results):
             logger.info("所有任务都被跳过，不发送推送消息")
             return
 
+        title = self.build_title(results)
+        channels = [c for c in self.push_config if c.get("enabled", False)]
+        if len(channels) <= 1:
+            for service_config in channels:
+                self._send_logged(service_config, title, results)
+            return
+
+        # 多个渠道并发发送，总耗时约等于最慢的渠道
+        log_tag = getattr(_log_ctx, "tag", "-")
+        executor = _get_fanout_executor()
+        futures = [
+            executor.submit(self._send_logged, service_config, title, results, log_tag)
+            for service_config in channels
+        ]
+        for future in futures:
+            future.result()
+
+    def _send_logged(self,
+                     service_config: Dict[str, Any],
+                     title: str,
+                     results: List[Dict[str, Any]],
+                     log_tag: Optional[str] = None) -> None:
+        if log_tag is not None:
+            _log_ctx.tag = log_tag
+        service_type = service_config.get("type")
+        try:
+            self.send(service_config, title, results)
+        except Exception as e:
+            logger.error(f"{service_type} 消息推送失败: {str(e)}")
+        finally:
+            if log_tag is not None:
+                _log_ctx.tag = "-"
+
+    @staticmethod
+    def should_push(results: List[Dict[str, Any]]) -> bool:
+        """所有任务都被跳过时不推送。"""
+        skip_count = sum(1 for result in results
+                         if result.get("status") == "skip")
+        return skip_count != len(results)
+
+    @staticmethod
+    def build_title(results: List[Dict[str, Any]]) -> str:
         success_count = sum(r.get("status") == "success" for r in results)
         status_emoji = "🎉" if success_count == len(results) else "📊"
-        title = f"{status_emoji} 工学云报告 ({success_count}/{len(results)})"
-
-        for service_config in self.push_config:
-            if service_config.get("enabled", False):
-                service_type = service_config["type"]
-                try:
-                    if service_type == "Server":
-                        content = self._generate_markdown_message(results)
-                        self._server_push(service_config, title, content)
-                    elif service_type == "PushPlus":
-                        content = self._generate_html_message(results)
-                        self._pushplus_push(service_config, title, content)
-                    elif service_type == "AnPush":
-                        content = self._generate_markdown_message(results)
-                        self._anpush_push(service_config, title, content)
-                    elif service_type == "WxPusher":
-                        content = self._generate_html_message(results)
-                        self._wxpusher_push(service_config, title, content)
-                    elif service_type == "SMTP":
-                        content = self._generate_html_message(results)
-                        self._smtp_push(service_config, title, content)
-                    else:
-                        logger.warning(f"不支持的推送服务类型: {service_type}")
-
-                except Exception as e:
-                    logger.error(f"{service_type} 消息推送失败: {str(e)}")
-                    continue
-
-    def _server_push(self, config: dict[str, Any], title: str, content: str):
+        return f"{status_emoji} 工学云报告 ({success_count}/{len(results)})"
+
+    @staticmethod
+    def build_digest_title(results: List[Dict[str, Any]], accounts: int) -> str:
+        success_count = sum(r.get("status") == "success" for r in results)
+        status_emoji = "🎉" if success_count == len(results) else "📊"
+        return f"{status_emoji} 工学云汇总报告（{accounts} 个账号，{success_count}/{len(results)}）"
+
+    def send(self,
+             service_config: Dict[str, Any],
+             title: str,
+             results: List[Dict[str, Any]],
+             timeout: Optional[float] = None) -> None:
+        """
+        通过单个推送渠道发送消息，失败时抛出异常。
+
+        Args:
+            service_config (Dict[str, Any]): 渠道配置。
+            title (str): 标题。
+            results (List[Dict[str, Any]]): 任务执行结果列表。
+            timeout (Optional[float]): 超时时间（秒），默认见 channel_timeout。
+
+        Raises:
+            UnsupportedPushChannel: 渠道类型不支持或配置缺少必填项，重试无意义。
+            Exception: 推送失败。
+        """
+        service_type = service_config.get("type")
+        if service_type not in SUPPORTED_TYPES:
+            raise UnsupportedPushChannel(f"不支持的推送服务类型: {service_type}")
+        if timeout is None:
+            timeout = channel_timeout(service_type)
+
+        if service_type in ("Server", "AnPush"):
+            content = self._generate_markdown_message(results)
+        else:
+            content = self._generate_html_message(results)
+        handler = {
+            "Server": self._server_push,
+            "PushPlus": self._pushplus_push,
+            "AnPush": self._anpush_push,
+            "WxPusher": self._wxpusher_push,
+            "SMTP": self._smtp_push,
+        }[service_type]
+        try:
+            handler(service_config, title, content, timeout)
+        except KeyError as e:
+            raise UnsupportedPushChannel(f"{service_type} 配置缺少 {e}")
+
+    def _server_push(self, config: dict[str, Any], title: str, content: str, timeout: float = 10):
         """Server酱 推送
 
         Args:
             config (dict[str, Any]): 配置
             title (str): 标题
             content (str): 内容
+            timeout (float): 超时时间（秒）
         """
         url = f'https://sctapi.ftqq.com/{config["sendKey"]}.send'
         data = {"title": title, "desp": content}
 
-        rsp = requests.post(url, data=data).json()
+        rsp = _get_http_session().post(url, data=data, timeout=timeout).json()
         if rsp.get("code") == 0:
             logger.info("Server酱推送成功")
         else:
             raise Exception(rsp.get("message"))
 
-    def _pushplus_push(self, config: dict[str, Any], title: str, content: str):
+    def _pushplus_push(self, config: dict[str, Any], title: str, content: str, timeout: float = 10):
         """PushPlus 推送
 
         Args:
             config (dict[str, Any]): 配置
             title (str): 标题
             content (str): 内容
+            timeout (float): 超时时间（秒）
         """
         url = f'https://www.pushplus.plus/send/{config["token"]}'
         data = {"title": title, "content": content}
 
-        rsp = requests.post(url, data=data).json()
+        rsp = _get_http_session().post(url, data=data, timeout=timeout).json()
         if rsp.get("code") == 200:
             logger.info("PushPlus推送成功")
         else:
             raise Exception(rsp.get("msg"))
 
-    def _anpush_push(self, config: dict[str, Any], title: str, content: str):
+    def _anpush_push(self, config: dict[str, Any], title: str, content: str, timeout: float = 10):
         """
         AnPush 推送
 
@@ -120,6 +364,7 @@ class MessagePusher:
             config (dict[str, Any]): 配置
             title (str): 标题
             content (str): 内容
+            timeout (float): 超时时间（秒）
         """
         url = f'https://api.anpush.com/push/{config["token"]}'
         data = {
@@ -129,13 +374,13 @@ class MessagePusher:
             "to": config["to"],
         }
 
-        rsp = requests.post(url, data=data).json()
+        rsp = _get_http_session().post(url, data=data, timeout=timeout).json()
         if rsp.get("code") == 200:
             logger.info("AnPush推送成功")
         else:
             raise Exception(rsp.get("msg"))
 
-    def _wxpusher_push(self, config: dict[str, Any], title: str, content: str):
+    def _wxpusher_push(self, config: dict[str, Any], title: str, content: str, timeout: float = 10):
         """
         使用 WxPusher 进行推送。
 
@@ -143,6 +388,7 @@ class MessagePusher:
             config (dict[str, Any]): 配置信息。
             title (str): 推送的标题。
             content (str): 推送的内容。
+            timeout (float): 超时时间（秒）。
         """
         url = f"https://wxpusher.zjiecode.com/api/send/message/simple-push"
         data = {
@@ -152,13 +398,13 @@ class MessagePusher:
             "spt": config["spt"],
         }
 
-        rsp = requests.post(url, json=data).json()
+        rsp = _get_http_session().post(url, json=data, timeout=timeout).json()
         if rsp.get("code") == 1000:
             logger.info("WxPusher推送成功")
         else:
             raise Exception(rsp.get("msg"))
 
-    def _smtp_push(self, config: dict[str, Any], title: str, content: str):
+    def _smtp_push(self, config: dict[str, Any], title: str, content: str, timeout: float = 10):
         """
         SMTP 邮件推送。
 
@@ -166,6 +412,7 @@ class MessagePusher:
             config (dict[str, Any]): 配置。
             title (str): 标题。
             content (str): 内容。
+            timeout (float): 超时时间（秒）。
         """
         msg = MIMEMultipart()
         msg["From"] = formataddr(
@@ -176,11 +423,25 @@ class MessagePusher:
         # 添加邮件内容
         msg.attach(MIMEText(content, "html", "utf-8"))
 
-        with smtplib.SMTP_SSL(config["host"], config["port"]) as server:
-            server.login(config["username"], config["password"])
+        server, reused = _smtp_pool.acquire(config, timeout)
+        try:
             server.send_message(msg)
-            logger.info(f"邮件已发送成功")
-            server.quit()
+        except smtplib.SMTPServerDisconnected:
+            _smtp_pool.discard(server)
+            if not reused:
+                raise
+            # 复用的连接可能已被服务器关闭，换新连接重发一次
+            server, _ = _smtp_pool.acquire(config, timeout)
+            try:
+                server.send_message(msg)
+            except Exception:
+                _smtp_pool.discard(server)
+                raise
+        except Exception:
+            _smtp_pool.discard(server)
+            raise
+        _smtp_pool.release(config, server)
+        logger.info(f"邮件已发送成功")
 
     @staticmethod
     def _generate_markdown_message(results: List[Dict[str, Any]]) -> str:
@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv(
+    "UPLOAD_IMAGE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "images"),
+)
+
+_MEMORY: "OrderedDict[Tuple[Any, ...], bytes]" = OrderedDict()
+_MEMORY_BYTES = 0
+_LOCK = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name) or str(default))
+    except Exception:
+        return default
+
+
+def is_enabled() -> bool:
+    return (os.getenv("UPLOAD_IMAGE_CACHE") or "1").strip().lower() not in ["0", "false", "no", "off"]
+
+
+def _memory_limit() -> int:
+    return max(0, _env_int("UPLOAD_IMAGE_CACHE_MB", 64)) * 1024 * 1024
+
+
+def _disk_limit() -> int:
+    return max(0, _env_int("UPLOAD_IMAGE_CACHE_DISK_MB", 512)) * 1024 * 1024
+
+
+def cache_key(path: str, params: Tuple[Any, ...] = ()) -> Tuple[Any, ...]:
+    """
+    生成缓存键：(绝对路径, mtime_ns, 文件大小, *处理参数)。
+
+    源文件被替换或修改后自动失效；处理参数（含处理器版本号）变化后同样失效，
+    避免继续使用旧参数或旧编码逻辑生成的图片。
+
+    Args:
+        path (str): 源图片路径。
+        params (Tuple[Any, ...]): 影响处理结果的参数，见 FileUploader.processing_params。
+
+    Returns:
+        Tuple[Any, ...]: 缓存键。
+    """
+    st = os.stat(path)
+    return (os.path.abspath(path), int(st.st_mtime_ns), int(st.st_size), *params)
+
+
+def _disk_path(key: Tuple[Any, ...]) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in key).encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{digest}.jpg")
+
+
+def _memory_get(key: Tuple[Any, ...]) -> Optional[bytes]:
+    with _LOCK:
+        data = _MEMORY.get(key)
+        if data is not None:
+            _MEMORY.move_to_end(key)
+        return data
+
+
+def _memory_put(key: Tuple[Any, ...], data: bytes) -> None:
+    global _MEMORY_BYTES
+    limit = _memory_limit()
+    if len(data) > limit:
+        return
+    with _LOCK:
+        old = _MEMORY.pop(key, None)
+        if old is not None:
+            _MEMORY_BYTES -= len(old)
+        _MEMORY[key] = data
+        _MEMORY_BYTES += len(data)
+        while _MEMORY_BYTES > limit and _MEMORY:
+            _, evicted = _MEMORY.popitem(last=False)
+            _MEMORY_BYTES -= len(evicted)
+
+
+def _disk_get(key: Tuple[Any, ...]) -> Optional[bytes]:
+    path = _disk_path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+        return data
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"读取图片缓存失败: {e}")
+        return None
+
+
+def _disk_put(key: Tuple[Any, ...], data: bytes) -> None:
+    if _disk_limit() <= 0:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _disk_path(key)
+    # 临时文件名唯一，多个进程同时写同一个键也不会互相覆盖
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix=".tmp", delete=False) as f:
+        f.write(data)
+        tmp = f.name
+    try:
+        os.replace(tmp, path)
+    except Exception:
+        os.remove(tmp)
+        raise
+    _evict_disk()
+
+
+def _evict_disk() -> None:
+    limit = _disk_limit()
+    entries: List[Tuple[float, int, str]] = []
+    total = 0
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        if not name.endswith(".jpg"):
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+    if total <= limit:
+        return
+    entries.sort()
+    for _, size, path in entries:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def get_or_process(path: str, processor: Callable[[str], bytes], params: Tuple[Any, ...] = ()) -> bytes:
+    """
+    获取处理后的图片数据，依次查询内存缓存、磁盘缓存，都未命中时调用 processor 处理并回写。
+
+    Args:
+        path (str): 源图片路径。
+        processor (Callable[[str], bytes]): 图片处理函数。
+        params (Tuple[Any, ...]): 影响处理结果的参数，参与缓存键。
+
+    Returns:
+        bytes: 处理后的 JPEG 数据。
+    """
+    if not is_enabled():
+        return processor(path)
+
+    key = cache_key(path, params)
+    data = _memory_get(key)
+    if data is not None:
+        return data
+
+    data = _disk_get(key)
+    if data is not None:
+        _memory_put(key, data)
+        return data
+
+    data = processor(path)
+    _memory_put(key, data)
+    try:
+        _disk_put(key, data)
+    except Exception as e:
+        logger.warning(f"写入图片缓存失败: {e}")
+    return data
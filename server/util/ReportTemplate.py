@@ -0,0 +1,210 @@
+import hashlib
+import logging
+import os
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("ai", "ai_first", "template")
+
+MAX_CHARS = 1000
+
+# 各段落的短语库，占位符：{period} 今天/本周/本月，{company} 公司名，{industry} 行业，{duty} 岗位职责条目
+_OPENINGS = [
+    "{period}按照岗位安排，在{company}继续开展实习工作。",
+    "{period}的实习工作围绕岗位职责有序展开，整体节奏比较紧凑。",
+    "{period}在带教老师的指导下，完成了分配给自己的各项任务。",
+    "{period}主要跟随部门同事参与日常工作，逐步熟悉了业务流程。",
+    "{period}的工作以{duty}为主，同时配合团队处理了一些临时事务。",
+]
+
+_DUTY_SENTENCES = [
+    "在{duty}方面，我先梳理了相关资料和流程，再按要求逐项完成。",
+    "结合岗位要求，我重点参与了{duty}，做到了按时按质完成。",
+    "负责{duty}时，我注意和同事保持沟通，及时反馈进度和问题。",
+    "围绕{duty}，我认真学习了相关规范，并在实际操作中加以运用。",
+    "针对{duty}，我整理了工作记录，方便后续查阅和总结。",
+    "在处理{duty}的过程中，我对岗位的工作内容有了更具体的认识。",
+]
+
+_WORK_FILLERS = [
+    "此外还参加了部门例会，了解了近期的工作重点和分工安排。",
+    "工作之余，我整理了实习笔记，把遇到的知识点及时记录下来。",
+    "同时协助同事完成了资料整理和数据核对等基础工作。",
+    "在工作中严格遵守公司的各项规章制度，按时到岗，认真负责。",
+    "对于不熟悉的环节，我主动向带教老师请教，尽量少走弯路。",
+    "我还学习了{industry}相关的基础知识，加深了对行业的了解。",
+]
+
+_SUMMARIES = [
+    "通过{period}的实习，我对{company}的业务和岗位要求有了更深入的理解。",
+    "{period}的工作让我认识到理论知识与实际工作之间的差距，也明确了努力方向。",
+    "总体来看，{period}的任务完成情况良好，工作效率比之前有所提高。",
+    "在实践中，我逐步掌握了岗位的基本工作方法，动手能力得到锻炼。",
+    "我体会到细致和耐心在工作中的重要性，做事也更加有条理。",
+    "与同事的协作让我认识到团队配合的重要性，沟通能力也有所提升。",
+]
+
+_PROBLEMS = [
+    "部分业务流程还不够熟悉，处理问题时速度偏慢，需要多花时间学习。",
+    "遇到专业性较强的问题时，自己的知识储备还不够，需要向同事请教。",
+    "工作任务较多时，时间安排不够合理，个别事项完成得比较仓促。",
+    "对{industry}的了解还停留在表面，缺少系统的认识。",
+    "在与同事沟通时，有时表达不够准确，导致需要反复确认。",
+    "实际操作中偶尔出现细节上的疏漏，需要进一步提高严谨性。",
+]
+
+_SOLUTIONS = [
+    "针对这些问题，我计划利用空余时间系统学习相关知识，并多做记录和复盘。",
+    "接下来我会提前规划工作内容，合理安排时间，提高工作效率。",
+    "今后遇到问题会先思考再请教，逐步提升独立解决问题的能力。",
+    "我会在工作中多观察、多总结，把经验及时运用到后续工作中。",
+]
+
+_EVALUATIONS = [
+    "{period}我能够认真对待每一项工作，态度端正，服从安排。",
+    "我能较好地融入团队，与同事相处融洽，乐于接受意见和建议。",
+    "在工作中保持了积极主动的态度，遇到困难不退缩。",
+    "自身在专业能力和经验方面还有不足，但学习意愿强，进步明显。",
+    "今后我会继续保持认真负责的态度，努力把每一项工作做好。",
+    "希望在接下来的实习中继续积累经验，不断提高自己的综合素质。",
+]
+
+_DEFAULT_DUTIES = ["日常业务处理", "资料整理与归档", "协助团队完成工作任务"]
+
+
+def resolve_policy(ai_config: Any) -> str:
+    """
+    确定报告内容的生成策略。
+
+    用户配置 config.ai.mode 优先，其次为环境变量 REPORT_GENERATION_POLICY，默认 ai_first：
+        ai: 只用 AI，失败则报告提交失败。
+        ai_first: 优先 AI，超过 REPORT_AI_DEADLINE_SECONDS 或失败时改用模板。
+        template: 只用本地模板，不访问 AI。
+
+    Args:
+        ai_config (Any): 用户的 config.ai。
+
+    Returns:
+        str: 策略名称。
+    """
+    mode = ""
+    if isinstance(ai_config, dict):
+        mode = str(ai_config.get("mode") or "").strip().lower()
+    if mode not in POLICIES:
+        mode = (os.getenv("REPORT_GENERATION_POLICY") or "ai_first").strip().lower()
+    return mode if mode in POLICIES else "ai_first"
+
+
+def _period_word(title: str) -> str:
+    if "周" in (title or ""):
+        return "本周"
+    if "月" in (title or ""):
+        return "本月"
+    return "今天"
+
+
+def _extract_duties(text: Any) -> List[str]:
+    """把岗位职责拆成适合放进句子的短条目。"""
+    if not isinstance(text, str) or not text.strip():
+        return []
+    duties = []
+    for part in re.split(r"[\n；;。！!？?]+|\s{2,}", text):
+        part = re.sub(r"^\s*(?:\d+[.、．)）]|[（(]\d+[)）]|[一二三四五六七八九十]+、|[-*•·])\s*", "", part)
+        part = part.strip(" ，,、：:")
+        # 条目内仍有逗号时只取第一个分句
+        part = re.split(r"[，,]", part)[0].strip()
+        # 去掉开头的动词，避免与句式中的“负责”“参与”重复
+        part = re.sub(r"^(?:负责|参与|协助|配合|完成|从事|进行)", "", part).strip()
+        if 4 <= len(part) <= 30 and part not in duties:
+            duties.append(part)
+    return duties
+
+
+def _take(rng: random.Random, pool: List[str], used: set) -> Optional[str]:
+    choices = [p for p in pool if p not in used]
+    if not choices:
+        return None
+    phrase = rng.choice(choices)
+    used.add(phrase)
+    return phrase
+
+
+def generate_template_article(title: str, job_info: Dict[str, Any], count: Any = 500, seed: Optional[str] = None) -> str:
+    """
+    不依赖网络，用短语库按 实习地点/工作内容/工作总结/遇到问题/自我评价 模板拼出报告。
+
+    相同的标题和岗位信息得到相同的内容，便于失败重试；不同标题之间随机组合。
+
+    Args:
+        title (str): 报告标题，用于判断日报/周报/月报。
+        job_info (Dict[str, Any]): 岗位信息，使用 jobAddress、practiceCompanyEntity、quartersIntroduce。
+        count (Any): 字数下限，最多 1000。
+        seed (Optional[str]): 额外的随机种子，例如手机号。
+
+    Returns:
+        str: 报告内容。
+    """
+    job_info = job_info or {}
+    company_info = job_info.get("practiceCompanyEntity") or {}
+    company = str(company_info.get("companyName") or "").strip() or "实习单位"
+    industry = str(company_info.get("tradeValue") or "").strip() or "所在行业"
+    address = str(job_info.get("jobAddress") or "").strip() or company
+    try:
+        min_count = max(1, min(int(count), MAX_CHARS))
+    except Exception:
+        min_count = 500
+
+    digest = hashlib.sha256(f"{seed or ''}|{title}|{address}|{company}".encode("utf-8")).hexdigest()
+    rng = random.Random(int(digest[:16], 16))
+
+    duties = _extract_duties(job_info.get("quartersIntroduce")) or list(_DEFAULT_DUTIES)
+    rng.shuffle(duties)
+    fields = {"period": _period_word(title), "company": company, "industry": industry, "duty": duties[0]}
+
+    used: set = set()
+    sections: Dict[str, List[str]] = {"work": [], "summary": [], "problem": [], "evaluation": []}
+    sections["work"].append(_take(rng, _OPENINGS, used).format(**fields))
+    duty_pool = list(_DUTY_SENTENCES)
+    for duty in duties[:3]:
+        sentence = _take(rng, duty_pool, used)
+        if sentence:
+            sections["work"].append(sentence.format(**dict(fields, duty=duty)))
+    sections["summary"].append(_take(rng, _SUMMARIES, used).format(**fields))
+    sections["problem"].append(_take(rng, _PROBLEMS, used).format(**fields))
+    sections["problem"].append(_take(rng, _SOLUTIONS, used).format(**fields))
+    sections["evaluation"].append(_take(rng, _EVALUATIONS, used).format(**fields))
+
+    def render() -> str:
+        return (
+            f"实习地点：{address}\n\n"
+            f"工作内容：\n\n{''.join(sections['work'])}\n\n"
+            f"工作总结：\n\n{''.join(sections['summary'])}\n\n"
+            f"遇到问题：\n\n{''.join(sections['problem'])}\n\n"
+            f"自我评价：\n\n{''.join(sections['evaluation'])}"
+        )
+
+    # 轮流向各段追加短语直到满足字数下限，追加后超过上限的短语跳过
+    pools = [("work", _WORK_FILLERS), ("summary", _SUMMARIES), ("problem", _PROBLEMS), ("evaluation", _EVALUATIONS), ("work", duty_pool)]
+    content = render()
+    while len(content) < min_count:
+        added = False
+        for key, pool in pools:
+            phrase = _take(rng, pool, used)
+            if not phrase:
+                continue
+            duty = duties[len(sections["work"]) % len(duties)]
+            sections[key].append(phrase.format(**dict(fields, duty=duty)))
+            candidate = render()
+            if len(candidate) > MAX_CHARS:
+                sections[key].pop()
+                continue
+            content = candidate
+            added = True
+            if len(content) >= min_count:
+                break
+        if not added:
+            break
+    return content
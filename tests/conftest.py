@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# 必须在导入 server.database 之前设置，测试使用独立的临时数据库
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="automoguding-test-"), "test.db")
+
+
+@pytest.fixture(scope="session")
+def db():
+    import server.models  # noqa: F401
+    from server.database import create_db_and_tables, engine
+
+    create_db_and_tables()
+    return engine
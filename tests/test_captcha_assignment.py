@@ -0,0 +1,61 @@
+import itertools
+import random
+
+import numpy as np
+
+from server.util.CaptchaUtils import OCR_CHARSET, OCR_CHARSET_INDEX, _linear_sum_assignment, assign_words_to_boxes
+
+
+def _brute_force(cost: np.ndarray) -> float:
+    n, m = cost.shape
+    return min(sum(cost[i][cols[i]] for i in range(n)) for cols in itertools.permutations(range(m), n))
+
+
+def _total(cost: np.ndarray, assignment: list) -> float:
+    return sum(cost[i][j] for i, j in enumerate(assignment))
+
+
+def test_beats_greedy():
+    # 按行贪心：第 0 行取第 0 列（1），第 1 行只能取第 1 列（100），合计 101；最优为 2 + 2
+    cost = np.array([[1.0, 2.0], [2.0, 100.0]])
+    assert _linear_sum_assignment(cost) == [1, 0]
+
+
+def test_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(200):
+        n = rng.randint(1, 5)
+        m = rng.randint(n, 6)
+        cost = np.array([[rng.uniform(0, 10) for _ in range(m)] for _ in range(n)])
+        assignment = _linear_sum_assignment(cost)
+        assert len(set(assignment)) == n
+        assert all(0 <= j < m for j in assignment)
+        assert abs(_total(cost, assignment) - _brute_force(cost)) < 1e-9
+
+
+def _probs(*pairs):
+    vec = np.full(len(OCR_CHARSET), 1e-6)
+    for ch, p in pairs:
+        vec[OCR_CHARSET_INDEX[ch]] = p
+    return list(vec / vec.sum())
+
+
+def test_assign_words_uses_second_choice():
+    # 框 0 最像“天”，但“大”只可能在框 0；最大似然应把“天”让给框 1
+    boxes = [_probs(("天", 0.6), ("大", 0.4)), _probs(("天", 0.5), ("人", 0.5))]
+    assert assign_words_to_boxes(["大", "天"], boxes) == [0, 1]
+
+
+def test_assign_more_words_than_boxes():
+    boxes = [_probs(("天", 0.9)), _probs(("大", 0.9))]
+    assert assign_words_to_boxes(["大", "天", "山"], boxes) == [1, 0, -1]
+
+
+def test_assign_unknown_word_takes_remaining_box():
+    boxes = [_probs(("天", 0.9)), _probs(("大", 0.9))]
+    assert assign_words_to_boxes(["?", "天"], boxes) == [1, 0]
+
+
+def test_assign_empty():
+    assert assign_words_to_boxes(["天"], []) == [-1]
+    assert assign_words_to_boxes([], [_probs(("天", 0.9))]) == []
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from server import geocode_cache
+
+
+def _concurrent(n, fn):
+    results, errors = [], []
+    barrier = threading.Barrier(n)
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_concurrent_misses_fetch_once(db):
+    key = geocode_cache.make_key("search", "test", "北京　天安门")
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"items": [1]}
+
+    results, errors = _concurrent(8, lambda: geocode_cache.get_or_fetch(key, fetch, ttl_seconds=60))
+    assert not errors
+    assert len(calls) == 1
+    assert results == [{"items": [1]}] * 8
+
+    # 之后直接命中缓存；全角空格和大小写归一化后是同一个键
+    assert geocode_cache.make_key("search", "test", "北京 天安门") == key
+    assert geocode_cache.get_or_fetch(key, fetch, ttl_seconds=60) == {"items": [1]}
+    assert len(calls) == 1
+
+
+def test_concurrent_misses_share_error(db):
+    key = geocode_cache.make_key("search", "test", "error")
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        raise RuntimeError("upstream down")
+
+    results, errors = _concurrent(5, lambda: geocode_cache.get_or_fetch(key, fetch, ttl_seconds=60))
+    assert not results
+    assert len(calls) == 1
+    assert len(errors) == 5 and all(str(e) == "upstream down" for e in errors)
+
+    # 失败不写缓存，下次重新请求
+    with pytest.raises(RuntimeError):
+        geocode_cache.get_or_fetch(key, fetch, ttl_seconds=60)
+    assert len(calls) == 2
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from server.util import CaptchaUtils
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(CaptchaUtils, "MODEL_DIR", str(tmp_path))
+    monkeypatch.delenv("CAPTCHA_MODEL_VARIANT", raising=False)
+    monkeypatch.delenv("CAPTCHA_INT8_MODELS", raising=False)
+    return tmp_path
+
+
+def test_variant_filename():
+    assert CaptchaUtils.variant_filename("ocr.onnx", "fp32") == "ocr.onnx"
+    assert CaptchaUtils.variant_filename("ocr.onnx", "int8") == "ocr.int8.onnx"
+    assert CaptchaUtils.variant_filename("yolov5n.onnx", "int8") == "yolov5n.int8.onnx"
+
+
+def test_model_variant_env(monkeypatch):
+    monkeypatch.delenv("CAPTCHA_MODEL_VARIANT", raising=False)
+    monkeypatch.delenv("CAPTCHA_INT8_MODELS", raising=False)
+    assert CaptchaUtils._model_variant("ocr.onnx") == "fp32"
+
+    monkeypatch.setenv("CAPTCHA_MODEL_VARIANT", " INT8 ")
+    assert CaptchaUtils._model_variant("ocr.onnx") == "int8"
+
+    monkeypatch.setenv("CAPTCHA_MODEL_VARIANT", "fp16")
+    assert CaptchaUtils._model_variant("ocr.onnx") == "fp32"
+
+    monkeypatch.setenv("CAPTCHA_MODEL_VARIANT", "int8")
+    monkeypatch.setenv("CAPTCHA_INT8_MODELS", "ocr.onnx, ")
+    assert CaptchaUtils._model_variant("ocr.onnx") == "int8"
+    assert CaptchaUtils._model_variant("yolov5n.onnx") == "fp32"
+
+
+def test_get_model_path_prefers_existing_int8(model_dir, monkeypatch):
+    monkeypatch.setenv("CAPTCHA_MODEL_VARIANT", "int8")
+    (model_dir / "ocr.onnx").write_bytes(b"fp32")
+    (model_dir / "ocr.int8.onnx").write_bytes(b"int8")
+    assert CaptchaUtils.get_model_path("ocr.onnx") == os.path.join(str(model_dir), "ocr.int8.onnx")
+
+
+def test_get_model_path_falls_back_to_fp32(model_dir, monkeypatch):
+    monkeypatch.setenv("CAPTCHA_MODEL_VARIANT", "int8")
+    (model_dir / "yolov5n.onnx").write_bytes(b"fp32")
+    assert CaptchaUtils.get_model_path("yolov5n.onnx") == os.path.join(str(model_dir), "yolov5n.onnx")
+
+
+def test_ensure_model_exists_downloads_fp32_even_with_int8_present(model_dir, monkeypatch):
+    monkeypatch.setenv("CAPTCHA_MODEL_VARIANT", "int8")
+    (model_dir / "ocr.int8.onnx").write_bytes(b"int8")
+    urls = []
+
+    class _Resp:
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            yield b"fp32"
+
+    def fake_get(url, stream=False):
+        urls.append(url)
+        return _Resp()
+
+    monkeypatch.setattr(CaptchaUtils.requests, "get", fake_get)
+    CaptchaUtils.ensure_model_exists("ocr.onnx", "https://example.invalid/ocr.onnx")
+    assert urls == ["https://example.invalid/ocr.onnx"]
+    assert (model_dir / "ocr.onnx").read_bytes() == b"fp32"
+    assert (model_dir / "ocr.int8.onnx").read_bytes() == b"int8"
+
+    # 已存在时不再下载
+    CaptchaUtils.ensure_model_exists("ocr.onnx", "https://example.invalid/ocr.onnx")
+    assert len(urls) == 1
@@ -0,0 +1,85 @@
+import datetime
+
+from sqlmodel import Session
+
+from server import notification_outbox
+from server.models import NotificationOutbox
+
+
+def _row(session, key, label, results, due, **kwargs):
+    row = NotificationOutbox(
+        channel="Server",
+        channel_config="{}",
+        title="t",
+        results=results,
+        label=label,
+        digest_key=key,
+        next_attempt_at=due,
+        **kwargs,
+    )
+    session.add(row)
+    session.commit()
+    session.refresh(row)
+    return row
+
+
+def test_merge_digest(db):
+    now = datetime.datetime(2026, 1, 1, 12, 0)
+    past, future = now - datetime.timedelta(minutes=1), now + datetime.timedelta(minutes=5)
+    ok = [{"task_type": "打卡", "status": "success"}]
+    with Session(db) as session:
+        leader = _row(session, "k1", "张三", ok, past)
+        sibling = _row(session, "k1", "李四", [{"task_type": "日报", "status": "fail"}, {"task_type": "周报", "status": "skip"}], past)
+        not_due = _row(session, "k1", "王五", ok, future)
+        other_key = _row(session, "k2", "赵六", ok, past)
+        retried = _row(session, "k1", "钱七", ok, past, attempts=1)
+
+        notification_outbox._merge_digest(session, leader, now)
+        session.add(leader)
+        session.commit()
+
+        assert leader.digest_count == 2
+        assert [r["task_type"] for r in leader.results] == ["张三 · 打卡", "李四 · 日报"]
+        assert leader.title.startswith("📊") and "2 个账号" in leader.title
+        session.refresh(sibling)
+        assert sibling.status == "merged" and sibling.merged_into == leader.id
+        for row in (not_due, other_key, retried):
+            session.refresh(row)
+            assert row.status == "pending" and row.merged_into is None
+
+        # 已合并过的 leader 再并入新记录时不重复加账号前缀
+        late = _row(session, "k1", "孙八", ok, past)
+        notification_outbox._merge_digest(session, leader, now)
+        session.add(leader)
+        session.commit()
+        assert leader.digest_count == 3
+        assert [r["task_type"] for r in leader.results] == ["张三 · 打卡", "李四 · 日报", "孙八 · 打卡"]
+        session.refresh(late)
+        assert late.merged_into == leader.id
+
+
+def test_claim_is_exclusive(db):
+    now = datetime.datetime(2026, 1, 1, 12, 0)
+    with Session(db) as session:
+        row = _row(session, None, "张三", [], now)
+    with Session(db) as first, Session(db) as second:
+        assert notification_outbox._claim(first, row.id, now)
+        first.commit()
+        assert not notification_outbox._claim(second, row.id, now)
+        second.commit()
+    with Session(db) as session:
+        row = session.get(NotificationOutbox, row.id)
+        assert row.status == "sending" and row.claimed_at == now
+
+
+def test_recover_requeues_only_expired_claims(db):
+    now = datetime.datetime(2026, 1, 2, 12, 0)
+    with Session(db) as session:
+        stale_id = _row(session, None, "张三", [], now, status="sending", claimed_at=now - datetime.timedelta(hours=1)).id
+        fresh_id = _row(session, None, "李四", [], now, status="sending", claimed_at=now - datetime.timedelta(seconds=30)).id
+    notification_outbox._recover(now)
+    with Session(db) as session:
+        stale = session.get(NotificationOutbox, stale_id)
+        fresh = session.get(NotificationOutbox, fresh_id)
+        assert stale.status == "pending" and stale.claimed_at is None
+        assert fresh.status == "sending"
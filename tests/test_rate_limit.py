@@ -0,0 +1,52 @@
+from server import rate_limit
+
+
+def test_estimate_weights_previous_window():
+    assert rate_limit._estimate(10, 0, 100.0, 10) == 10
+    assert rate_limit._estimate(10, 2, 105.0, 10) == 7
+    assert rate_limit._estimate(10, 3, 109.0, 10) == 4
+
+
+def test_roll_same_window_is_noop():
+    bucket = [5, 2, 3, 0.0]
+    rate_limit._roll(bucket, 5)
+    assert bucket[:3] == [5, 2, 3]
+
+
+def test_roll_next_window_shifts_counts():
+    bucket = [5, 2, 3, 0.0]
+    rate_limit._roll(bucket, 6)
+    assert bucket[:3] == [6, 3, 0]
+
+
+def test_roll_after_gap_resets_counts():
+    bucket = [5, 2, 3, 0.0]
+    rate_limit._roll(bucket, 8)
+    assert bucket[:3] == [8, 0, 0]
+
+
+def test_memory_limit_and_rollover():
+    key = "test:rollover"
+    rate_limit._buckets.pop(key, None)
+    # 窗口 10 秒，窗口 [100, 110) 内最多 3 次
+    assert [rate_limit._hit_memory(key, 3, 10, 101.0) for _ in range(4)] == [True, True, True, False]
+    # 下一窗口刚开始：3 * 0.95 = 2.85，还能通过 1 次，之后 3.85 超限
+    assert rate_limit._hit_memory(key, 3, 10, 110.5) is True
+    assert rate_limit._hit_memory(key, 3, 10, 110.5) is False
+    # 下一窗口过半：3 * 0.4 + 1 = 2.2，还能再通过 1 次
+    assert rate_limit._hit_memory(key, 3, 10, 116.0) is True
+    assert rate_limit._hit_memory(key, 3, 10, 116.0) is False
+    # 再下一个窗口开头：上一窗口计 2 次全部计入，还能通过 1 次
+    assert rate_limit._hit_memory(key, 3, 10, 120.0) is True
+    assert rate_limit._hit_memory(key, 3, 10, 120.0) is False
+    # 相隔两个窗口以上，计数清零
+    assert [rate_limit._hit_memory(key, 3, 10, 145.0) for _ in range(4)] == [True, True, True, False]
+
+
+def test_memory_denied_requests_do_not_count():
+    key = "test:denied"
+    rate_limit._buckets.pop(key, None)
+    assert rate_limit._hit_memory(key, 1, 10, 100.0) is True
+    for _ in range(5):
+        assert rate_limit._hit_memory(key, 1, 10, 100.0) is False
+    assert rate_limit._buckets[key][2] == 1
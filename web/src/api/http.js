@@ -34,3 +34,52 @@ http.interceptors.response.use(
     return Promise.reject({ ...error, friendlyMessage: message })
   }
 )
+
+// POST 一个 SSE 接口，逐个事件回调 onEvent(event, data)；返回 done 事件的数据
+export async function postEventStream(url, body, onEvent) {
+  const token = localStorage.getItem(TOKEN_KEY)
+  const headers = { 'Content-Type': 'application/json', Accept: 'text/event-stream' }
+  if (token) headers.Authorization = `Bearer ${token}`
+  const res = await fetch(`/api${url}`, { method: 'POST', headers, body: JSON.stringify(body || {}) })
+  if (!res.ok) {
+    let message = '请求失败'
+    try {
+      message = (await res.json())?.detail || message
+    } catch (e) {}
+    throw { response: { status: res.status, data: { detail: message } }, friendlyMessage: message }
+  }
+
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let result = null
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let idx
+    while ((idx = buffer.indexOf('\n\n')) >= 0) {
+      const raw = buffer.slice(0, idx)
+      buffer = buffer.slice(idx + 2)
+      let event = 'message'
+      const dataLines = []
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim()
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim())
+      }
+      let data = null
+      try {
+        data = JSON.parse(dataLines.join('\n'))
+      } catch (e) {
+        continue
+      }
+      if (event === 'error') {
+        const message = data?.detail || '请求失败'
+        throw { response: { data: { detail: message } }, friendlyMessage: message }
+      }
+      if (event === 'done') result = data
+      if (onEvent) onEvent(event, data)
+    }
+  }
+  return result
+}